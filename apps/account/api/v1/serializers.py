@@ -4,7 +4,9 @@ from phonenumber_field.serializerfields import PhoneNumberField
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from apps.account.constants import LIST_PROFILE_PHOTO_VARIANT
 from apps.account.models import Profile, PhoneOTP
+from core.serializer_fields import ImageVariantField, ImageVariantsField
 
 User = get_user_model()
 
@@ -201,6 +203,11 @@ class EditProfileSerializer(serializers.ModelSerializer):
             setattr(instance, attr, value)
 
         instance.save()
+
+        uploaded_images = [field for field in ('photo', 'banner') if field in validated_data]
+        if uploaded_images:
+            instance.update_image_variants(fields=uploaded_images)
+
         return instance
 
 
@@ -210,6 +217,8 @@ class ProfileDetailSerializer(serializers.ModelSerializer):
     followers_count = serializers.IntegerField(source='user.followers_count', read_only=True)
     followings_count = serializers.IntegerField(source='user.followings_count', read_only=True)
     films_watched_count = serializers.IntegerField(source='user.films_watched_count', read_only=True)
+    photo_variants = ImageVariantsField(source='photo')
+    banner_variants = ImageVariantsField(source='banner')
 
     class Meta:
         model = Profile
@@ -219,6 +228,8 @@ class ProfileDetailSerializer(serializers.ModelSerializer):
             'name',
             'photo',
             'banner',
+            'photo_variants',
+            'banner_variants',
             'username',
             'followers_count',
             'followings_count',
@@ -233,6 +244,10 @@ class OtherProfileDetailSerializer(ProfileDetailSerializer):
         fields = ProfileDetailSerializer.Meta.fields + ["is_followed"]
 
     def get_is_followed(self, obj):
+        # Set by loaders which already know it, e.g. FilmWatchedByLoader
+        if hasattr(obj, 'is_followed'):
+            return obj.is_followed
+
         request = self.context.get('request', None)
         if request:
             user = request.user
@@ -241,7 +256,7 @@ class OtherProfileDetailSerializer(ProfileDetailSerializer):
 
 class UserListSerializer(serializers.ModelSerializer):
     name = serializers.CharField(source='profile.name')
-    photo = serializers.ImageField(source='profile.photo')
+    photo = ImageVariantField(source='profile.photo', variant=LIST_PROFILE_PHOTO_VARIANT)
     is_followed = serializers.SerializerMethodField()
 
     class Meta:
@@ -256,6 +271,10 @@ class UserListSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
     def get_is_followed(self, obj):
+        # Set by loaders which already know it, e.g. FilmWatchedByLoader
+        if hasattr(obj, 'is_followed'):
+            return obj.is_followed
+
         request = self.context.get('request', None)
         if request:
             user = request.user
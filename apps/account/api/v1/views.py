@@ -1,5 +1,5 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from django.db.models import Exists, F, Func, OuterRef, Q, Subquery
 from rest_framework import status, mixins, filters
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
@@ -12,12 +12,41 @@ from rest_framework_simplejwt.tokens import RefreshToken
 
 from apps.film.api.v1.serializers import ListWatchListSerializer, ListWatchedSerializer
 from apps.post.api.v1.serializers import SelfPostListSerializer
+from core.mixins import ConditionalGetMixin
 from . import serializers
 from ...models import Profile, PhoneOTP
 
 User = get_user_model()
 
 
+def _count(queryset) -> Subquery:
+    return Subquery(queryset.order_by().annotate(count=Func(F('pk'), function='COUNT')).values('count'))
+
+
+def profile_validators(user_id, viewer=None):
+    """
+    Conditional GET validators of a profile: its rows' updated_time and counters,
+    and if viewer follows the user, all in one query
+    """
+    state = User.objects.filter(pk=user_id, is_active=True).annotate(
+        profile_updated_time=F('profile__updated_time'),
+        followers_count=_count(User.followers.through.objects.filter(from_user_id=OuterRef('pk'))),
+        followings_count=_count(User.followings.through.objects.filter(from_user_id=OuterRef('pk'))),
+        films_watched_count=_count(User.films_watched.through.objects.filter(user_id=OuterRef('pk'))),
+    )
+    fields = ['updated_time', 'profile_updated_time', 'followers_count', 'followings_count', 'films_watched_count']
+    if viewer is not None:
+        state = state.annotate(is_followed=Exists(
+            User.followings.through.objects.filter(from_user_id=viewer.pk, to_user_id=OuterRef('pk'))
+        ))
+        fields.append('is_followed')
+
+    row = state.values_list(*fields).first()
+    if row is None:
+        return (None,), None
+    return row, max(updated_time for updated_time in row[:2] if updated_time)
+
+
 class AuthViewSet(GenericViewSet):
     queryset = PhoneOTP.active_objects.active()
     permission_classes = [AllowAny]
@@ -247,6 +276,7 @@ class AuthViewSet(GenericViewSet):
 
 
 class SelfProfileViewSet(
+    ConditionalGetMixin,
     mixins.ListModelMixin,
     GenericViewSet
 ):
@@ -257,10 +287,16 @@ class SelfProfileViewSet(
     }
     filter_backends = [filters.SearchFilter]
     search_fields = ['username', 'profile__name']
+    conditional_actions = ('list',)
 
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action, self.serializer_class)
 
+    def get_validators(self):
+        # Profile is made on first read, so it's made before validators, not to change them right after
+        self.get_object()
+        return profile_validators(self.request.user.pk)
+
     def get_object(self):
         try:
             profile = self.request.user.profile
@@ -393,6 +429,7 @@ class SelfProfileViewSet(
 
 
 class OtherProfileViewSet(
+    ConditionalGetMixin,
     mixins.ListModelMixin,
     GenericViewSet
 ):
@@ -400,19 +437,29 @@ class OtherProfileViewSet(
     queryset = User.active_objects.active()
     filter_backends = [filters.SearchFilter]
     search_fields = ['username', 'profile__name']
+    conditional_actions = ('list',)
+
+    def get_validators(self):
+        # Profile is made on first read, so it's made before validators, not to change them right after
+        self.get_profile()
+        return profile_validators(self.kwargs.get('user_id'), viewer=self.request.user)
 
     def get_object(self):
         user_id = self.kwargs.get('user_id')
         user = get_object_or_404(self.get_queryset(), id=user_id)
         return user
 
-    def list(self, request, *args, **kwargs):
-        try:
-            profile = self.get_object().profile
-        except User.profile.RelatedObjectDoesNotExist:
-            profile = Profile.objects.create(user=self.get_object())
+    def get_profile(self) -> Profile:
+        if getattr(self, '_profile', None) is None:
+            user = self.get_object()
+            try:
+                self._profile = user.profile
+            except User.profile.RelatedObjectDoesNotExist:
+                self._profile = Profile.objects.create(user=user)
+        return self._profile
 
-        serializer = self.get_serializer(profile)
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer(self.get_profile())
         return Response(serializer.data)
 
     @action(
@@ -2,3 +2,8 @@ OTP_CODE_LENGTH = 4
 OTP_TIME = 60
 OTP_TEST_CODE = 1234
 VERIFY_TIME = 3600
+
+# Resized variants of profile images, generated on upload
+PROFILE_PHOTO_VARIANT_WIDTHS = {'w64': 64, 'w128': 128, 'w256': 256}
+PROFILE_BANNER_VARIANT_WIDTHS = {'w390': 390, 'w780': 780}
+LIST_PROFILE_PHOTO_VARIANT = 'w128'
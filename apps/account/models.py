@@ -8,9 +8,17 @@ from phonenumber_field.modelfields import PhoneNumberField
 from django.conf import settings
 from rest_framework.exceptions import ValidationError
 
-from apps.account.constants import OTP_CODE_LENGTH, OTP_TIME, OTP_TEST_CODE, VERIFY_TIME
+from apps.account.constants import (
+    OTP_CODE_LENGTH,
+    OTP_TIME,
+    OTP_TEST_CODE,
+    VERIFY_TIME,
+    PROFILE_PHOTO_VARIANT_WIDTHS,
+    PROFILE_BANNER_VARIANT_WIDTHS,
+)
 from apps.account.managers import UserManager
 from core.models.base import BaseModel
+from core.utils.images import update_image_variants
 
 
 def user_profile_path(instance, filename):                                      # noqa
@@ -183,3 +191,13 @@ class Profile(BaseModel):
         null=True,
         upload_to=user_benner_path
     )
+    photo_variants = models.JSONField(default=dict, blank=True)
+    banner_variants = models.JSONField(default=dict, blank=True)
+
+    def update_image_variants(self, fields=('photo', 'banner')):
+        widths = {
+            'photo': PROFILE_PHOTO_VARIANT_WIDTHS,
+            'banner': PROFILE_BANNER_VARIANT_WIDTHS,
+        }
+        for field in fields:
+            update_image_variants(self, field=field, widths=widths[field])
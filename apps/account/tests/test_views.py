@@ -373,3 +373,45 @@ class TestAuth:
         )
         assert response.status_code == 200
         assert response.json()['details'] == "Password changed successfully"
+
+
+@pytest.mark.django_db
+class TestProfile:
+
+    @pytest.fixture()
+    def user(self):
+        return User.objects.create_user(username="test", password="test", phone="09191234567")
+
+    @pytest.fixture()
+    def other_user(self):
+        return User.objects.create_user(username="other", password="test", phone="09191234568")
+
+    @pytest.fixture()
+    def client(self, client, user):
+        client.force_login(user)
+        return client
+
+    def test_self_profile_not_modified_until_profile_or_counters_change(self, client, user, other_user):
+        url = reverse("self_profile-list")
+        etag = client.get(url)["ETag"]
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        user.follow(other_user)
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 200
+        assert res.json()["followings_count"] == 1
+
+        etag = res["ETag"]
+        user.profile.bio = "bio"
+        user.profile.save()
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+    def test_other_profile_etag_depends_on_viewer(self, client, user, other_user):
+        url = reverse("other_profile-list", kwargs={"user_id": other_user.id})
+        etag = client.get(url)["ETag"]
+        assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+        user.follow(other_user)
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 200
+        assert res.json()["is_followed"] is True
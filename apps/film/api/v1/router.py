@@ -7,5 +7,8 @@ ROUTER.register(r'watchlist', views.WatchListViewSet, basename="watchlist")
 ROUTER.register(r'watched', views.WatchedViewSet, basename="watched")
 ROUTER.register(r'fav', views.FavViewSet, basename="fav")
 ROUTER.register(r'search', views.SearchViewSet, basename="search")
+ROUTER.register(r'discover', views.DiscoverViewSet, basename="discover")
+ROUTER.register(r'artists', views.ArtistViewSet, basename="artist")
+ROUTER.register(r'jobs', views.IngestionJobViewSet, basename="ingestion_job")
 ROUTER.register(r'', views.FilmViewSet, basename="film")
 film_urlpatterns = ROUTER.urls
@@ -1,13 +1,55 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db import models
 
 from apps.account.api.v1.serializers import UserListSerializer
-from apps.film.models import Film, Artist
+from apps.film.constants import ARTIST_ROLE_FIELDS, LIST_POSTER_VARIANT
+from apps.film.loaders import FilmRelationLoader, FilmWatchedByLoader
+from apps.film.models import Film, Artist, FilmActor, FilmWriter, IngestionJob
 from apps.post.models import Post
+from core.serializer_fields import ImageVariantField, ImageVariantsField
 
 User = get_user_model()
 
 
+class FilmRelationField(serializers.ReadOnlyField):
+    """
+    Relation of request user with film (is_watched, is_watchlist, is_fav, has_post)
+    Reads from the request FilmRelationLoader, relation defaults to field name
+    """
+
+    def __init__(self, relation: str = None, **kwargs):
+        self.relation = relation
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        loader = FilmRelationLoader.for_request(self.context['request'])
+        return loader.get(film=value, relation=self.relation or self.field_name)
+
+
+class FilmRelationListSerializer(serializers.ListSerializer):
+    """
+    Loading relations of request user with all films of the list at once
+    """
+
+    def to_representation(self, data):
+        films = list(data.all() if isinstance(data, models.Manager) else data)
+        FilmRelationLoader.for_request(self.context['request']).load(films)
+        return super().to_representation(films)
+
+
+class FilmWatchedByListSerializer(serializers.ListSerializer):
+    """
+    Loading followings of request user who watched films of the list at once
+    """
+
+    def to_representation(self, data):
+        films = list(data.all() if isinstance(data, models.Manager) else data)
+        FilmWatchedByLoader.for_request(self.context['request']).load(films)
+        return super().to_representation(films)
+
+
 class ArtistSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -19,7 +61,34 @@ class ArtistSerializer(serializers.ModelSerializer):
         ]
 
 
+class FilmCreditSerializer(serializers.ModelSerializer):
+    """
+    Artist credited in a film, in the same format as ArtistSerializer
+    """
+    id = serializers.IntegerField(source='artist_id')
+    name = serializers.CharField(source='artist.name')
+    photo = serializers.URLField(source='artist.photo')
+
+    class Meta:
+        model = FilmWriter
+        fields = [
+            'id',
+            'name',
+            'photo',
+        ]
+
+
+class FilmActorSerializer(FilmCreditSerializer):
+
+    class Meta(FilmCreditSerializer.Meta):
+        model = FilmActor
+        fields = FilmCreditSerializer.Meta.fields + [
+            'character',
+        ]
+
+
 class FilmListSerializer(serializers.ModelSerializer):
+    photo = ImageVariantField(variant=LIST_POSTER_VARIANT)
 
     class Meta:
         model = Film
@@ -44,14 +113,16 @@ class FilmPostsSerializer(serializers.ModelSerializer):
         ]
 
 
-class FilmDetailSerializer(serializers.ModelSerializer):
-    actors = serializers.SerializerMethodField()
-    writers = ArtistSerializer(many=True)
-    directors = ArtistSerializer(many=True)
-    is_watched = serializers.SerializerMethodField(read_only=True)
-    is_watchlist = serializers.SerializerMethodField(read_only=True)
-    is_fav = serializers.SerializerMethodField(read_only=True)
-    has_post = serializers.SerializerMethodField(read_only=True)
+class FilmSharedDetailSerializer(serializers.ModelSerializer):
+    """
+    Part of film detail which is the same for all users, cached by FilmDetailCache
+    Credits come in billing order, prefetched by FilmQuerySet.with_credits
+    """
+    actors = FilmActorSerializer(source='cast', many=True, read_only=True)
+    writers = FilmCreditSerializer(source='writer_credits', many=True, read_only=True)
+    directors = FilmCreditSerializer(source='director_credits', many=True, read_only=True)
+    photo_variants = ImageVariantsField(source='photo')
+    banner_variants = ImageVariantsField(source='banner')
 
     class Meta:
         model = Film
@@ -64,6 +135,8 @@ class FilmDetailSerializer(serializers.ModelSerializer):
             "actors",
             "photo",
             "banner",
+            "photo_variants",
+            "banner_variants",
             "year",
             "time",
             "imdb",
@@ -79,34 +152,41 @@ class FilmDetailSerializer(serializers.ModelSerializer):
             "writers",
             "directors",
             "trailer",
-            'is_watched',
-            'is_watchlist',
-            'is_fav',
-            'has_post',
         ]
         extra_kwargs = {
             'imdb_id': {'write_only': True}
         }
 
-    def get_actors(self, obj):
-        actors = obj.actors.all().order_by('created_time')
-        return ArtistSerializer(actors, many=True).data
 
-    def get_is_watched(self, obj):
-        user = self.context.get('request').user
-        return obj.is_watched_by_user(user=user)
+class FilmDetailSerializer(FilmSharedDetailSerializer):
+    is_watched = FilmRelationField()
+    is_watchlist = FilmRelationField()
+    is_fav = FilmRelationField()
+    has_post = FilmRelationField()
 
-    def get_is_watchlist(self, obj):
-        user = self.context.get('request').user
-        return obj.is_watchlist_by_user(user=user)
+    class Meta(FilmSharedDetailSerializer.Meta):
+        fields = FilmSharedDetailSerializer.Meta.fields + [
+            'is_watched',
+            'is_watchlist',
+            'is_fav',
+            'has_post',
+        ]
 
-    def get_is_fav(self, obj):
-        user = self.context.get('request').user
-        return obj.is_faved_by_user(user=user)
 
-    def get_has_post(self, obj):
-        user = self.context.get('request').user
-        return obj.has_post_by_user(user=user)
+class FilmDiscoverSerializer(FilmListSerializer):
+
+    class Meta(FilmListSerializer.Meta):
+        fields = FilmListSerializer.Meta.fields + [
+            'name',
+            'year',
+            'imdb',
+            'rotten',
+            'metacritic',
+            'genres',
+            'countries',
+            'languages',
+        ]
+        read_only_fields = fields
 
 
 class ListWatchListSerializer(FilmListSerializer):
@@ -114,12 +194,13 @@ class ListWatchListSerializer(FilmListSerializer):
 
 
 class ListWatchedSerializer(FilmListSerializer):
-    is_watched = serializers.SerializerMethodField(read_only=True)
-    is_watchlist = serializers.SerializerMethodField(read_only=True)
-    is_fav = serializers.SerializerMethodField(read_only=True)
-    has_post = serializers.SerializerMethodField(read_only=True)
+    is_watched = FilmRelationField()
+    is_watchlist = FilmRelationField()
+    is_fav = FilmRelationField()
+    has_post = FilmRelationField()
 
     class Meta(FilmListSerializer.Meta):
+        list_serializer_class = FilmRelationListSerializer
         fields = FilmListSerializer.Meta.fields + [
             'name',
             'year',
@@ -130,21 +211,47 @@ class ListWatchedSerializer(FilmListSerializer):
             'has_post',
         ]
 
-    def get_is_watched(self, obj):
-        user = self.context.get('request').user
-        return obj.is_watched_by_user(user=user)
 
-    def get_is_watchlist(self, obj):
-        user = self.context.get('request').user
-        return obj.is_watchlist_by_user(user=user)
+class RecommendedFilmSerializer(ListWatchedSerializer):
+    """
+    Recommended films with their score, higher is better
+    """
+    score = serializers.FloatField(read_only=True)
 
-    def get_is_fav(self, obj):
-        user = self.context.get('request').user
-        return obj.is_faved_by_user(user=user)
+    class Meta(ListWatchedSerializer.Meta):
+        fields = ListWatchedSerializer.Meta.fields + [
+            'score',
+        ]
 
-    def get_has_post(self, obj):
-        user = self.context.get('request').user
-        return obj.has_post_by_user(user=user)
+
+class ArtistFilmSerializer(ListWatchedSerializer):
+    """
+    Film of an artist's filmography, with roles of artist in it (annotated by FilmQuerySet.of_artist)
+    """
+    roles = serializers.SerializerMethodField()
+
+    class Meta(ListWatchedSerializer.Meta):
+        fields = ListWatchedSerializer.Meta.fields + [
+            'roles',
+        ]
+
+    def get_roles(self, obj):
+        return [role for role in ARTIST_ROLE_FIELDS if getattr(obj, f"is_{role}", False)]
+
+
+class IMDBFilmListSerializer(serializers.ListSerializer):
+    """
+    Resolving all imdb ids of the list to local films with one query
+    Films come with relations of request user annotated
+    """
+
+    def to_representation(self, data):
+        imdb_ids = [found_film.get('imdb_id') for found_film in data]
+        self.context['local_films'] = IMDBListSerializer.get_local_films(
+            imdb_ids=imdb_ids,
+            user=self.context['request'].user
+        )
+        return super().to_representation(data)
 
 
 class IMDBListSerializer(serializers.Serializer):
@@ -159,6 +266,7 @@ class IMDBListSerializer(serializers.Serializer):
     has_post = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
+        list_serializer_class = IMDBFilmListSerializer
         fields = [
             'imdb_id',
             'name',
@@ -172,17 +280,24 @@ class IMDBListSerializer(serializers.Serializer):
         ]
         # read_only_true = fields
 
+    @staticmethod
+    def get_local_films(imdb_ids: list, user: User) -> dict:
+        return Film.active_objects.active().with_user_relations(
+            user=user
+        ).in_bulk(
+            imdb_ids,
+            field_name='imdb_id'
+        )
+
     def _film_obj(self, obj) -> Film:
-        try:
-            return Film.active_objects.active().prefetch_related(
-                'users_watched',
-                'users_watchlist',
-                'users_favorite',
-            ).get(
-                imdb_id=obj.get('imdb_id')
-            )
-        except Film.DoesNotExist:
-            return None
+        imdb_id = obj.get('imdb_id')
+        if 'local_films' in self.context:
+            return self.context['local_films'].get(imdb_id, None)
+
+        # Serializing a single result
+        if not hasattr(self, '_local_films'):
+            self._local_films = self.get_local_films(imdb_ids=[imdb_id], user=self.context['request'].user)
+        return self._local_films.get(imdb_id, None)
 
     def get_watched_count(self, obj):
         film = self._film_obj(obj)
@@ -192,32 +307,28 @@ class IMDBListSerializer(serializers.Serializer):
         return film.watched_count
 
     def get_is_watched(self, obj):
-        user = self.context.get('request').user
         film = self._film_obj(obj)
         if not film:
             return False
-        return film.is_watched_by_user(user=user)
+        return film.is_watched
 
     def get_is_watchlist(self, obj):
-        user = self.context.get('request').user
         film = self._film_obj(obj)
         if not film:
             return False
-        return film.is_watchlist_by_user(user=user)
+        return film.is_watchlist
 
     def get_is_fav(self, obj):
-        user = self.context.get('request').user
         film = self._film_obj(obj)
         if not film:
             return False
-        return film.is_faved_by_user(user=user)
+        return film.is_fav
 
     def get_has_post(self, obj):
-        user = self.context.get('request').user
         film = self._film_obj(obj)
         if not film:
             return False
-        return film.has_post_by_user(user=user)
+        return film.has_post
 
 
 class FetchIMDBFilmSerializer(serializers.Serializer):
@@ -238,20 +349,44 @@ class FilmCreatedSerializer(serializers.ModelSerializer):
         ]
 
 
+class IngestionJobSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = IngestionJob
+        fields = [
+            'id',
+            'imdb_id',
+            'status',
+            'film',
+            'error',
+        ]
+        read_only_fields = fields
+
+
 class FilmHomeListSerializer(serializers.ModelSerializer):
+    """
+    Films of home list, with followings of request user who watched them
+    watched_by is capped, watched_by_count is the total number of them
+    """
+    photo = ImageVariantField(variant=LIST_POSTER_VARIANT)
     watched_by = serializers.SerializerMethodField()
+    watched_by_count = serializers.SerializerMethodField()
 
     class Meta:
         model = Film
+        list_serializer_class = FilmWatchedByListSerializer
         fields = (
             "id",
             "photo",
             'name',
             'year',
             'watched_by',
+            'watched_by_count',
         )
 
     def get_watched_by(self, obj):
-        user = self.context['request'].user
-        watched_by = User.active_objects.active().filter(films_watched=obj, followers=user)
+        watched_by = FilmWatchedByLoader.for_request(self.context['request']).get(film=obj)
         return UserListSerializer(watched_by, many=True, context=self.context).data
+
+    def get_watched_by_count(self, obj):
+        return FilmWatchedByLoader.for_request(self.context['request']).count(film=obj)
@@ -1,4 +1,12 @@
-from django.db.models import Count, Avg
+import logging
+import re
+
+import requests
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import F, Q, Exists, OuterRef
+from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins, status, filters
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
@@ -6,10 +14,38 @@ from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
 from apps.film.api.v1 import serializers
-from apps.film.filters import CreatedTimeBasedOrdering
-from apps.film.models import Film, Artist
+from apps.film.filters import CreatedTimeBasedOrdering, FilmDiscoverFilter
+from apps.film.ingestion import enqueue_ingestion, ingest_film
+from apps.film import constants
+from apps.film.constants import RANKING_ORDERINGS
+from apps.film.detail_cache import film_detail_cache
+from apps.film.loaders import FilmRelationLoader, FilmWatchedByLoader
+from apps.film.models import Film, FilmRanking, IngestionJob, Artist
+from apps.film.pagination import FilmPostsPagination, TrendingLimitOffsetPagination
+from apps.film.recommendations import for_you_recommender, genre_index
 from apps.film.utils import IMDBApiCall
-from core.pagination import CustomLimitOffsetPagination
+from core.exceptions import ApiCallException
+from core.mixins import ConditionalGetMixin
+from core.pagination import CustomLimitOffsetPagination, PositionLimitOffsetPagination
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+
+def _absolute_media_urls(data: dict, request) -> dict:
+    """
+    Film details are cached with media urls relative to host, they're made absolute for request as serializers do
+    """
+    data = dict(data)
+    for field in ('photo', 'banner'):
+        if data.get(field, None):
+            data[field] = request.build_absolute_uri(data[field])
+    for field in ('photo_variants', 'banner_variants'):
+        data[field] = {
+            variant: {ext: request.build_absolute_uri(url) for ext, url in formats.items()}
+            for variant, formats in (data.get(field, None) or {}).items()
+        }
+    return data
 
 
 class WatchListViewSet(GenericViewSet):
@@ -117,12 +153,16 @@ class FavViewSet(GenericViewSet):
 class SearchViewSet(GenericViewSet):
     """
     Search in films
+    Films in db are searched first, IMDB is searched just if there are not enough of them
+    `source` param can be `local` or `imdb`, to search just one of them
     """
 
     serializer_class = serializers.IMDBListSerializer
 
     filter_backends = [filters.SearchFilter]
 
+    SOURCES = ('local', 'imdb')
+
     def list(self, request, *args, **kwargs):
         query_params = self.request.query_params.get('search', None)
         if not query_params:
@@ -130,9 +170,28 @@ class SearchViewSet(GenericViewSet):
                 {"details": "Specify search param"}
             )
 
-        found_films = IMDBApiCall().search(
-            film=query_params
-        )
+        source = self.request.query_params.get('source', None)
+        if source and source not in self.SOURCES:
+            raise ValidationError(
+                {"details": f"source should be one of {', '.join(self.SOURCES)}"}
+            )
+
+        found_films = []
+        if source != 'imdb':
+            found_films = self.search_local(query_params)
+
+        if source == 'imdb' or (not source and len(found_films) < constants.LOCAL_SEARCH_MIN_RESULTS):
+            local_imdb_ids = {found_film['imdb_id'] for found_film in found_films}
+            try:
+                imdb_films = IMDBApiCall().search(film=query_params)
+            except (ApiCallException, requests.RequestException):
+                # IMDB being down doesn't fail the search, local films are returned
+                logger.exception("Failed to search %s in IMDB", query_params)
+                imdb_films = []
+            found_films += [
+                found_film for found_film in imdb_films if found_film['imdb_id'] not in local_imdb_ids
+            ]
+
         serializer = self.get_serializer(data=found_films, many=True)
         serializer.is_valid(raise_exception=True)
 
@@ -141,8 +200,115 @@ class SearchViewSet(GenericViewSet):
             status=status.HTTP_200_OK
         )
 
+    @staticmethod
+    def search_local(query: str) -> list:
+        """
+        Films in db matching query, in the same format as IMDB search results
+        """
+        films = Film.active_objects.active().search(query).only('imdb_id', 'name', 'photo_url', 'year')
+        return [
+            {
+                'imdb_id': film.imdb_id,
+                'name': film.name,
+                'photo': film.photo_url,
+                'year': str(film.year),
+            }
+            for film in films[:constants.SEARCH_FILM_PAGE_SIZE]
+        ]
+
+
+class DiscoverViewSet(
+    mixins.ListModelMixin,
+    GenericViewSet
+):
+    """
+    Filtering films by genres, countries, languages (containing all comma separated values),
+    year range and imdb, rotten and metacritic minimums
+    Comes with number of filtered films per genre, country and language, to refine the filters
+    """
+    queryset = Film.active_objects.active().order_by('-watched_count', '-id')
+    serializer_class = serializers.FilmDiscoverSerializer
+    pagination_class = CustomLimitOffsetPagination
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = FilmDiscoverFilter
+
+    def list(self, request, *args, **kwargs):
+        films = self.filter_queryset(self.get_queryset())
+
+        page = self.paginate_queryset(films)
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        response.data['facets'] = films.facet_counts()
+        return response
+
+
+class ArtistViewSet(
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    GenericViewSet
+):
+    """
+    Artists, searched by name with `search` param
+    """
+    serializer_classes = {
+        'filmography': serializers.ArtistFilmSerializer,
+    }
+    serializer_class = serializers.ArtistSerializer
+    queryset = Artist.active_objects.active()
+    pagination_class = CustomLimitOffsetPagination
+
+    def get_serializer_class(self):
+        return self.serializer_classes.get(self.action, self.serializer_class)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+
+        query = self.request.query_params.get('search', None)
+        if not query:
+            raise ValidationError(
+                {"details": "Specify search param"}
+            )
+        # Both lookups are served by trigram index of name, substring is for short queries (e.g. last name)
+        # Substring is matched by a case insensitive regex of the escaped query, as icontains compares UPPER(name)
+        return queryset.filter(
+            Q(name__trigram_similar=query) | Q(name__iregex=re.escape(query))
+        ).annotate(
+            similarity=TrigramSimilarity('name', query)
+        ).order_by('-similarity', 'id')
+
+    @action(
+        detail=True,
+        methods=["GET"],
+        url_name="filmography",
+        url_path="filmography",
+    )
+    def filmography(self, request, *args, **kwargs):
+        """
+        Films artist acted in, wrote or directed, ordered by year, with relations of request user with them
+        """
+        artist = self.get_object()
+        films = Film.active_objects.active().of_artist(artist.id)
+
+        page = self.paginate_queryset(films)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class IngestionJobViewSet(
+    mixins.RetrieveModelMixin,
+    GenericViewSet
+):
+    """
+    Status of film ingestion jobs
+    """
+    queryset = IngestionJob.active_objects.active()
+    serializer_class = serializers.IngestionJobSerializer
+
 
 class FilmViewSet(
+    ConditionalGetMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     GenericViewSet
@@ -153,28 +319,148 @@ class FilmViewSet(
         'retrieve': serializers.FilmDetailSerializer,
         'create': serializers.FetchIMDBFilmSerializer,
     }
-    queryset = Film.active_objects.active().prefetch_related(
-        'users_watched',
-        'users_favorite',
-        'posts',
-    ).annotate(
-        rate_avg=Avg('posts__rate'),
-        watched=Count('users_watched', distinct=True),
-        fav=Count('users_favorite', distinct=True),
-        post=Count('posts', distinct=True),
+    # Orderings are stored (and indexed) counters of film, kept under their old names
+    queryset = Film.active_objects.active().annotate(
+        watched=F('watched_count'),
+        fav=F('faved_count'),
+        post=F('posts_count'),
     )
 
     pagination_class = CustomLimitOffsetPagination
     filter_backends = [filters.OrderingFilter]
-    ordering_fields = ['rate_avg', 'fav', 'watched', 'post', 'created_time']
+    ordering_fields = ['rate_avg', 'fav', 'watched', 'post', 'created_time', 'trending']
+    conditional_actions = ('list', 'retrieve')
 
     def get_serializer_class(self):
         return self.serializer_classes.get(self.action, self.serializer_class)
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'retrieve':
+            return queryset.with_credits()
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        """
+        Home list, paged through FilmRanking snapshot of its counter ordering
+        Other orderings (created_time, the default, is served by its index) are computed per request,
+        as are counter orderings before the first refresh of their snapshot
+        Trending films (ordering=-trending) are paged through their scores in Redis
+        """
+        paginator, page = self.paginate_films(request)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def paginate_films(self, request):
+        """
+        Paginator and page of home list, computed once per request as list validators need the page too
+        """
+        if getattr(self, '_films_page', None) is not None:
+            return self._films_page
+
+        ordering = filters.OrderingFilter().get_ordering(request, self.get_queryset(), self) or []
+        if ordering == ['-trending']:
+            paginator = TrendingLimitOffsetPagination()
+            self._films_page = paginator, paginator.paginate_queryset(self.get_queryset(), request, view=self)
+            return self._films_page
+        if 'trending' in [field.lstrip('-') for field in ordering]:
+            raise ValidationError(
+                {"details": "trending can only be used alone, as -trending"}
+            )
+
+        ranking = ordering[0].lstrip('-') if len(ordering) == 1 else None
+        if ranking not in RANKING_ORDERINGS or not FilmRanking.objects.filter(ordering=ranking).exists():
+            paginator = self.paginator
+            self._films_page = paginator, paginator.paginate_queryset(
+                self.filter_queryset(self.get_queryset()), request, view=self
+            )
+            return self._films_page
+
+        films = self.get_queryset().annotate(
+            ranking=F('rankings__ordering'),
+            position=F('rankings__position'),
+        ).filter(ranking=ranking)
+
+        paginator = PositionLimitOffsetPagination()
+        # Snapshot is in descending order
+        page = paginator.paginate_queryset(films, request, view=self, reverse=not ordering[0].startswith('-'))
+        self._films_page = paginator, page
+        return self._films_page
+
+    def get_list_validators(self):
+        """
+        Films of page with their updated_time and counters, number of all films,
+        and followings of request user who watched each film (loaded for the response too)
+        """
+        paginator, page = self.paginate_films(self.request)
+        watched_by = FilmWatchedByLoader.for_request(self.request)
+        watched_by.load(page)
+
+        parts, updated_times = [getattr(paginator, 'count', None)], []
+        for film in page:
+            users = watched_by.get(film)
+            user_parts = []
+            for user in users:
+                profile = getattr(user, 'profile', None)
+                user_parts.append((user.pk, user.updated_time, profile and profile.updated_time))
+                updated_times += [user.updated_time, profile and profile.updated_time]
+            parts.append((
+                film.pk, film.updated_time, *(getattr(film, counter) for counter in Film.COUNTERS),
+                watched_by.count(film), *user_parts
+            ))
+            updated_times.append(film.updated_time)
+
+        updated_times = [updated_time for updated_time in updated_times if updated_time]
+        return parts, max(updated_times) if updated_times else None
+
+    def get_validators(self):
+        if self.action == 'list':
+            return self.get_list_validators()
+        return self.get_detail_validators()
+
+    def get_detail_validators(self):
+        """
+        updated_time of film (bumped by Film.mark_changed on aggregate, credit and media changes too)
+        and relations of request user with it, with one query
+        """
+        film_id = str(self.kwargs[self.lookup_field])
+        state = Film.active_objects.active().filter(pk=film_id).with_user_relations(self.request.user).values(
+            'updated_time', *FilmRelationLoader.RELATIONS
+        ).first() if film_id.isdigit() else None
+        if state is None:
+            return (None,), None
+
+        # Relations are kept for retrieve, not to load them again
+        updated_time = state.pop('updated_time')
+        film = Film(pk=int(film_id))
+        for relation, value in state.items():
+            setattr(film, relation, value)
+        FilmRelationLoader.for_request(self.request).load([film])
+        return (constants.FILM_DETAIL_CACHE_VERSION, updated_time, *state.values()), updated_time
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Film detail, the part which is the same for all users is read from FilmDetailCache
+        Relations of request user with film are loaded with one query and merged in
+        """
+        film_id = str(kwargs[self.lookup_field])
+        data = film_detail_cache.get(film_id) if film_id.isdigit() else None
+        if data is None:
+            film = self.get_object()
+            # Without request, media urls stay relative, so cached data doesn't depend on host
+            data = serializers.FilmSharedDetailSerializer(film, context={'view': self}).data
+            film_detail_cache.set(film.id, data)
+
+        film = Film(pk=int(data['id']))
+        loader = FilmRelationLoader.for_request(request)
+        relations = {relation: loader.get(film=film, relation=relation) for relation in FilmRelationLoader.RELATIONS}
+        return Response({**_absolute_media_urls(data, request), **relations}, status=status.HTTP_200_OK)
+
     def create(self, request, *args, **kwargs):
         """
         Fetching film from IMDB and saving it in db
         If id already exists in db, nothing would be saved
+        Otherwise an ingestion job is enqueued and returned with 202, its status can be checked via jobs api
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -190,71 +476,119 @@ class FilmViewSet(
                 status=status.HTTP_200_OK
             )
 
-        found_film = IMDBApiCall().fetch(imdb_id)
+        if not settings.FILM_INGESTION_ASYNC:
+            return Response(
+                out_serializer(instance=ingest_film(imdb_id)).data,
+                status=status.HTTP_201_CREATED
+            )
 
-        actors = []
-        for actor in found_film.pop('actors', None):
-            try:
-                artist = Artist.objects.get(imdb_id=actor['imdb_id'])
-            except Artist.DoesNotExist:
-                artist = Artist.objects.create(**actor)
-            actors.append(artist)
+        job = enqueue_ingestion(imdb_id)
+        return Response(
+            serializers.IngestionJobSerializer(instance=job).data,
+            status=status.HTTP_202_ACCEPTED
+        )
 
-        writers = []
-        for writer in found_film.pop('writers', None):
-            try:
-                artist = Artist.objects.get(imdb_id=writer['imdb_id'])
-            except Artist.DoesNotExist:
-                artist = Artist.objects.create(**writer)
-            writers.append(artist)
+    @action(
+        detail=True,
+        methods=["GET"],
+        serializer_class=serializers.RecommendedFilmSerializer,
+        url_name="similar",
+        url_path="similar",
+    )
+    def similar(self, request, *args, **kwargs):
+        """
+        Films most watched by the same users, built offline by build_similar_films command
+        """
+        film = self.get_object()
+        similar_films = Film.active_objects.active().filter(
+            similar_to__film=film
+        ).annotate(
+            score=F('similar_to__score')
+        ).order_by('-score')
 
-        directors = []
-        for director in found_film.pop('directors', None):
-            try:
-                artist = Artist.objects.get(imdb_id=director['imdb_id'])
-            except Artist.DoesNotExist:
-                artist = Artist.objects.create(**director)
-            directors.append(artist)
+        serializer = self.get_serializer(similar_films, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-        created_film = Film.objects.create(**found_film)
-        created_film.actors.add(*actors)
-        created_film.writers.add(*writers)
-        created_film.directors.add(*directors)
+    @action(
+        detail=True,
+        methods=["GET"],
+        serializer_class=serializers.RecommendedFilmSerializer,
+        url_name="feels_like",
+        url_path="feels-like",
+    )
+    def feels_like(self, request, *args, **kwargs):
+        """
+        Films with the most similar genre votes of users to this film
+        """
+        film = self.get_object()
+        nearest = dict(genre_index.nearest(film.id, k=constants.FEELS_LIKE_FILMS_COUNT))
 
-        return Response(
-            out_serializer(instance=created_film).data,
-            status=status.HTTP_201_CREATED
-        )
+        films = Film.active_objects.active().in_bulk(list(nearest))
+        feels_like_films = []
+        for film_id, score in nearest.items():
+            if film_id in films:
+                films[film_id].score = score
+                feels_like_films.append(films[film_id])
+
+        serializer = self.get_serializer(feels_like_films, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(
+        detail=False,
+        methods=["GET"],
+        serializer_class=serializers.RecommendedFilmSerializer,
+        url_name="for_you",
+        url_path="for-you",
+    )
+    def for_you(self, request, *args, **kwargs):
+        """
+        Films user hasn't watched, ranked by factors trained offline by train_recommendations command
+        Users without factors (e.g. new ones) get the most watched films instead
+        """
+        recommended = dict(for_you_recommender.recommend(request.user, k=constants.FOR_YOU_FILMS_COUNT))
+        if not recommended:
+            popular_films = Film.active_objects.active().exclude(
+                users_watched=request.user
+            ).order_by('-watched_count', '-id')[:constants.FOR_YOU_FILMS_COUNT]
+            serializer = self.get_serializer(popular_films, many=True)
+            return Response(serializer.data, status=status.HTTP_200_OK)
+
+        films = Film.active_objects.active().in_bulk(list(recommended))
+        for_you_films = []
+        for film_id, score in recommended.items():
+            if film_id in films:
+                films[film_id].score = score
+                for_you_films.append(films[film_id])
+
+        serializer = self.get_serializer(for_you_films, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(
         detail=True,
         methods=["GET"],
         serializer_class=serializers.FilmPostsSerializer,
+        pagination_class=FilmPostsPagination,
         url_name="posts",
         url_path="posts",
     )
     def posts(self, request, *args, **kwargs):
         """
         Showing the posts of a film
-        First the posts of followings come, then the other posts
+        First the posts of followings (which have caption) come, then the other posts, newest first in each
         """
         film = self.get_object()
-        user = request.user
-
-        # Getting followings posts
-        followings_film_posts = film.posts.filter(
-            is_active=True,
-            user__followers=user
-        ).exclude(caption=None)
 
-        # Getting all users posts about film and exclude followings posts
-        not_followings_film_posts = film.posts.filter(
+        posts = film.posts.filter(
             is_active=True
-        ).exclude(id__in=followings_film_posts)
-
-        # Combining two queryset
-        posts = followings_film_posts.union(not_followings_film_posts, all=True)
+        ).annotate(
+            is_followed_user=Exists(
+                User.followings.through.objects.filter(from_user_id=request.user.pk, to_user_id=OuterRef('user_id'))
+            ),
+        ).select_related('user__profile')
 
         page = self.paginate_queryset(posts)
+        for post in page:
+            # UserListSerializer doesn't need to query it per post
+            post.user.is_followed = post.is_followed_user
         serializer = self.get_serializer(page, many=True)
         return self.get_paginated_response(serializer.data)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class FilmConfig(AppConfig):
     name = 'apps.film'
+
+    def ready(self):
+        from apps.film import signals     # noqa
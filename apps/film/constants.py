@@ -2,6 +2,15 @@ IMDB_API_URL = "https://imdb-api.com"
 
 ACTORS_COUNT = 10
 SEARCH_FILM_PAGE_SIZE = 10
+# Local search results needed to not search IMDB too
+LOCAL_SEARCH_MIN_RESULTS = 3
+SEARCH_CONFIG = 'english'
+SEARCH_CACHE_PREFIX = 'imdb_search'
+# Shared part of film details (apps.film.detail_cache), bump version when FilmSharedDetailSerializer changes
+FILM_DETAIL_CACHE_PREFIX = 'film_detail'
+FILM_DETAIL_CACHE_VERSION = 1
+# Max number of followings shown as watchers of each film in home list
+WATCHED_BY_LIMIT = 5
 
 POSTER_WIDTH = 'w300'
 BANNER_WIDTH = 'w780'
@@ -9,3 +18,65 @@ IMAGE_SIZE = '._V1_UX200_CR0,23,200,200_AL_.jpg'
 FILM_SIZE = '._V1_UY150_CR1,0,100,150_AL_.jpg'
 AMAZON_IMAGE_LINK = 'https://m.media-amazon.com/images/M/'
 TMDB_IMAGE_LINK = 'https://image.tmdb.org/t/p/'
+
+MEDIA_CHUNK_SIZE = 64 * 1024
+
+# Resized variants of film images, generated after downloading them
+POSTER_VARIANT_WIDTHS = {'w100': 100, 'w200': 200}
+BANNER_VARIANT_WIDTHS = {'w390': 390, 'w780': 780}
+LIST_POSTER_VARIANT = 'w200'
+
+# Orderings of home list kept in FilmRanking, ordering name: film field its score comes from
+RANKING_ORDERINGS = {
+    'rate_avg': 'rate_avg',
+    'fav': 'faved_count',
+    'watched': 'watched_count',
+    'post': 'posts_count',
+}
+
+# Similar films, built offline from watched and favorite relations (apps.film.recommendations)
+SIMILAR_FILMS_COUNT = 20
+INTERACTION_WEIGHTS = {
+    'watched': 1.0,
+    'favorite': 2.0,
+}
+# Max number of cells of a dense similarity block, bounds memory of building similar films
+SIMILARITY_BLOCK_CELLS = 2 ** 24
+
+# Films for you, by implicit feedback matrix factorization (apps.film.factorization)
+FOR_YOU_FILMS_COUNT = 20
+FACTORIZATION_WEIGHTS = {
+    'watched': 1.0,
+    'favorite': 2.0,
+    'watchlist': 0.5,
+    'post_rate': 2.0,
+}
+FACTORIZATION_FACTORS = 32
+FACTORIZATION_ITERATIONS = 10
+FACTORIZATION_REGULARIZATION = 0.1
+# Confidence of an interaction is 1 + alpha * weight
+FACTORIZATION_ALPHA = 10.0
+
+# Film field of each role of artists (FilmQuerySet.of_artist)
+ARTIST_ROLE_FIELDS = {
+    'actor': 'actors',
+    'writer': 'writers',
+    'director': 'directors',
+}
+
+# Trending films, by time decayed weights of engagement events (apps.film.trending)
+TRENDING_KEY_PREFIX = 'trending:films'
+TRENDING_WEIGHTS = {
+    'watched': 1.0,
+    'favorite': 2.0,
+    'watchlist': 0.5,
+    'post': 3.0,
+}
+# Films whose decayed score falls below this are dropped by compact_trending command
+TRENDING_MIN_SCORE = 0.05
+# Films read or written by each Redis call of compact_trending command, so it doesn't block Redis for long
+TRENDING_COMPACT_BATCH_SIZE = 1000
+
+# Films that feel like a film, by genre embedding (apps.film.recommendations.GenreEmbeddingIndex)
+FEELS_LIKE_FILMS_COUNT = 20
+GENRE_INDEX_RELOAD_OVERLAP = 60
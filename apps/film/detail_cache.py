@@ -0,0 +1,47 @@
+from typing import Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.film import constants
+
+
+class FilmDetailCache:
+    """
+    Shared part of film detail responses (everything but relations of the viewer), cached per film
+    Keys have a version, bumped when the shape of detail changes, so old entries are just not read
+    Entries are deleted when film, its credits or its post aggregates change, ttl bounds any missed change
+    """
+
+    def __init__(self, prefix: str, version: int, ttl: int):
+        self.prefix = prefix
+        self.version = version
+        self.ttl = ttl
+
+    def _key(self, film_id) -> str:
+        return f"{self.prefix}:v{self.version}:{film_id}"
+
+    def get(self, film_id) -> Optional[dict]:
+        return cache.get(self._key(film_id))
+
+    def set(self, film_id, data: dict):
+        cache.set(self._key(film_id), data, self.ttl)
+
+    def invalidate(self, film_ids: Iterable[int]):
+        """
+        Deleting entries of films now and again after commit,
+        so a reader can't cache the old state while the change is not committed
+        """
+        keys = [self._key(film_id) for film_id in film_ids if film_id]
+        if not keys:
+            return
+        cache.delete_many(keys)
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+film_detail_cache = FilmDetailCache(
+    prefix=constants.FILM_DETAIL_CACHE_PREFIX,
+    version=constants.FILM_DETAIL_CACHE_VERSION,
+    ttl=settings.FILM_DETAIL_CACHE_TTL,
+)
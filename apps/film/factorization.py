@@ -0,0 +1,111 @@
+"""
+Implicit feedback matrix factorization (ALS of Hu, Koren and Volinsky), with just NumPy and SciPy
+Kept free of Django, so its functions can run in worker processes
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+
+# Max cells of the (interactions x factors x factors) array made for each chunk of rows, bounds memory
+CHUNK_CELLS = 2 ** 24
+
+
+def solve_rows(
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+        other_factors: np.ndarray,
+        regularization: float,
+        alpha: float,
+) -> np.ndarray:
+    """
+    Least squares factors of a chunk of rows (users or films) given factors of the other side
+    For row u: (YtY + Yt (Cu - I) Y + reg I) xu = Yt Cu pu, with confidence Cu = 1 + alpha * interactions
+    All rows of chunk are built and solved together as stacked arrays
+    """
+    factors = other_factors.shape[1]
+    rows_count = len(indptr) - 1
+    result = np.zeros((rows_count, factors), dtype=np.float32)
+    non_empty = np.flatnonzero(np.diff(indptr) > 0)
+    if not len(non_empty):
+        return result
+
+    yty = other_factors.T.dot(other_factors)
+    y = other_factors[indices]
+    confidence = (alpha * data).astype(np.float32)
+
+    # Per interaction terms, summed per row with reduceat over row boundaries
+    outer = np.einsum('ni,nj->nij', y * confidence[:, None], y)
+    starts = indptr[non_empty]
+    a = np.add.reduceat(outer, starts, axis=0) + yty + regularization * np.eye(factors, dtype=np.float32)
+    b = np.add.reduceat(y * (1 + confidence)[:, None], starts, axis=0)
+
+    result[non_empty] = np.linalg.solve(a, b[:, :, None])[:, :, 0]
+    return result
+
+
+def _chunks(matrix: sparse.csr_matrix, factors: int):
+    """
+    Row ranges of matrix, each with at most CHUNK_CELLS cells of interaction x factors x factors
+    """
+    max_interactions = max(1, CHUNK_CELLS // (factors * factors))
+    start = 0
+    while start < matrix.shape[0]:
+        stop = int(np.searchsorted(matrix.indptr, matrix.indptr[start] + max_interactions, side='right')) - 1
+        stop = min(max(stop, start + 1), matrix.shape[0])
+        yield start, stop
+        start = stop
+
+
+def _solve_chunk(args) -> np.ndarray:
+    matrix, other_factors, regularization, alpha = args
+    return solve_rows(matrix.indptr, matrix.indices, matrix.data, other_factors, regularization, alpha)
+
+
+def als_step(
+        matrix: sparse.csr_matrix,
+        other_factors: np.ndarray,
+        regularization: float,
+        alpha: float,
+        pool: Optional[ProcessPoolExecutor] = None,
+) -> np.ndarray:
+    """
+    Factors of all rows of matrix, chunks are solved in pool processes if given
+    """
+    tasks = [
+        (matrix[start:stop], other_factors, regularization, alpha)
+        for start, stop in _chunks(matrix, other_factors.shape[1])
+    ]
+    results = pool.map(_solve_chunk, tasks) if pool else map(_solve_chunk, tasks)
+    return np.concatenate(list(results)) if tasks else np.zeros((0, other_factors.shape[1]), dtype=np.float32)
+
+
+def train_implicit_als(
+        matrix: sparse.csr_matrix,
+        factors: int,
+        iterations: int,
+        regularization: float,
+        alpha: float,
+        workers: int = 1,
+        seed: int = 0,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Factorizing users x films interactions into float32 user factors and film factors
+    """
+    random = np.random.RandomState(seed)
+    user_factors = (random.standard_normal((matrix.shape[0], factors)) * 0.01).astype(np.float32)
+    film_factors = (random.standard_normal((matrix.shape[1], factors)) * 0.01).astype(np.float32)
+    films_matrix = matrix.T.tocsr()
+
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        for _ in range(iterations):
+            user_factors = als_step(matrix, film_factors, regularization, alpha, pool=pool)
+            film_factors = als_step(films_matrix, user_factors, regularization, alpha, pool=pool)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    return user_factors, film_factors
@@ -1,5 +1,8 @@
+import django_filters
 from rest_framework import filters
 
+from apps.film.models import Film
+
 
 class CreatedTimeBasedOrdering(filters.OrderingFilter):
 
@@ -9,3 +12,30 @@ class CreatedTimeBasedOrdering(filters.OrderingFilter):
             return queryset.order_by(*ordering, '-created_time')
 
         return queryset
+
+
+class CommaSeparatedContainsFilter(django_filters.CharFilter):
+    """
+    Array field containing all comma separated values, e.g. genres=Drama,Crime
+    """
+
+    def filter(self, qs, value):
+        if not value:
+            return qs
+        values = [item.strip() for item in value.split(',') if item.strip()]
+        return qs.filter(**{f"{self.field_name}__contains": values})
+
+
+class FilmDiscoverFilter(django_filters.FilterSet):
+    genres = CommaSeparatedContainsFilter(field_name='genres')
+    countries = CommaSeparatedContainsFilter(field_name='countries')
+    languages = CommaSeparatedContainsFilter(field_name='languages')
+    year_min = django_filters.NumberFilter(field_name='year', lookup_expr='gte')
+    year_max = django_filters.NumberFilter(field_name='year', lookup_expr='lte')
+    imdb_min = django_filters.NumberFilter(field_name='imdb', lookup_expr='gte')
+    rotten_min = django_filters.NumberFilter(field_name='rotten', lookup_expr='gte')
+    metacritic_min = django_filters.NumberFilter(field_name='metacritic', lookup_expr='gte')
+
+    class Meta:
+        model = Film
+        fields = []
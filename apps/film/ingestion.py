@@ -0,0 +1,210 @@
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.film.detail_cache import film_detail_cache
+from apps.film.media import media_pipeline
+from apps.film.models import Film, Artist, IngestionJob
+from apps.film.utils import IMDBApiCall
+
+
+ARTIST_ROLES = ('actors', 'writers', 'directors')
+# Keys of fetched artists which are about their credit in the film, not the artist
+CREDIT_FIELDS = ('character',)
+
+
+def validate_fetched_film(found_film) -> Optional[str]:
+    """
+    Why a film in IMDBApiCall.fetch format (e.g. a row of an import) can't be saved, None if it can
+    Fields of film and its artists are checked like the db would, without querying it
+    """
+    if not isinstance(found_film, dict):
+        return "Film is not an object"
+    try:
+        Film(**{key: value for key, value in found_film.items() if key not in ARTIST_ROLES}).clean_fields()
+        for role in ARTIST_ROLES:
+            for artist in found_film.get(role, None) or []:
+                Artist(**{key: value for key, value in artist.items() if key not in CREDIT_FIELDS}).clean_fields()
+    except ValidationError as e:
+        return "; ".join(f"{field}: {' '.join(errors)}" for field, errors in e.message_dict.items())
+    except (TypeError, AttributeError) as e:
+        return str(e)
+    return None
+
+
+def upsert_artists(artists: Iterable[dict]) -> Dict[str, Artist]:
+    """
+    Getting artists by imdb id and creating the missing ones
+    Artists are deduped, existing ones are found with one query and missing ones are inserted with one bulk insert
+    """
+    artists_by_imdb_id = {
+        artist['imdb_id']: {key: value for key, value in artist.items() if key not in CREDIT_FIELDS}
+        for artist in artists
+    }
+    found_artists = Artist.objects.in_bulk(list(artists_by_imdb_id), field_name='imdb_id')
+
+    missing_artists = [
+        Artist(**artist) for imdb_id, artist in artists_by_imdb_id.items() if imdb_id not in found_artists
+    ]
+    if missing_artists:
+        # Another worker may insert the same artists meanwhile, so conflicts are ignored
+        # and all of them are read again (bulk_create doesn't set ids when ignoring conflicts)
+        Artist.objects.bulk_create(missing_artists, ignore_conflicts=True)
+        found_artists.update(
+            Artist.objects.in_bulk([artist.imdb_id for artist in missing_artists], field_name='imdb_id')
+        )
+
+    return found_artists
+
+
+def link_artists(film_artists: Iterable[Tuple[Film, dict]], artists: Dict[str, Artist]):
+    """
+    Adding credits of films as actors, writers and directors, with one bulk insert per role
+    film_artists is pairs of film and its artists per role, in IMDBApiCall.fetch format
+    Position of a credit is its order in the fetched list, actors get their character too
+    """
+    film_artists = list(film_artists)
+    for role in ARTIST_ROLES:
+        through = getattr(Film, role).through
+        credit_fields = [field for field in CREDIT_FIELDS if hasattr(through, field)]
+        credits = {}
+        for film, roles in film_artists:
+            for position, artist in enumerate(roles.get(role, None) or []):
+                # An artist listed twice keeps their first (higher) billing
+                credits.setdefault(
+                    (film.id, artists[artist['imdb_id']].id),
+                    dict({field: artist.get(field, None) for field in credit_fields}, position=position)
+                )
+        through.objects.bulk_create(
+            [
+                through(film_id=film_id, artist_id=artist_id, **credit)
+                for (film_id, artist_id), credit in credits.items()
+            ],
+            ignore_conflicts=True
+        )
+
+
+def save_fetched_films(found_films: Iterable[dict]) -> List[Film]:
+    """
+    Saving films fetched by IMDBApiCall.fetch with their artists
+    Artists, films and links are inserted in bulk, so number of queries doesn't depend on number of films or artists
+    """
+    films, film_artists = [], []
+    for found_film in found_films:
+        found_film = dict(found_film)
+        roles = {role: found_film.pop(role, None) or [] for role in ARTIST_ROLES}
+        film = Film(**found_film)
+        films.append(film)
+        film_artists.append((film, roles))
+
+    with transaction.atomic():
+        artists = upsert_artists(
+            artist for _, roles in film_artists for role_artists in roles.values() for artist in role_artists
+        )
+        Film.objects.bulk_create(films)
+        # bulk_create doesn't send post_save
+        Film.objects.filter(pk__in=[film.pk for film in films]).update_search_vector()
+        link_artists(film_artists, artists)
+        film_detail_cache.invalidate([film.pk for film in films])
+
+    return films
+
+
+def save_fetched_film(found_film: dict) -> Film:
+    """
+    Saving film fetched by IMDBApiCall.fetch with its artists
+    """
+    return save_fetched_films([found_film])[0]
+
+
+def ingest_film(imdb_id: str) -> Film:
+    """
+    Fetching film from IMDB and saving it in db, its media get downloaded in background
+    If film already exists, it's returned without fetching
+    """
+    existing_film = Film.active_objects.active().filter(imdb_id=imdb_id).first()
+    if existing_film:
+        return existing_film
+
+    film = save_fetched_film(IMDBApiCall().fetch(imdb_id))
+    transaction.on_commit(lambda: media_pipeline.enqueue([film.id]))
+    return film
+
+
+def enqueue_ingestion(imdb_id: str) -> IngestionJob:
+    """
+    Enqueueing ingestion of film
+    If there is an unfinished job for that film, it's returned instead of making another one
+    A unique constraint on unfinished jobs makes concurrent enqueues get the same job
+    """
+    job, _ = IngestionJob.active_objects.active().exclude(
+        status__in=IngestionJob.FINISHED_STATUSES
+    ).get_or_create(
+        imdb_id=imdb_id,
+        is_active=True
+    )
+    return job
+
+
+def claim_ingestion_job() -> Optional[IngestionJob]:
+    """
+    Claiming the oldest pending job due for an attempt (or a running one whose worker seems dead)
+    Locked rows are skipped, so several workers can run together
+    Running jobs whose worker died on their last attempt are failed, not to be claimed forever
+    """
+    now = timezone.now()
+    timed_out = Q(
+        status__in=[IngestionJob.Status.FETCHING, IngestionJob.Status.SAVING, IngestionJob.Status.MEDIA],
+        updated_time__lt=now - timedelta(seconds=settings.FILM_INGESTION_JOB_TIMEOUT)
+    )
+
+    with transaction.atomic():
+        IngestionJob.active_objects.active().filter(
+            timed_out, attempts__gte=settings.FILM_INGESTION_MAX_ATTEMPTS
+        ).update(status=IngestionJob.Status.FAILED, error="Worker timed out", updated_time=now)
+
+        job = IngestionJob.active_objects.active().select_for_update(
+            skip_locked=True
+        ).filter(
+            Q(status=IngestionJob.Status.PENDING, next_attempt_at__lte=now) |
+            Q(timed_out, attempts__lt=settings.FILM_INGESTION_MAX_ATTEMPTS)
+        ).order_by('created_time').first()
+
+        if not job:
+            return None
+
+        job.set_status(IngestionJob.Status.FETCHING, attempts=job.attempts + 1)
+
+    return job
+
+
+def run_ingestion_job(job: IngestionJob) -> IngestionJob:
+    try:
+        film = Film.active_objects.active().filter(imdb_id=job.imdb_id).first()
+        if not film:
+            found_film = IMDBApiCall().fetch(job.imdb_id)
+            job.set_status(IngestionJob.Status.SAVING)
+            film = save_fetched_film(found_film)
+
+        if film.media_status != Film.MediaStatus.DONE:
+            job.set_status(IngestionJob.Status.MEDIA, film=film)
+            media_pipeline.download_film_media(film.id)
+    except Exception as e:                                                  # noqa
+        if job.attempts < settings.FILM_INGESTION_MAX_ATTEMPTS:
+            backoff = settings.FILM_INGESTION_BACKOFF * 2 ** (job.attempts - 1)
+            job.set_status(
+                IngestionJob.Status.PENDING,
+                error=str(e),
+                next_attempt_at=timezone.now() + timedelta(seconds=backoff)
+            )
+        else:
+            job.set_status(IngestionJob.Status.FAILED, error=str(e))
+        return job
+
+    job.set_status(IngestionJob.Status.DONE, film=film, error=None)
+    return job
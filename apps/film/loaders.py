@@ -0,0 +1,143 @@
+from typing import Iterable, List
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber
+
+from apps.film import constants
+from apps.film.models import Film
+
+User = get_user_model()
+
+
+class FilmRelationLoader:
+    """
+    Request scoped loader for relations of request user with films
+    Relations of all films of a page are loaded with one query,
+    so the cost depends on page size, not on how popular the films are
+    """
+    RELATIONS = ('is_watched', 'is_watchlist', 'is_fav', 'has_post')
+
+    def __init__(self, user):
+        self.user = user
+        self._relations = {}
+
+    @classmethod
+    def for_request(cls, request) -> 'FilmRelationLoader':
+        loader = getattr(request, '_film_relation_loader', None)
+        if loader is None or loader.user != request.user:
+            loader = cls(user=request.user)
+            request._film_relation_loader = loader
+        return loader
+
+    def load(self, films: Iterable[Film]):
+        """
+        Loading relations of films which are not loaded yet
+        Films that already have relations annotated (FilmQuerySet.with_user_relations) don't need a query
+        """
+        film_ids = set()
+        for film in films:
+            if film.pk in self._relations:
+                continue
+            if all(hasattr(film, relation) for relation in self.RELATIONS):
+                self._relations[film.pk] = {
+                    relation: getattr(film, relation) for relation in self.RELATIONS
+                }
+                continue
+            film_ids.add(film.pk)
+
+        if not film_ids:
+            return
+
+        # Films that are not found have no relation with user
+        for film_id in film_ids:
+            self._relations[film_id] = dict.fromkeys(self.RELATIONS, False)
+
+        if not self.user.is_authenticated:
+            return
+
+        relations = Film.objects.filter(
+            pk__in=film_ids
+        ).with_user_relations(
+            user=self.user
+        ).order_by().values('pk', *self.RELATIONS)
+
+        for relation in relations:
+            self._relations[relation.pop('pk')] = relation
+
+    def get(self, film: Film, relation: str) -> bool:
+        if film.pk not in self._relations:
+            self.load([film])
+        return self._relations[film.pk][relation]
+
+
+class FilmWatchedByLoader:
+    """
+    Request scoped loader for followings of request user who watched each film
+    For all films of a page, it takes one query for the capped watchers and their total count,
+    and one query for the users with their profiles
+    """
+
+    def __init__(self, user, limit: int = None):
+        self.user = user
+        self.limit = limit or constants.WATCHED_BY_LIMIT
+        self._watched_by = {}
+        self._counts = {}
+
+    @classmethod
+    def for_request(cls, request) -> 'FilmWatchedByLoader':
+        loader = getattr(request, '_film_watched_by_loader', None)
+        if loader is None or loader.user != request.user:
+            loader = cls(user=request.user)
+            request._film_watched_by_loader = loader
+        return loader
+
+    def load(self, films: Iterable[Film]):
+        film_ids = {film.pk for film in films if film.pk not in self._watched_by}
+        if not film_ids:
+            return
+
+        for film_id in film_ids:
+            self._watched_by[film_id] = []
+            self._counts[film_id] = 0
+
+        if not self.user.is_authenticated:
+            return
+
+        # Most recent watchers first, numbered and counted per film
+        watchers = User.films_watched.through.objects.filter(
+            film_id__in=film_ids,
+            user__followers=self.user,
+            user__is_active=True,
+        ).annotate(
+            rank=Window(RowNumber(), partition_by=[F('film_id')], order_by=F('id').desc()),
+            total=Window(Count('*'), partition_by=[F('film_id')]),
+        ).order_by().values('film_id', 'user_id', 'rank', 'total')
+
+        # Window annotations can't be filtered by the ORM, so the capping is done on top of its query
+        sql, params = watchers.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT film_id, user_id, total FROM ({sql}) AS watchers WHERE rank <= %s ORDER BY film_id, rank",
+                [*params, self.limit]
+            )
+            rows = cursor.fetchall()
+
+        users = User.objects.filter(pk__in={user_id for _, user_id, _ in rows}).select_related('profile').in_bulk()
+        for film_id, user_id, total in rows:
+            self._counts[film_id] = total
+            if user_id in users:
+                # Watchers are followings of request user, UserListSerializer doesn't need to check it
+                users[user_id].is_followed = True
+                self._watched_by[film_id].append(users[user_id])
+
+    def get(self, film: Film) -> List:
+        if film.pk not in self._watched_by:
+            self.load([film])
+        return self._watched_by[film.pk]
+
+    def count(self, film: Film) -> int:
+        if film.pk not in self._counts:
+            self.load([film])
+        return self._counts[film.pk]
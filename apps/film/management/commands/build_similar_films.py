@@ -0,0 +1,34 @@
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.film import constants
+from apps.film.recommendations import build_similar_films
+
+
+class Command(BaseCommand):
+    help = 'Building similar films of each film from watched and favorite films of users, to be run periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k', type=int, default=constants.SIMILAR_FILMS_COUNT, help='Number of similar films kept per film'
+        )
+        parser.add_argument(
+            '--block-cells',
+            type=int,
+            default=constants.SIMILARITY_BLOCK_CELLS,
+            help='Max cells of each similarity block, bounds memory usage',
+        )
+
+    def handle(self, *args, **options):
+        start_time = time.monotonic()
+        stats = build_similar_films(k=options['top_k'], block_cells=options['block_cells'])
+
+        self.stdout.write(self.style.SUCCESS(
+            'Built %(neighbours)s similar films of %(films)s films from %(interactions)s interactions '
+            'of %(users)s users' % stats
+        ))
+        self.stdout.write('Took %.1fs, max memory %.1f MB' % (
+            time.monotonic() - start_time, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        ))
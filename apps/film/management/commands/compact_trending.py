@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from apps.film import constants
+from apps.film.trending import trending_films
+
+
+class Command(BaseCommand):
+    help = 'Rebasing trending scores of films and dropping the decayed ones, to be run periodically (e.g. daily)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-score',
+            type=float,
+            default=constants.TRENDING_MIN_SCORE,
+            help='Films whose decayed score is below this are dropped',
+        )
+
+    def handle(self, *args, **options):
+        kept, removed = trending_films.compact(min_score=options['min_score'])
+        self.stdout.write(self.style.SUCCESS('Kept %s trending films, removed %s' % (kept, removed)))
@@ -1,13 +1,32 @@
 from django.core.management.base import BaseCommand
+from django.db.models import Q
 
+from apps.film.media import media_pipeline
 from apps.film.models import Film
 
 
 class Command(BaseCommand):
     help = 'Downloading posters and banners of films'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Downloading media of films which their download failed before too',
+        )
+
     def handle(self, *args, **options):
-        for film in Film.active_objects.filter(photo__isnull=True):
-            film.save()
+        statuses = [Film.MediaStatus.PENDING]
+        if options['retry_failed']:
+            statuses.append(Film.MediaStatus.FAILED)
+
+        # Films left downloading by a dead worker are downloaded again too
+        film_ids = Film.active_objects.active().filter(
+            Q(media_status__in=statuses) | media_pipeline.stale_downloads()
+        ).values_list('id', flat=True)
 
-            self.stdout.write(self.style.SUCCESS('Successfully downloaded "%s"' % film.name))
+        for film_id, status in media_pipeline.run(film_ids).items():
+            if status == Film.MediaStatus.DONE:
+                self.stdout.write(self.style.SUCCESS('Successfully downloaded media of film %s' % film_id))
+            else:
+                self.stdout.write(self.style.ERROR('Failed to download media of film %s' % film_id))
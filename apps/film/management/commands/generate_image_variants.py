@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from apps.account.models import Profile
+from apps.film.models import Film
+
+
+class Command(BaseCommand):
+    help = 'Generating resized variants of film and profile images which do not have them yet'
+
+    def handle(self, *args, **options):
+        for model in (Film, Profile):
+            for field in ('photo', 'banner'):
+                instances = model.active_objects.active().exclude(
+                    Q(**{f'{field}__isnull': True}) | Q(**{field: ''})
+                ).filter(**{f'{field}_variants': {}})
+
+                for instance in instances.iterator():
+                    try:
+                        instance.update_image_variants(fields=[field])
+                    except (OSError, ValueError) as e:
+                        self.stdout.write(self.style.ERROR('Failed "%s" %s: %s' % (instance, field, e)))
+                        continue
+
+                    self.stdout.write(self.style.SUCCESS('Generated "%s" %s variants' % (instance, field)))
@@ -1,28 +1,154 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Optional, Set, Tuple
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Q
 
-from apps.film import constants
 from apps.film.models import Film
-from django.conf import settings
+from apps.film.utils import IMDBApiCall
+from core.utils.rate_limit import RateLimiter
 
-from core.utils.api import ApiCall
+logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
-    help = 'Downloading posters and banners of films'
+    help = 'Adding genres of films which have no genres, fetched from IMDB'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Number of concurrent IMDB calls')
+        parser.add_argument(
+            '--rate', type=float, default=settings.IMDB_API_RATE, help='Max requests per second made to IMDB'
+        )
+        parser.add_argument('--batch-size', type=int, default=100, help='Number of films updated at once')
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.BASE_DIR, '.get_genres_checkpoint.json'),
+            help='File keeping the last processed film and the failed ones, reruns resume after it and retry them',
+        )
+        parser.add_argument('--restart', action='store_true', help='Ignoring the checkpoint, starting over')
+        parser.add_argument('--dry-run', action='store_true', help='Just reporting the films to be processed')
 
     def handle(self, *args, **options):
-        for film in Film.active_objects.filter(genres__isnull=True):
-            url = f"{constants.IMDB_API_URL}/en/API/Title/{settings.IMDB_API_KEY}/" + film.imdb_id
+        checkpoint = options['checkpoint']
+        last_film_id, failed_film_ids = (None, set()) if options['restart'] else self.read_checkpoint(checkpoint)
+
+        films = Film.active_objects.active().filter(genres__isnull=True).order_by('id')
+        if last_film_id:
+            # Films that failed in earlier runs are retried
+            films = films.filter(Q(id__gt=last_film_id) | Q(id__in=failed_film_ids))
+        total = films.count()
+
+        if last_film_id:
+            self.stdout.write('Resuming after film %s, retrying %s failed films' % (last_film_id, len(failed_film_ids)))
+        if options['dry_run']:
+            self.stdout.write('%s films would get their genres fetched' % total)
+            return
+
+        imdb_api = IMDBApiCall(rate_limiter=RateLimiter(options['rate']))
+        processed = updated = failed = 0
+        start_time = time.monotonic()
+
+        films_queue = queue.Queue()
+        fetched_genres = {}
+
+        def fetch_genres(film: Film) -> Optional[list]:
+            try:
+                return imdb_api.fetch(film.imdb_id)['genres']
+            except Exception:                                               # noqa
+                # Not just ApiCallException, a worker thread must not die on an unexpected payload
+                logger.exception("Failed to fetch genres of film %s", film.imdb_id)
+                return None
+
+        def fetch_worker():
+            try:
+                for film in iter(films_queue.get, None):
+                    try:
+                        fetched_genres[film.id] = fetch_genres(film)
+                    finally:
+                        films_queue.task_done()
+            finally:
+                # Each thread has its own db connection (payloads are read through IMDBTitle), closed when it's done
+                connections.close_all()
+
+        workers = [
+            threading.Thread(target=fetch_worker, name=f'get-genres-{i}', daemon=True)
+            for i in range(options['workers'])
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            cursor_id = 0
+            while True:
+                batch = list(films.filter(id__gt=cursor_id).only('id', 'imdb_id')[:options['batch_size']])
+                if not batch:
+                    break
+
+                fetched_genres.clear()
+                for film in batch:
+                    films_queue.put(film)
+                films_queue.join()
+
+                changed_films = []
+                for film in batch:
+                    genres = fetched_genres.get(film.id, None)
+                    if genres is None:
+                        failed_film_ids.add(film.id)
+                        failed += 1
+                        continue
+                    failed_film_ids.discard(film.id)
+                    if genres:
+                        film.genres = genres
+                        changed_films.append(film)
+
+                # Not film.save, to skip media downloads and other side effects of saving
+                Film.objects.bulk_update(changed_films, ['genres'])
+                Film.mark_changed([film.pk for film in changed_films])
+
+                processed += len(batch)
+                updated += len(changed_films)
+                cursor_id = batch[-1].id
+                # Retried films come before the checkpoint, so it never moves back
+                last_film_id = max(last_film_id or 0, cursor_id)
+                self.write_checkpoint(checkpoint, last_film_id, failed_film_ids)
 
-            res = ApiCall.api_call(
-                method="get",
-                url=url,
-                expected_status=200
-            )
+                elapsed = time.monotonic() - start_time
+                self.stdout.write(
+                    '%s/%s films processed, %s updated, %s failed (%.1f films/s)' % (
+                        processed, total, updated, failed, processed / elapsed if elapsed else 0
+                    )
+                )
+        finally:
+            for _ in workers:
+                films_queue.put(None)
+            for worker in workers:
+                worker.join()
 
-            genres = [attr['value'] for attr in res.json().get('genreList', None)]
+        self.stdout.write(self.style.SUCCESS('Genres added to %s films, %s failed' % (updated, failed)))
 
-            film.genres = genres
-            film.save()
+    @staticmethod
+    def read_checkpoint(path: str) -> Tuple[Optional[int], Set[int]]:
+        """
+        Last processed film and the films that failed, to be retried
+        """
+        try:
+            with open(path) as checkpoint:
+                checkpoint = json.load(checkpoint)
+            return checkpoint['last_film_id'], set(checkpoint.get('failed_film_ids', []))
+        except (OSError, ValueError, KeyError):
+            return None, set()
 
-            self.stdout.write(self.style.SUCCESS('Genre added successfully "%s"' % film.name))
+    @staticmethod
+    def write_checkpoint(path: str, last_film_id: int, failed_film_ids: Set[int]):
+        # Written to a temp file first, so a killed run doesn't leave a broken checkpoint
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as checkpoint:
+            json.dump({'last_film_id': last_film_id, 'failed_film_ids': sorted(failed_film_ids)}, checkpoint)
+        os.replace(tmp_path, path)
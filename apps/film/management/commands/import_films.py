@@ -0,0 +1,195 @@
+import json
+import logging
+import queue
+import threading
+import time
+from itertools import islice
+from typing import Iterator, Optional
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DataError, IntegrityError, connections
+
+from apps.film.ingestion import save_fetched_films, validate_fetched_film
+from apps.film.models import Film
+from apps.film.utils import IMDBApiCall
+from core.exceptions import ApiCallException
+from core.utils.rate_limit import RateLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Importing films in bulk, from a file of imdb ids or a JSONL dump of fetched films'
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--ids', help='File with one imdb id per line, films are fetched from IMDB')
+        source.add_argument(
+            '--jsonl', help='File with one film per line, in IMDBApiCall.fetch format, nothing is fetched'
+        )
+        parser.add_argument('--workers', type=int, default=8, help='Number of concurrent IMDB calls')
+        parser.add_argument(
+            '--rate', type=float, default=settings.IMDB_API_RATE, help='Max requests per second made to IMDB'
+        )
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of films inserted at once')
+
+    def handle(self, *args, **options):
+        try:
+            if options['ids']:
+                found_films = self.fetch_films(self.read_ids(options['ids']), options['workers'], options['rate'])
+            else:
+                found_films = self.read_jsonl(options['jsonl'])
+            self.import_films(found_films, options['batch_size'])
+        except OSError as e:
+            raise CommandError(e)
+
+    def import_films(self, found_films: Iterator[Optional[dict]], batch_size: int):
+        imported = skipped = failed = 0
+        start_time = time.monotonic()
+        seen_imdb_ids = set()
+
+        while True:
+            batch = list(islice(found_films, batch_size))
+            if not batch:
+                break
+
+            failed += batch.count(None)
+            # Invalid films are reported and skipped, not to fail the whole import
+            valid_films = []
+            for found_film in batch:
+                if found_film is None:
+                    continue
+                error = validate_fetched_film(found_film)
+                if error:
+                    self.stderr.write('Skipped invalid film %s: %s' % (self.imdb_id_of(found_film), error))
+                    failed += 1
+                    continue
+                valid_films.append(found_film)
+            batch = valid_films
+
+            # Dedupe in the batch, against previous batches, and against films already in db
+            existing_imdb_ids = set(
+                Film.objects.filter(
+                    imdb_id__in=[found_film['imdb_id'] for found_film in batch]
+                ).values_list('imdb_id', flat=True)
+            )
+            new_films = []
+            for found_film in batch:
+                if found_film['imdb_id'] in existing_imdb_ids or found_film['imdb_id'] in seen_imdb_ids:
+                    skipped += 1
+                    continue
+                seen_imdb_ids.add(found_film['imdb_id'])
+                new_films.append(found_film)
+
+            # Media are left pending, to be downloaded by download_photos
+            try:
+                save_fetched_films(new_films)
+                imported += len(new_films)
+            except (IntegrityError, DataError):
+                # Batch is rolled back, its films are saved one by one to skip just the failing ones
+                for found_film in new_films:
+                    try:
+                        save_fetched_films([found_film])
+                        imported += 1
+                    except (IntegrityError, DataError) as e:
+                        self.stderr.write('Failed to save film %s: %s' % (found_film['imdb_id'], e))
+                        failed += 1
+
+            elapsed = time.monotonic() - start_time
+            self.stdout.write(
+                '%s films imported, %s skipped, %s failed (%.1f films/s)' % (
+                    imported, skipped, failed, (imported + skipped) / elapsed if elapsed else 0
+                )
+            )
+
+        self.stdout.write(self.style.SUCCESS(
+            'Imported %s films in %.1fs, run download_photos to download their media' % (
+                imported, time.monotonic() - start_time
+            )
+        ))
+
+    def fetch_films(self, imdb_ids: Iterator[str], workers: int, rate: float) -> Iterator[Optional[dict]]:
+        """
+        Fetched films in order of imdb_ids, None for the ones failed to fetch
+        """
+        imdb_api = IMDBApiCall(rate_limiter=RateLimiter(rate))
+        existing_imdb_ids = set(Film.objects.values_list('imdb_id', flat=True))
+
+        ids_queue = queue.Queue()
+        fetched_films = {}
+
+        def fetch(imdb_id: str) -> Optional[dict]:
+            try:
+                return imdb_api.fetch(imdb_id)
+            except (ApiCallException, KeyError, ValueError, TypeError):
+                logger.exception("Failed to fetch film %s", imdb_id)
+                return None
+
+        def fetch_worker():
+            try:
+                for index, imdb_id in iter(ids_queue.get, None):
+                    try:
+                        fetched_films[index] = fetch(imdb_id)
+                    except Exception as e:                                  # noqa
+                        # Raised by the command, not to leave the film out silently
+                        fetched_films[index] = e
+                    finally:
+                        ids_queue.task_done()
+            finally:
+                # Each thread has its own db connection (payloads are read through IMDBTitle), closed when it's done
+                connections.close_all()
+
+        threads = [
+            threading.Thread(target=fetch_worker, name=f'import-films-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            # Not fetching films which already exist
+            imdb_ids = (imdb_id for imdb_id in imdb_ids if imdb_id not in existing_imdb_ids)
+            while True:
+                chunk = list(islice(imdb_ids, workers * 10))
+                if not chunk:
+                    break
+
+                for index, imdb_id in enumerate(chunk):
+                    ids_queue.put((index, imdb_id))
+                ids_queue.join()
+                found_films = [fetched_films.pop(index) for index in range(len(chunk))]
+                for found_film in found_films:
+                    if isinstance(found_film, Exception):
+                        raise found_film
+                yield from found_films
+        finally:
+            for _ in threads:
+                ids_queue.put(None)
+            for thread in threads:
+                thread.join()
+
+    @staticmethod
+    def imdb_id_of(found_film) -> Optional[str]:
+        return found_film.get('imdb_id', None) if isinstance(found_film, dict) else None
+
+    @staticmethod
+    def read_ids(path: str) -> Iterator[str]:
+        with open(path) as ids_file:
+            for line in ids_file:
+                if line.strip():
+                    yield line.strip()
+
+    def read_jsonl(self, path: str) -> Iterator[Optional[dict]]:
+        """
+        Films of dump, None for lines which are not valid json
+        """
+        with open(path) as jsonl_file:
+            for line_number, line in enumerate(jsonl_file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    self.stderr.write(f"Skipped invalid json in line {line_number} of {path}")
+                    yield None
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.film.models import Film, FilmGenreAggregate
+from apps.post.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Rebuilding genre aggregates of films from their active posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--film', type=int, nargs='*', help='Ids of films to rebuild, all films by default')
+
+    def handle(self, *args, **options):
+        posts = Post.objects.filter(is_active=True, film__isnull=False)
+        aggregates = FilmGenreAggregate.objects.all()
+        films = Film.objects.all()
+        if options['film']:
+            posts = posts.filter(film_id__in=options['film'])
+            aggregates = aggregates.filter(film_id__in=options['film'])
+            films = films.filter(id__in=options['film'])
+
+        votes = {}
+        for film_id, genres in posts.order_by().values_list('film_id', 'genres').iterator():
+            for genre, value in FilmGenreAggregate.votes_of(genres).items():
+                votes_sum, votes_count = votes.get((film_id, genre), (0, 0))
+                votes[(film_id, genre)] = (votes_sum + value, votes_count + 1)
+
+        with transaction.atomic():
+            aggregates.delete()
+            FilmGenreAggregate.objects.bulk_create(
+                [
+                    FilmGenreAggregate(film_id=film_id, genre=genre, votes_sum=votes_sum, votes_count=votes_count)
+                    for (film_id, genre), (votes_sum, votes_count) in votes.items()
+                ],
+                batch_size=1000
+            )
+            film_ids = list(films.values_list('id', flat=True))
+            Film.update_genre_embeddings(film_ids)
+            Film.mark_changed(film_ids)
+
+        self.stdout.write(self.style.SUCCESS('Rebuilt %s genre aggregates' % len(votes)))
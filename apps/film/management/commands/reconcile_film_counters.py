@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from apps.film.models import Film
+
+
+class Command(BaseCommand):
+    help = 'Repairing engagement counters of films which drifted from their relations and posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Just reporting the drifted films')
+
+    def handle(self, *args, **options):
+        drifted = Film.objects.all().reconcile_counters(dry_run=options['dry_run'])
+
+        if options['dry_run']:
+            self.stdout.write('%s films have drifted counters' % drifted)
+        else:
+            self.stdout.write(self.style.SUCCESS('Repaired counters of %s films' % drifted))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from apps.film.constants import RANKING_ORDERINGS
+from apps.film.models import FilmRanking
+
+
+class Command(BaseCommand):
+    help = 'Refreshing snapshot of home list orderings, to be run periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ordering',
+            nargs='*',
+            choices=list(RANKING_ORDERINGS),
+            help='Orderings to refresh, all of them by default',
+        )
+
+    def handle(self, *args, **options):
+        for ordering in options['ordering'] or RANKING_ORDERINGS:
+            ranked = FilmRanking.refresh(ordering)
+            self.stdout.write(self.style.SUCCESS('Ranked %s films by %s' % (ranked, ordering)))
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.film.ingestion import claim_ingestion_job, run_ingestion_job
+
+
+class Command(BaseCommand):
+    help = 'Running film ingestion jobs enqueued by film create api'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit when there is no pending job, instead of waiting for new ones',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1,
+            help='Seconds to wait before checking for new jobs again',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_ingestion_job()
+            if not job:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            job = run_ingestion_job(job)
+
+            if job.status == job.Status.DONE:
+                self.stdout.write(self.style.SUCCESS('Film ingested "%s"' % job.imdb_id))
+            elif job.status == job.Status.PENDING:
+                self.stdout.write(self.style.WARNING('Film ingestion will be retried "%s": %s' % (job.imdb_id, job.error)))
+            else:
+                self.stdout.write(self.style.ERROR('Film ingestion failed "%s": %s' % (job.imdb_id, job.error)))
@@ -0,0 +1,44 @@
+import os
+import resource
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.film import constants
+from apps.film.recommendations import train_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Training "for you" recommendations from watched, favorite, watchlist films and posts of users, ' \
+           'to be run periodically'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--factors', type=int, default=constants.FACTORIZATION_FACTORS, help='Number of factors per user and film'
+        )
+        parser.add_argument('--iterations', type=int, default=constants.FACTORIZATION_ITERATIONS)
+        parser.add_argument('--regularization', type=float, default=constants.FACTORIZATION_REGULARIZATION)
+        parser.add_argument('--alpha', type=float, default=constants.FACTORIZATION_ALPHA)
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1, help='Number of processes solving factors'
+        )
+
+    def handle(self, *args, **options):
+        start_time = time.monotonic()
+        stats = train_recommendations(
+            factors=options['factors'],
+            iterations=options['iterations'],
+            regularization=options['regularization'],
+            alpha=options['alpha'],
+            workers=options['workers'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            'Trained %(factors)s factors of %(users)s users and %(films)s films from %(interactions)s interactions'
+            % stats
+        ))
+        self.stdout.write('Took %.1fs, max memory %.1f MB (workers %.1f MB)' % (
+            time.monotonic() - start_time,
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        ))
@@ -0,0 +1,177 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db.models import Exists, OuterRef, F, FloatField, Prefetch, Subquery, Count, Sum, Q, Value
+from django.db.models.functions import Cast, NullIf, Coalesce, Ln
+from django.utils import timezone
+
+from apps.film import constants
+from apps.film.detail_cache import film_detail_cache
+from apps.post.models import Post
+from core.models.manager import ActiveModelManager
+from core.models.query import ActiveQuerySet
+
+User = get_user_model()
+
+
+def user_relations(user, film_id=OuterRef('pk')) -> dict:
+    """
+    EXISTS lookups of relations of user with the film of film_id, to be annotated on any queryset having the film
+    """
+    return {
+        'is_watched': Exists(User.films_watched.through.objects.filter(film_id=film_id, user_id=user.pk)),
+        'is_watchlist': Exists(User.films_watchlist.through.objects.filter(film_id=film_id, user_id=user.pk)),
+        'is_fav': Exists(User.film_favorites.through.objects.filter(film_id=film_id, user_id=user.pk)),
+        'has_post': Exists(Post.objects.filter(film_id=film_id, user_id=user.pk, is_active=True)),
+    }
+
+
+class FilmQuerySet(ActiveQuerySet):
+
+    def with_user_relations(self, user):
+        """
+        Annotating relations of user with each film: is_watched, is_watchlist, is_fav, has_post
+        Each relation is an EXISTS lookup, so it doesn't get heavier by the number of film users
+        """
+        return self.annotate(**user_relations(user))
+
+    def update_counters(self, **deltas):
+        """
+        Adding deltas to stored counters of films with one UPDATE, e.g. update_counters(watched_count=1)
+        rate_avg is recomputed from rate_sum and rate_count, if they change
+        """
+        updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        if not updates:
+            return 0
+
+        if 'rate_sum' in updates or 'rate_count' in updates:
+            # Right side of an UPDATE sees the old values, so deltas are added here too
+            updates['rate_avg'] = (F('rate_sum') + deltas.get('rate_sum', 0)) / NullIf(
+                Cast(F('rate_count') + deltas.get('rate_count', 0), FloatField()), 0.0
+            )
+        return self.update(**updates)
+
+    def with_actual_counters(self):
+        """
+        Annotating counters computed from relations and posts (actual_watched_count, ...) to compare with stored ones
+        """
+        def count(queryset, aggregate=Count('*')):
+            return Coalesce(
+                Subquery(queryset.order_by().values('film_id').annotate(value=aggregate).values('value')),
+                Value(0)
+            )
+
+        posts = Post.objects.filter(film_id=OuterRef('pk'), is_active=True)
+        return self.annotate(
+            actual_watched_count=count(User.films_watched.through.objects.filter(film_id=OuterRef('pk'))),
+            actual_watchlist_count=count(User.films_watchlist.through.objects.filter(film_id=OuterRef('pk'))),
+            actual_faved_count=count(User.film_favorites.through.objects.filter(film_id=OuterRef('pk'))),
+            actual_posts_count=count(posts),
+            actual_rate_sum=count(posts.filter(rate__isnull=False), Sum('rate')),
+            actual_rate_count=count(posts.filter(rate__isnull=False)),
+        )
+
+    def reconcile_counters(self, dry_run: bool = False) -> int:
+        """
+        Repairing stored counters which drifted from the actual ones, returns number of drifted films
+        """
+        drifted = Q()
+        for counter in self.model.COUNTERS:
+            drifted |= ~Q(**{counter: F(f'actual_{counter}')})
+
+        films = []
+        now = timezone.now()
+        for film in self.with_actual_counters().filter(drifted).only('pk').iterator():
+            for counter in self.model.COUNTERS:
+                setattr(film, counter, getattr(film, f'actual_{counter}'))
+            film.rate_avg = film.rate_sum / film.rate_count if film.rate_count else None
+            film.updated_time = now
+            films.append(film)
+
+        if not dry_run:
+            self.model.objects.bulk_update(
+                films, [*self.model.COUNTERS, 'rate_avg', 'updated_time'], batch_size=1000
+            )
+            film_detail_cache.invalidate([film.pk for film in films])
+        return len(films)
+
+    def update_search_vector(self):
+        return self.update(
+            search_vector=(
+                SearchVector('name', weight='A', config=constants.SEARCH_CONFIG) +
+                SearchVector(Coalesce('plot', Value('')), weight='B', config=constants.SEARCH_CONFIG)
+            )
+        )
+
+    def search(self, query: str):
+        """
+        Films matching query by full text search on name and plot, or by trigram similarity of name (for typos)
+        Ordered by relevance, weighted by popularity
+        """
+        search_query = SearchQuery(query, config=constants.SEARCH_CONFIG)
+        return self.filter(
+            Q(search_vector=search_query) | Q(name__trigram_similar=query)
+        ).annotate(
+            relevance=SearchRank(F('search_vector'), search_query) + TrigramSimilarity('name', query),
+            # Popularity only grows the score logarithmically, relevance stays the main factor
+            score=F('relevance') * Ln(F('watched_count') + F('faved_count') + Value(2.0)),
+        ).order_by('-score', '-id')
+
+    def with_credits(self):
+        """
+        Prefetching actors, writers and directors credits of films with their artists, in billing order
+        One query per role, whatever the number of films
+        """
+        return self.prefetch_related(*(
+            Prefetch(credits, queryset=self.model._meta.get_field(credits).related_model.objects.select_related(
+                'artist'
+            ))
+            for credits in ('cast', 'writer_credits', 'director_credits')
+        ))
+
+    def of_artist(self, artist_id: int):
+        """
+        Films artist acted in, wrote or directed, each film once, ordered by year
+        Films are matched by id in the union of the role through tables,
+        with a boolean annotation per role: is_actor, is_writer, is_director
+        """
+        throughs = {
+            role: getattr(self.model, field).through for role, field in constants.ARTIST_ROLE_FIELDS.items()
+        }
+        role_films = [through.objects.filter(artist_id=artist_id).values('film_id') for through in throughs.values()]
+        return self.filter(
+            pk__in=role_films[0].union(*role_films[1:])
+        ).annotate(**{
+            f"is_{role}": Exists(through.objects.filter(artist_id=artist_id, film_id=OuterRef('pk')))
+            for role, through in throughs.items()
+        }).order_by(F('year').asc(nulls_last=True), 'id')
+
+    def facet_counts(self, fields=('genres', 'countries', 'languages')) -> dict:
+        """
+        Number of films of queryset per value of each array field, {field: {value: count}}
+        Counted with one grouped query over the unnested values of all fields
+        """
+        sql, params = self.order_by().values(*fields).query.sql_with_params()
+        unnested = " UNION ALL ".join(
+            f"SELECT %s AS facet, unnest({connection.ops.quote_name(field)}) AS value FROM films"
+            for field in fields
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"WITH films AS ({sql}) "
+                f"SELECT facet, value, COUNT(*) FROM ({unnested}) AS facets "
+                f"GROUP BY facet, value ORDER BY facet, COUNT(*) DESC, value",
+                [*params, *fields]
+            )
+            rows = cursor.fetchall()
+
+        facets = {field: {} for field in fields}
+        for facet, value, count in rows:
+            facets[facet][value] = count
+        return facets
+
+
+class FilmManager(ActiveModelManager):
+
+    def get_queryset(self):
+        return FilmQuerySet(model=self.model, using=self._db)
@@ -0,0 +1,145 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import Iterable
+
+import requests
+from django.conf import settings
+from django.core.files import File
+from django.core.files.temp import NamedTemporaryFile
+from django.db import connections
+from django.db.models import Q
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+
+from apps.film import constants
+from apps.film.models import Film
+
+logger = logging.getLogger(__name__)
+
+
+class MediaPipeline:
+    """
+    Downloading posters and banners of films off the caller's thread
+    Downloads are streamed to storage in chunks, retried with backoff,
+    and run by at most FILM_MEDIA_WORKERS threads
+    """
+
+    def __init__(self, max_workers: int, retries: int, backoff: float, timeout: float, download_timeout: float):
+        self.max_workers = max_workers
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.download_timeout = download_timeout
+        self._executor = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='film-media')
+        return self._executor
+
+    def enqueue(self, film_ids: Iterable[int]):
+        """
+        Downloading media of films in background threads
+        """
+        for film_id in film_ids:
+            self.executor.submit(self._run_in_thread, film_id)
+
+    def run(self, film_ids: Iterable[int]) -> dict:
+        """
+        Downloading media of films and waiting for them, returns status per film id
+        """
+        film_ids = list(film_ids)
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='film-media') as executor:
+            return dict(zip(film_ids, executor.map(self._run_in_thread, film_ids)))
+
+    def _run_in_thread(self, film_id: int) -> str:
+        try:
+            return self.download_film_media(film_id)
+        except Exception:                                                   # noqa
+            logger.exception("Failed to download media of film %s", film_id)
+            return Film.MediaStatus.FAILED
+        finally:
+            # Each thread has its own db connection
+            connections.close_all()
+
+    def stale_downloads(self) -> Q:
+        """
+        Films left downloading for longer than download_timeout, by a worker that seems dead
+        """
+        return Q(
+            media_status=Film.MediaStatus.DOWNLOADING,
+            updated_time__lt=timezone.now() - timedelta(seconds=self.download_timeout)
+        )
+
+    def download_film_media(self, film_id: int) -> str:
+        # Claiming film, so it's not downloaded by two workers at once (or left downloading by a dead one)
+        claimed = Film.objects.filter(
+            Q(media_status__in=[Film.MediaStatus.PENDING, Film.MediaStatus.FAILED]) | self.stale_downloads(),
+            pk=film_id,
+        ).update(media_status=Film.MediaStatus.DOWNLOADING, updated_time=timezone.now())
+        if not claimed:
+            return Film.objects.filter(pk=film_id).values_list('media_status', flat=True).first()
+
+        # Whatever goes wrong, film is released, so it's not left downloading and gets retried later
+        status = Film.MediaStatus.FAILED
+        try:
+            status = self._download_film_media(film_id)
+        finally:
+            Film.objects.filter(pk=film_id).update(media_status=status)
+        return status
+
+    def _download_film_media(self, film_id: int) -> str:
+        film = Film.objects.get(pk=film_id)
+        downloaded = {}
+        status = Film.MediaStatus.DONE
+        for field, url in (('photo', film.photo_url), ('banner', film.banner_url)):
+            field_file = getattr(film, field)
+            if not url or field_file:
+                continue
+            try:
+                self.download(url=url, field_file=field_file)
+                downloaded[field] = field_file.name
+            except requests.RequestException:
+                logger.exception("Failed to download %s of film %s", field, film_id)
+                status = Film.MediaStatus.FAILED
+
+        # Updating just media fields, not to overwrite other changes made meanwhile
+        Film.objects.filter(pk=film_id).update(**downloaded)
+        if downloaded:
+            Film.mark_changed([film_id])
+            try:
+                film.update_image_variants(fields=downloaded)
+            except (OSError, ValueError):
+                # Not a valid image, original file is served anyway
+                logger.exception("Failed to make image variants of film %s", film_id)
+        return status
+
+    def download(self, url: str, field_file: FieldFile):
+        file_name = url.split('/')[-1]
+        for attempt in range(self.retries):
+            try:
+                with requests.get(url, stream=True, timeout=self.timeout) as res:
+                    res.raise_for_status()
+                    with NamedTemporaryFile() as img_tmp:
+                        for chunk in res.iter_content(chunk_size=constants.MEDIA_CHUNK_SIZE):
+                            img_tmp.write(chunk)
+                        img_tmp.flush()
+                        img_tmp.seek(0)
+                        field_file.save(file_name, File(img_tmp), save=False)
+                return
+            except requests.RequestException:
+                if attempt == self.retries - 1:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+
+media_pipeline = MediaPipeline(
+    max_workers=settings.FILM_MEDIA_WORKERS,
+    retries=settings.FILM_MEDIA_RETRIES,
+    backoff=settings.FILM_MEDIA_BACKOFF,
+    timeout=settings.FILM_MEDIA_TIMEOUT,
+    download_timeout=settings.FILM_MEDIA_DOWNLOAD_TIMEOUT,
+)
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:26
+
+from django.db import migrations, models
+import django.db.models.manager
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0008_auto_20211104_1432'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IMDBTitle',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(db_index=True, default=True, help_text='Designates whether this item should be treated as active. Unselected this instead of deleting.', verbose_name='Active status')),
+                ('created_time', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Creation On')),
+                ('updated_time', models.DateTimeField(auto_now=True, verbose_name='Modified On')),
+                ('imdb_id', models.CharField(max_length=20, unique=True)),
+                ('payload', models.BinaryField()),
+                ('etag', models.CharField(blank=True, max_length=255, null=True)),
+                ('last_modified', models.CharField(blank=True, max_length=64, null=True)),
+                ('fetched_time', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-created_time', '-updated_time'],
+                'abstract': False,
+            },
+            managers=[
+                ('active_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:27
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0009_imdbtitle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestionJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(db_index=True, default=True, help_text='Designates whether this item should be treated as active. Unselected this instead of deleting.', verbose_name='Active status')),
+                ('created_time', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Creation On')),
+                ('updated_time', models.DateTimeField(auto_now=True, verbose_name='Modified On')),
+                ('imdb_id', models.CharField(db_index=True, max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('fetching', 'Fetching'), ('saving', 'Saving'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('film', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ingestion_jobs', to='film.film')),
+            ],
+            options={
+                'ordering': ['-created_time', '-updated_time'],
+                'abstract': False,
+            },
+            managers=[
+                ('active_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:29
+
+from django.db import migrations, models
+from django.db.models import Q
+
+
+def mark_downloaded_media_done(apps, schema_editor):
+    Film = apps.get_model('film', 'Film')
+
+    def missing(field):
+        has_url = Q(**{f'{field}_url__isnull': False}) & ~Q(**{f'{field}_url': ''})
+        has_file = Q(**{f'{field}__isnull': False}) & ~Q(**{field: ''})
+        return has_url & ~has_file
+
+    Film._default_manager.exclude(missing('photo')).exclude(missing('banner')).update(media_status='done')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0010_ingestionjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='film',
+            name='media_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('downloading', 'Downloading'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', help_text='Status of downloading photo and banner from their urls, done by MediaPipeline', max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='ingestionjob',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('fetching', 'Fetching'), ('saving', 'Saving'), ('media', 'Downloading media'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10),
+        ),
+        migrations.RunPython(mark_downloaded_media_done, migrations.RunPython.noop),
+    ]
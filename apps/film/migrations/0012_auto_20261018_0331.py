@@ -0,0 +1,23 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0011_film_media_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='film',
+            name='banner_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='photo_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
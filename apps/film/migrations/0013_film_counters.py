@@ -0,0 +1,76 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:35
+
+from django.db import migrations, models
+from django.db.models import Count, FloatField, OuterRef, Subquery, Sum, Value, F
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+
+def backfill_counters(apps, schema_editor):
+    Film = apps.get_model('film', 'Film')
+    User = apps.get_model('account', 'User')
+    Post = apps.get_model('post', 'Post')
+
+    def count(queryset, aggregate=Count('*')):
+        return Coalesce(
+            Subquery(queryset.order_by().values('film_id').annotate(value=aggregate).values('value')),
+            Value(0)
+        )
+
+    posts = Post._default_manager.filter(film_id=OuterRef('pk'), is_active=True)
+    Film._default_manager.update(
+        watched_count=count(User.films_watched.through.objects.filter(film_id=OuterRef('pk'))),
+        watchlist_count=count(User.films_watchlist.through.objects.filter(film_id=OuterRef('pk'))),
+        faved_count=count(User.film_favorites.through.objects.filter(film_id=OuterRef('pk'))),
+        posts_count=count(posts),
+        rate_sum=count(posts.filter(rate__isnull=False), Sum('rate')),
+        rate_count=count(posts.filter(rate__isnull=False)),
+    )
+    Film._default_manager.update(rate_avg=F('rate_sum') / NullIf(Cast(F('rate_count'), FloatField()), 0.0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0012_auto_20261018_0331'),
+        ('account', '0002_auto_20261018_0331'),
+        ('post', '0002_auto_20230210_1939'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='film',
+            name='faved_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='posts_count',
+            field=models.PositiveIntegerField(db_index=True, default=0, help_text='Number of active posts'),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='rate_avg',
+            field=models.FloatField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='rate_count',
+            field=models.PositiveIntegerField(default=0, help_text='Number of active posts with rate'),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='rate_sum',
+            field=models.FloatField(default=0, help_text='Sum of rates of active posts'),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='watched_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='watchlist_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.manager
+
+from apps.post.constants import GENRES
+
+
+def backfill_genre_aggregates(apps, schema_editor):
+    Post = apps.get_model('post', 'Post')
+    FilmGenreAggregate = apps.get_model('film', 'FilmGenreAggregate')
+
+    votes = {}
+    posts = Post._default_manager.filter(is_active=True, film__isnull=False).order_by()
+    for film_id, genres in posts.values_list('film_id', 'genres').iterator():
+        for genre, value in (genres or {}).items():
+            if genre not in GENRES or value is None:
+                continue
+            votes_sum, votes_count = votes.get((film_id, genre), (0, 0))
+            votes[(film_id, genre)] = (votes_sum + float(value), votes_count + 1)
+
+    FilmGenreAggregate._default_manager.bulk_create(
+        [
+            FilmGenreAggregate(film_id=film_id, genre=genre, votes_sum=votes_sum, votes_count=votes_count)
+            for (film_id, genre), (votes_sum, votes_count) in votes.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0013_film_counters'),
+        ('post', '0002_auto_20230210_1939'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilmGenreAggregate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(db_index=True, default=True, help_text='Designates whether this item should be treated as active. Unselected this instead of deleting.', verbose_name='Active status')),
+                ('created_time', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Creation On')),
+                ('updated_time', models.DateTimeField(auto_now=True, verbose_name='Modified On')),
+                ('genre', models.CharField(choices=[('drama', 'drama'), ('action', 'action'), ('horror', 'horror'), ('sci_fi', 'sci_fi'), ('comedy', 'comedy'), ('romance', 'romance'), ('crime', 'crime'), ('western', 'western'), ('thriller', 'thriller'), ('adventure', 'adventure'), ('musical', 'musical'), ('war', 'war'), ('epic', 'epic'), ('mystery', 'mystery'), ('bio', 'bio'), ('sport', 'sport'), ('fantasy', 'fantasy'), ('spy', 'spy'), ('tragedy', 'tragedy'), ('animation', 'animation'), ('documentary', 'documentary')], max_length=20)),
+                ('votes_sum', models.FloatField(default=0)),
+                ('votes_count', models.PositiveIntegerField(default=0)),
+                ('film', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='genre_aggregates', to='film.film')),
+            ],
+            managers=[
+                ('active_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='filmgenreaggregate',
+            constraint=models.UniqueConstraint(fields=('film', 'genre'), name='unique_film_genre_aggregate'),
+        ),
+        migrations.RunPython(backfill_genre_aggregates, migrations.RunPython.noop),
+    ]
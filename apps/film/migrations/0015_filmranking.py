@@ -0,0 +1,35 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.manager
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0014_filmgenreaggregate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FilmRanking',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(db_index=True, default=True, help_text='Designates whether this item should be treated as active. Unselected this instead of deleting.', verbose_name='Active status')),
+                ('created_time', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Creation On')),
+                ('updated_time', models.DateTimeField(auto_now=True, verbose_name='Modified On')),
+                ('ordering', models.CharField(choices=[('rate_avg', 'rate_avg'), ('fav', 'fav'), ('watched', 'watched'), ('post', 'post'), ('created_time', 'created_time')], max_length=20)),
+                ('position', models.PositiveIntegerField()),
+                ('score', models.FloatField(blank=True, null=True)),
+                ('film', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='film.film')),
+            ],
+            managers=[
+                ('active_objects', django.db.models.manager.Manager()),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='filmranking',
+            constraint=models.UniqueConstraint(fields=('ordering', 'position'), name='unique_film_ranking_position'),
+        ),
+    ]
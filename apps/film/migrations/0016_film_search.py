@@ -0,0 +1,44 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:42
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_search_vector(apps, schema_editor):
+    Film = apps.get_model('film', 'Film')
+    Film._default_manager.update(
+        search_vector=(
+            SearchVector('name', weight='A', config='english') +
+            SearchVector(Coalesce('plot', Value('')), weight='B', config='english')
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0015_filmranking'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='film',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, help_text='Weighted name and plot, updated by FilmQuerySet.update_search_vector', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='film_search_vector_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='film_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+    ]
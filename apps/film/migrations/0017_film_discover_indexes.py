@@ -0,0 +1,42 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:44
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0016_film_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='film',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['genres'], name='film_genres_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['countries'], name='film_countries_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['languages'], name='film_languages_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['year', 'imdb'], name='film_year_imdb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['imdb', 'year'], name='film_imdb_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['rotten', 'year'], name='film_rotten_year_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['metacritic', 'year'], name='film_metacritic_year_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0017_film_discover_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarFilm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('film', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_films', to='film.film')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='film.film')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='similarfilm',
+            index=models.Index(fields=['film', '-score'], name='similar_film_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='similarfilm',
+            constraint=models.UniqueConstraint(fields=('film', 'similar'), name='unique_similar_film'),
+        ),
+    ]
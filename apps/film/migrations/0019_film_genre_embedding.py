@@ -0,0 +1,48 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:46
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+from django.utils import timezone
+
+from apps.post.constants import GENRES, MAX_GENRE_VALUE
+
+
+def backfill_genre_embedding(apps, schema_editor):
+    Film = apps.get_model('film', 'Film')
+    FilmGenreAggregate = apps.get_model('film', 'FilmGenreAggregate')
+
+    embeddings = {}
+    aggregates = FilmGenreAggregate._default_manager.filter(
+        votes_count__gt=0
+    ).values_list('film_id', 'genre', 'votes_sum', 'votes_count')
+    for film_id, genre, votes_sum, votes_count in aggregates.iterator():
+        embedding = embeddings.setdefault(film_id, [0.0] * len(GENRES))
+        embedding[GENRES.index(genre)] = votes_sum / votes_count / MAX_GENRE_VALUE
+
+    now = timezone.now()
+    Film._default_manager.bulk_update(
+        [Film(pk=film_id, genre_embedding=embedding, genre_embedding_time=now) for film_id, embedding in embeddings.items()],
+        ['genre_embedding', 'genre_embedding_time'],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0018_similarfilm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='film',
+            name='genre_embedding',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), blank=True, help_text='Average vote of each genre in GENRES order scaled to 0-1, null if film has no votes', null=True, size=21),
+        ),
+        migrations.AddField(
+            model_name='film',
+            name='genre_embedding_time',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_genre_embedding, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:52
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0019_film_genre_embedding'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='artist',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='artist_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ),
+    ]
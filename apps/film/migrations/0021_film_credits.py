@@ -0,0 +1,104 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:53
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+CREDIT_MODELS = ('FilmActor', 'FilmWriter', 'FilmDirector')
+
+
+def credit_model(name, table, film_related_name, artist_related_name):
+    """
+    State of a through model over an existing auto created M2M table (film_id, artist_id)
+    """
+    return migrations.CreateModel(
+        name=name,
+        fields=[
+            ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ('artist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name=artist_related_name, to='film.artist')),
+            ('film', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name=film_related_name, to='film.film')),
+        ],
+        options={
+            'db_table': table,
+            'ordering': ('position', 'id'),
+            'abstract': False,
+            'unique_together': {('film', 'artist')},
+        },
+    )
+
+
+def backfill_positions(apps, schema_editor):
+    # Billing order used to be creation time of artists
+    for name in CREDIT_MODELS:
+        Credit = apps.get_model('film', name)
+        credits = Credit._default_manager.annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=[F('film_id')],
+                order_by=[F('artist__created_time').asc(), F('artist_id').asc()],
+            )
+        ).order_by().only('id')
+
+        batch = []
+        for credit in credits.iterator(chunk_size=5000):
+            credit.position = credit.row_number - 1
+            batch.append(credit)
+            if len(batch) == 5000:
+                Credit._default_manager.bulk_update(batch, ['position'])
+                batch = []
+        Credit._default_manager.bulk_update(batch, ['position'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0020_artist_name_trgm_idx'),
+    ]
+
+    operations = [
+        # Tables already exist as the auto created M2M tables, just state gets the through models
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                credit_model('FilmActor', 'film_film_actors', 'cast', 'acting_credits'),
+                credit_model('FilmWriter', 'film_film_writers', 'writer_credits', 'writing_credits'),
+                credit_model('FilmDirector', 'film_film_directors', 'director_credits', 'directing_credits'),
+                migrations.AlterField(
+                    model_name='film',
+                    name='actors',
+                    field=models.ManyToManyField(related_name='acted_films', through='film.FilmActor', to='film.Artist'),
+                ),
+                migrations.AlterField(
+                    model_name='film',
+                    name='directors',
+                    field=models.ManyToManyField(related_name='directed_films', through='film.FilmDirector', to='film.Artist'),
+                ),
+                migrations.AlterField(
+                    model_name='film',
+                    name='writers',
+                    field=models.ManyToManyField(related_name='wrote_films', through='film.FilmWriter', to='film.Artist'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='filmactor',
+            name='position',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='filmactor',
+            name='character',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='filmwriter',
+            name='position',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='filmdirector',
+            name='position',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_positions, migrations.RunPython.noop),
+    ]
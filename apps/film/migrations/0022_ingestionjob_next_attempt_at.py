@@ -0,0 +1,37 @@
+# Generated by Django 3.1.5 on 2026-10-18 04:15
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def fail_duplicate_unfinished_jobs(apps, schema_editor):
+    # Just the oldest unfinished job of each film is kept, so the unique constraint can be made
+    IngestionJob = apps.get_model('film', 'IngestionJob')
+    unfinished = IngestionJob._default_manager.filter(is_active=True).exclude(status__in=['done', 'failed'])
+    kept_imdb_ids = set()
+    duplicate_ids = []
+    for job_id, imdb_id in unfinished.order_by('created_time', 'id').values_list('id', 'imdb_id'):
+        if imdb_id in kept_imdb_ids:
+            duplicate_ids.append(job_id)
+        kept_imdb_ids.add(imdb_id)
+    IngestionJob._default_manager.filter(pk__in=duplicate_ids).update(status='failed', error='Duplicate job')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0021_film_credits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestionjob',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(fail_duplicate_unfinished_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingestionjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True), models.Q(_negated=True, status__in=['done', 'failed'])), fields=('imdb_id',), name='ingestion_job_unfinished_imdb_id_uniq'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.5 on 2026-10-18 04:16
+
+from django.db import migrations, models
+
+
+def delete_created_time_rankings(apps, schema_editor):
+    # created_time ordering is served live, its snapshot isn't read anymore
+    FilmRanking = apps.get_model('film', 'FilmRanking')
+    FilmRanking._default_manager.filter(ordering='created_time').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('film', '0022_ingestionjob_next_attempt_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_created_time_rankings, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='filmranking',
+            name='ordering',
+            field=models.CharField(choices=[('rate_avg', 'rate_avg'), ('fav', 'fav'), ('watched', 'watched'), ('post', 'post')], max_length=20),
+        ),
+    ]
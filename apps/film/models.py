@@ -1,17 +1,25 @@
-from urllib.request import urlopen
+import json
+import zlib
+from datetime import timedelta
+from typing import Iterable
 
-from django.core.files import File
-from django.core.files.temp import NamedTemporaryFile
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
-from django.db import models
-from django.db.models import Avg, IntegerField
-from django.db.models.fields.json import KeyTransform
-from django.db.models.functions import Cast
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
 
-from apps.post.constants import GENRES
+from apps.film import constants
+from apps.film.detail_cache import film_detail_cache
+from apps.film.managers import FilmManager
+from apps.post.constants import GENRES, MAX_GENRE_VALUE
 from core.models.base import BaseModel
+from core.utils.images import update_image_variants
 
 User = get_user_model()
 
@@ -21,11 +29,24 @@ class Artist(BaseModel):
     name = models.CharField(max_length=30, blank=False, null=False)
     photo = models.URLField(blank=True, null=True)
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            # Artist search, by trigram similarity or substring of name
+            GinIndex(fields=['name'], name='artist_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
     def __str__(self):
         return self.name
 
 
 class Film(BaseModel):
+
+    class MediaStatus(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        DOWNLOADING = 'downloading', 'Downloading'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
     imdb_id = models.CharField(unique=True, max_length=20, null=False, blank=False)
     name = models.CharField(max_length=255, null=False, blank=False)
     plot = models.TextField(null=True, blank=True)
@@ -45,13 +66,22 @@ class Film(BaseModel):
         null=True,
         blank=True
     )
-    writers = models.ManyToManyField('Artist', related_name='wrote_films')
-    directors = models.ManyToManyField('Artist', related_name='directed_films')
-    actors = models.ManyToManyField('Artist', related_name='acted_films')
+    writers = models.ManyToManyField('Artist', related_name='wrote_films', through='FilmWriter')
+    directors = models.ManyToManyField('Artist', related_name='directed_films', through='FilmDirector')
+    actors = models.ManyToManyField('Artist', related_name='acted_films', through='FilmActor')
     photo_url = models.URLField(null=True, blank=True)
     banner_url = models.URLField(null=True, blank=True)
     photo = models.ImageField(upload_to='posters', null=True, blank=True)
     banner = models.ImageField(upload_to='banners', null=True, blank=True)
+    photo_variants = models.JSONField(default=dict, blank=True)
+    banner_variants = models.JSONField(default=dict, blank=True)
+    media_status = models.CharField(
+        max_length=12,
+        choices=MediaStatus.choices,
+        default=MediaStatus.PENDING,
+        db_index=True,
+        help_text="Status of downloading photo and banner from their urls, done by MediaPipeline"
+    )
     trailer = models.URLField(null=True, blank=True)
     year = models.IntegerField(null=False, blank=False)
     imdb = models.FloatField(
@@ -68,22 +98,51 @@ class Film(BaseModel):
         blank=True,
     )
     time = models.IntegerField(null=True, blank=True, help_text="Film length based on minutes")
+    genre_embedding = ArrayField(
+        models.FloatField(),
+        size=len(GENRES),
+        null=True,
+        blank=True,
+        help_text="Average vote of each genre in GENRES order scaled to 0-1, null if film has no votes"
+    )
+    genre_embedding_time = models.DateTimeField(null=True, blank=True, db_index=True)
+    search_vector = SearchVectorField(
+        null=True,
+        blank=True,
+        help_text="Weighted name and plot, updated by FilmQuerySet.update_search_vector"
+    )
 
-    @property
-    def watched_count(self) -> int:
-        return self.users_watched.count()
+    # Engagement counters, kept up to date by apps.film.signals and repaired by reconcile_film_counters command
+    watched_count = models.PositiveIntegerField(default=0, db_index=True)
+    watchlist_count = models.PositiveIntegerField(default=0, db_index=True)
+    faved_count = models.PositiveIntegerField(default=0, db_index=True)
+    posts_count = models.PositiveIntegerField(default=0, db_index=True, help_text="Number of active posts")
+    rate_sum = models.FloatField(default=0, help_text="Sum of rates of active posts")
+    rate_count = models.PositiveIntegerField(default=0, help_text="Number of active posts with rate")
+    rate_avg = models.FloatField(null=True, blank=True, db_index=True)
 
-    @property
-    def watchlist_count(self) -> int:
-        return self.users_watchlist.count()
+    COUNTERS = ('watched_count', 'watchlist_count', 'faved_count', 'posts_count', 'rate_sum', 'rate_count')
 
-    @property
-    def faved_count(self) -> int:
-        return self.users_favorite.count()
+    active_objects = FilmManager()
+    objects = active_objects
+
+    class Meta(BaseModel.Meta):
+        indexes = [
+            GinIndex(fields=['search_vector'], name='film_search_vector_idx'),
+            GinIndex(fields=['name'], name='film_name_trgm_idx', opclasses=['gin_trgm_ops']),
+            # Discover filters
+            GinIndex(fields=['genres'], name='film_genres_idx'),
+            GinIndex(fields=['countries'], name='film_countries_idx'),
+            GinIndex(fields=['languages'], name='film_languages_idx'),
+            models.Index(fields=['year', 'imdb'], name='film_year_imdb_idx'),
+            models.Index(fields=['imdb', 'year'], name='film_imdb_year_idx'),
+            models.Index(fields=['rotten', 'year'], name='film_rotten_year_idx'),
+            models.Index(fields=['metacritic', 'year'], name='film_metacritic_year_idx'),
+        ]
 
     @property
     def rate_average(self) -> float:
-        return self.posts.all().aggregate(rate_avg=Avg('rate')).get('rate_avg', 0)
+        return self.rate_avg
 
     def add_to_watchlist(self, user: User):
         user.films_watchlist.add(self)
@@ -108,58 +167,333 @@ class Film(BaseModel):
 
     @property
     def genres_average(self) -> dict:
-        extracted_genre = {
-            genre: Cast(KeyTransform(genre, 'genres'), IntegerField()) for genre in GENRES
-        }
-        avg = {
-            f"{genre}_avg": Avg(genre) for genre in GENRES
-        }
-        genres_avgs = self.posts.filter(is_active=True).annotate(
-            **extracted_genre
-        ).aggregate(**avg)
-        return {k: v for k, v in genres_avgs.items() if v}
+        """
+        Average vote of each genre in active posts, read from FilmGenreAggregate
+        """
+        aggregates = {aggregate.genre: aggregate for aggregate in self.genre_aggregates.all()}
+        genres_avgs = {}
+        for genre in GENRES:
+            aggregate = aggregates.get(genre, None)
+            if aggregate and aggregate.votes_count and aggregate.votes_sum:
+                genres_avgs[f"{genre}_avg"] = aggregate.votes_sum / aggregate.votes_count
+        return genres_avgs
+
+    @classmethod
+    def mark_changed(cls, film_ids: Iterable[int]):
+        """
+        Bumping updated_time of films whose details changed without saving them (aggregates, credits, media),
+        so their conditional GET validators change, and deleting their cached details
+        """
+        film_ids = [film_id for film_id in film_ids if film_id]
+        if not film_ids:
+            return
+        cls.objects.filter(pk__in=film_ids).update(updated_time=timezone.now())
+        film_detail_cache.invalidate(film_ids)
+
+    @classmethod
+    def update_genre_embeddings(cls, film_ids: Iterable[int]):
+        """
+        Recomputing genre_embedding of films from their genre aggregates
+        """
+        embeddings = {film_id: None for film_id in film_ids}
+        aggregates = FilmGenreAggregate.objects.filter(
+            film_id__in=list(embeddings), votes_count__gt=0
+        ).values_list('film_id', 'genre', 'votes_sum', 'votes_count')
+
+        for film_id, genre, votes_sum, votes_count in aggregates:
+            if embeddings[film_id] is None:
+                embeddings[film_id] = [0.0] * len(GENRES)
+            embeddings[film_id][GENRES.index(genre)] = votes_sum / votes_count / MAX_GENRE_VALUE
+
+        now = timezone.now()
+        cls.objects.bulk_update(
+            [
+                cls(pk=film_id, genre_embedding=embedding, genre_embedding_time=now)
+                for film_id, embedding in embeddings.items()
+            ],
+            ['genre_embedding', 'genre_embedding_time'],
+            batch_size=1000
+        )
 
     def is_watched_by_user(self, user: User) -> bool:
-        return user in self.users_watched.all()
+        return self.users_watched.filter(pk=user.pk).exists()
 
     def is_watchlist_by_user(self, user: User) -> bool:
-        return user in self.users_watchlist.all()
+        return self.users_watchlist.filter(pk=user.pk).exists()
 
     def is_faved_by_user(self, user: User) -> bool:
-        return user in self.users_favorite.all()
+        return self.users_favorite.filter(pk=user.pk).exists()
 
     def has_post_by_user(self, user: User) -> bool:
         return self.posts.filter(is_active=True, user=user).exists()
 
-    @staticmethod
-    def get_image_from_url(url):
-        img_tmp = NamedTemporaryFile(delete=True)
-        with urlopen(url=url, timeout=10) as uo:
-            assert uo.status == 200
-            img_tmp.write(uo.read())
-            img_tmp.flush()
-        return img_tmp
-
-    def download_photo(self):
-        if self.photo_url:
-            img = self.get_image_from_url(url=self.photo_url)
-            img_file = File(img)
-            file_name = self.photo_url.split('/')[-1]
-            self.photo.save(file_name, img_file)
-
-    def download_banner(self):
-        if self.banner_url:
-            img = self.get_image_from_url(url=self.banner_url)
-            img_file = File(img)
-            file_name = self.banner_url.split('/')[-1]
-            self.banner.save(file_name, img_file)
-
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if not self.photo:
-            self.download_photo()
-        if not self.banner:
-            self.download_banner()
+    def update_image_variants(self, fields=('photo', 'banner')):
+        widths = {
+            'photo': constants.POSTER_VARIANT_WIDTHS,
+            'banner': constants.BANNER_VARIANT_WIDTHS,
+        }
+        for field in fields:
+            update_image_variants(self, field=field, widths=widths[field])
+        self.mark_changed([self.pk])
 
     def __str__(self):
         return f"Film {self.name} ({str(self.year)})"
+
+
+class FilmCredit(models.Model):
+    """
+    Artist of a film in a role, in billing order by position (0 is top billed)
+    Credits are the rows of the old auto created M2M tables, so they don't have BaseModel's fields
+    """
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+        ordering = ('position', 'id')
+        unique_together = [['film', 'artist']]
+
+    def __str__(self):
+        return f"Artist {self.artist_id} of film {self.film_id} at {self.position}"
+
+
+class FilmActor(FilmCredit):
+    film = models.ForeignKey('Film', related_name='cast', on_delete=models.CASCADE)
+    artist = models.ForeignKey('Artist', related_name='acting_credits', on_delete=models.CASCADE)
+    character = models.CharField(max_length=255, null=True, blank=True)
+
+    class Meta(FilmCredit.Meta):
+        db_table = 'film_film_actors'
+
+
+class FilmWriter(FilmCredit):
+    film = models.ForeignKey('Film', related_name='writer_credits', on_delete=models.CASCADE)
+    artist = models.ForeignKey('Artist', related_name='writing_credits', on_delete=models.CASCADE)
+
+    class Meta(FilmCredit.Meta):
+        db_table = 'film_film_writers'
+
+
+class FilmDirector(FilmCredit):
+    film = models.ForeignKey('Film', related_name='director_credits', on_delete=models.CASCADE)
+    artist = models.ForeignKey('Artist', related_name='directing_credits', on_delete=models.CASCADE)
+
+    class Meta(FilmCredit.Meta):
+        db_table = 'film_film_directors'
+
+
+class FilmGenreAggregate(BaseModel):
+    """
+    Sum and count of genre votes of active posts per film and genre, for Film.genres_average
+    Kept up to date by apps.film.signals and rebuilt by rebuild_genre_aggregates command
+    """
+    film = models.ForeignKey('Film', related_name='genre_aggregates', on_delete=models.CASCADE)
+    genre = models.CharField(max_length=20, choices=[(genre, genre) for genre in GENRES])
+    votes_sum = models.FloatField(default=0)
+    votes_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['film', 'genre'], name='unique_film_genre_aggregate'),
+        ]
+
+    @staticmethod
+    def votes_of(genres: dict) -> dict:
+        """
+        Genre votes of a post, {genre: value}
+        """
+        return {
+            genre: float(value) for genre, value in (genres or {}).items()
+            if genre in GENRES and value is not None
+        }
+
+    @classmethod
+    def add_votes(cls, film_id: int, deltas: dict):
+        """
+        Adding {genre: (votes sum delta, votes count delta)} to aggregates of film
+        Missing rows of added votes are inserted first, then all genres are updated with one UPDATE
+        """
+        deltas = {genre: delta for genre, delta in deltas.items() if any(delta)}
+        if not deltas:
+            return
+
+        cls.objects.bulk_create(
+            [cls(film_id=film_id, genre=genre) for genre, (_, count_delta) in deltas.items() if count_delta > 0],
+            ignore_conflicts=True
+        )
+        cls.objects.filter(film_id=film_id, genre__in=deltas).update(
+            votes_sum=F('votes_sum') + Case(
+                *[When(genre=genre, then=Value(sum_delta)) for genre, (sum_delta, _) in deltas.items()],
+                default=Value(0.0),
+                output_field=models.FloatField()
+            ),
+            votes_count=F('votes_count') + Case(
+                *[When(genre=genre, then=Value(count_delta)) for genre, (_, count_delta) in deltas.items()],
+                default=Value(0),
+                output_field=models.IntegerField()
+            ),
+        )
+        Film.update_genre_embeddings([film_id])
+
+    def __str__(self):
+        return f"{self.genre} of film {self.film_id}"
+
+
+class FilmRanking(BaseModel):
+    """
+    Snapshot of home list counter orderings, position of each film in descending order of each ordering
+    Refreshed by refresh_film_ranking command, ascending orderings are read backwards
+    """
+    ordering = models.CharField(max_length=20, choices=[(ordering, ordering) for ordering in constants.RANKING_ORDERINGS])
+    position = models.PositiveIntegerField()
+    score = models.FloatField(null=True, blank=True)
+    film = models.ForeignKey('Film', related_name='rankings', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['ordering', 'position'], name='unique_film_ranking_position'),
+        ]
+
+    @classmethod
+    def refresh(cls, ordering: str) -> int:
+        """
+        Replacing snapshot of ordering with current state of films, returns number of ranked films
+        Readers keep seeing the old snapshot until it's replaced
+        """
+        field = constants.RANKING_ORDERINGS[ordering]
+        films = Film.active_objects.active().annotate(
+            position=Window(RowNumber(), order_by=[F(field).desc(), F('id').desc()])
+        ).values_list('id', 'position', field)
+
+        rankings = [
+            cls(
+                ordering=ordering,
+                position=position,
+                film_id=film_id,
+                score=score
+            )
+            for film_id, position, score in films.iterator()
+        ]
+        with transaction.atomic():
+            cls.objects.filter(ordering=ordering).delete()
+            cls.objects.bulk_create(rankings, batch_size=1000)
+        return len(rankings)
+
+    def __str__(self):
+        return f"Film {self.film_id} at {self.position} by {self.ordering}"
+
+
+class SimilarFilm(models.Model):
+    """
+    Top neighbours of each film by cosine similarity of their watchers, built by build_similar_films command
+    It's regenerated as a whole, so it doesn't have BaseModel's soft delete and timestamps, to stay compact
+    """
+    film = models.ForeignKey('Film', related_name='similar_films', on_delete=models.CASCADE)
+    similar = models.ForeignKey('Film', related_name='similar_to', on_delete=models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['film', 'similar'], name='unique_similar_film'),
+        ]
+        indexes = [
+            models.Index(fields=['film', '-score'], name='similar_film_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"Film {self.similar_id} similar to {self.film_id}"
+
+
+class IMDBTitle(BaseModel):
+    """
+    Raw title payloads of imdb-api, kept as zlib compressed json
+    Re-ingesting a film reads it from here instead of calling the api again,
+    and parsing can be replayed offline when parsing logic changes
+    """
+    imdb_id = models.CharField(unique=True, max_length=20, null=False, blank=False)
+    payload = models.BinaryField(null=False, blank=False)
+    etag = models.CharField(max_length=255, null=True, blank=True)
+    last_modified = models.CharField(max_length=64, null=True, blank=True)
+    fetched_time = models.DateTimeField(default=timezone.now)
+
+    @property
+    def data(self) -> dict:
+        return json.loads(zlib.decompress(bytes(self.payload)))
+
+    @data.setter
+    def data(self, value: dict):
+        self.payload = self.encode_payload(value)
+
+    @staticmethod
+    def encode_payload(value: dict) -> bytes:
+        return zlib.compress(json.dumps(value, separators=(',', ':')).encode(), 9)
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.fetched_time + timedelta(seconds=settings.IMDB_TITLE_CACHE_TTL) > timezone.now()
+
+    @property
+    def conditional_headers(self) -> dict:
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def __str__(self):
+        return f"IMDB title {self.imdb_id}"
+
+
+class IngestionJob(BaseModel):
+    """
+    Fetching and saving a film from IMDB off the request path
+    Jobs are enqueued by FilmViewSet.create and run by run_ingestion_worker command
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        FETCHING = 'fetching', 'Fetching'
+        SAVING = 'saving', 'Saving'
+        MEDIA = 'media', 'Downloading media'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    imdb_id = models.CharField(max_length=20, null=False, blank=False, db_index=True)
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+        db_index=True
+    )
+    film = models.ForeignKey(
+        'Film',
+        related_name='ingestion_jobs',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL
+    )
+    error = models.TextField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Failed attempts are retried with backoff, a pending job isn't claimed before this
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+
+    FINISHED_STATUSES = (Status.DONE, Status.FAILED)
+
+    class Meta(BaseModel.Meta):
+        constraints = [
+            # At most one unfinished job per film, so concurrent enqueues get the same job
+            models.UniqueConstraint(
+                fields=['imdb_id'],
+                condition=models.Q(is_active=True) & ~models.Q(status__in=['done', 'failed']),
+                name='ingestion_job_unfinished_imdb_id_uniq',
+            ),
+        ]
+
+    def set_status(self, status: str, **fields):
+        self.status = status
+        for field, value in fields.items():
+            setattr(self, field, value)
+        self.save(update_fields=['status', 'updated_time', *fields])
+
+    def __str__(self):
+        return f"Ingestion of {self.imdb_id} ({self.status})"
@@ -0,0 +1,40 @@
+from django.db.models import Q
+
+from apps.film.trending import trending_films
+from core.pagination import CustomLimitOffsetPagination, KeysetCursorPagination
+
+
+class FilmPostsPagination(KeysetCursorPagination):
+    """
+    Posts of a film, posts of followings of request user (which have caption) first, newest first in each
+    Queryset is annotated with is_followed_user
+    """
+    ordering = ('-created_time', '-id')
+    segments = (
+        Q(caption__isnull=False, is_followed_user=True),
+        Q(caption__isnull=True) | Q(is_followed_user=False),
+    )
+
+
+class TrendingLimitOffsetPagination(CustomLimitOffsetPagination):
+    """
+    Limit offset pagination over trending films, a page is read with one ZREVRANGE of trending scores
+    Each film of page gets its decayed score as `trending`
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.offset = self.get_offset(request)
+
+        scores, self.count = trending_films.top(offset=self.offset, limit=self.limit)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+
+        films = queryset.in_bulk(list(scores))
+        page = []
+        for film_id, score in scores.items():
+            if film_id in films:
+                films[film_id].trending = score
+                page.append(films[film_id])
+        return page
@@ -0,0 +1,324 @@
+import os
+import threading
+import time
+from datetime import timedelta
+from itertools import chain
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+from scipy import sparse
+
+from apps.film import constants
+from apps.film.factorization import train_implicit_als
+from apps.film.models import Film, SimilarFilm
+from apps.post.constants import GENRES
+from apps.post.models import Post
+
+User = get_user_model()
+
+# Relations of users with films used as implicit feedback, by name in constants.INTERACTION_WEIGHTS
+INTERACTIONS = {
+    'watched': User.films_watched.through,
+    'favorite': User.film_favorites.through,
+    'watchlist': User.films_watchlist.through,
+}
+# Rates of posts are feedback too, weighted by rate / POST_RATE_MAX
+POST_RATE = 'post_rate'
+POST_RATE_MAX = 5
+
+
+def _pairs(queryset) -> np.ndarray:
+    """
+    (user id, film id) rows of a relation table as an int64 array of shape (n, 2)
+    """
+    rows = queryset.order_by().values_list('user_id', 'film_id').iterator(chunk_size=10000)
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, 2)
+
+
+def _post_rates() -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (user id, film id) pairs of rated posts and their rates
+    """
+    rows = Post.active_objects.active().filter(
+        rate__isnull=False, film__is_active=True, user__is_active=True
+    ).order_by().values_list('user_id', 'film_id', 'rate').iterator(chunk_size=10000)
+    rows = np.fromiter(chain.from_iterable(rows), dtype=np.float64).reshape(-1, 3)
+    return rows[:, :2].astype(np.int64), rows[:, 2].astype(np.float32)
+
+
+def interaction_matrix(weights: Dict[str, float] = None) -> Tuple[np.ndarray, np.ndarray, sparse.csr_matrix]:
+    """
+    Sparse users x films matrix of weighted interactions, with user ids and film ids of its rows and columns
+    Weights of the same user and film are summed, e.g. a favorite film is also watched
+    """
+    weights = weights or constants.INTERACTION_WEIGHTS
+    pairs, values = [], []
+    for name, weight in weights.items():
+        if name == POST_RATE:
+            relation_pairs, rates = _post_rates()
+            relation_values = weight * rates / POST_RATE_MAX
+        else:
+            relation_pairs = _pairs(INTERACTIONS[name].objects.filter(film__is_active=True, user__is_active=True))
+            relation_values = np.full(len(relation_pairs), weight, dtype=np.float32)
+        pairs.append(relation_pairs)
+        values.append(relation_values)
+
+    pairs = np.concatenate(pairs)
+    user_ids, user_index = np.unique(pairs[:, 0], return_inverse=True)
+    film_ids, film_index = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.concatenate(values), (user_index, film_index)),
+        shape=(len(user_ids), len(film_ids)),
+        dtype=np.float32
+    )
+    matrix.sum_duplicates()
+    return user_ids, film_ids, matrix
+
+
+def top_k_similar(matrix: sparse.csr_matrix, k: int, block_cells: int) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """
+    Top k cosine similar columns of each column of users x films matrix
+    Similarities are computed for blocks of films at once, each block is a dense (block x films) array
+    of at most block_cells cells, so memory doesn't grow with the number of films
+    Yields (first film index of block, neighbour indexes, similarities), both of shape (block, k)
+    """
+    films_count = matrix.shape[1]
+    k = min(k, films_count - 1)
+    if k <= 0:
+        return
+
+    # Normalizing films, so dot products are cosine similarities
+    films = matrix.T.tocsr()
+    norms = np.sqrt(np.asarray(films.multiply(films).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    films = sparse.diags(1 / norms).dot(films).tocsr().astype(np.float32)
+    users_films = films.T.tocsc()
+
+    block = max(1, block_cells // films_count)
+    for start in range(0, films_count, block):
+        stop = min(start + block, films_count)
+        similarities = films[start:stop].dot(users_films).toarray()
+        # A film is not similar to itself
+        similarities[np.arange(stop - start), np.arange(start, stop)] = 0
+
+        neighbours = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        yield start, neighbours, np.take_along_axis(similarities, neighbours, axis=1)
+
+
+def build_similar_films(k: int = None, block_cells: int = None) -> dict:
+    """
+    Replacing SimilarFilm table with top k similar films of each film by their watchers
+    Films are similar if they are watched (and faved) by the same users. Returns stats of the build
+    """
+    k = k or constants.SIMILAR_FILMS_COUNT
+    block_cells = block_cells or constants.SIMILARITY_BLOCK_CELLS
+    user_ids, film_ids, matrix = interaction_matrix()
+
+    neighbours_count = 0
+    with transaction.atomic():
+        SimilarFilm.objects.all().delete()
+        for start, neighbours, similarities in top_k_similar(matrix, k=k, block_cells=block_cells):
+            rows, columns = np.nonzero(similarities > 0)
+            similar_films = zip(
+                film_ids[start + rows].tolist(),
+                film_ids[neighbours[rows, columns]].tolist(),
+                similarities[rows, columns].tolist(),
+            )
+            neighbours_count += len(rows)
+            SimilarFilm.objects.bulk_create(
+                [
+                    SimilarFilm(film_id=film_id, similar_id=similar_id, score=score)
+                    for film_id, similar_id, score in similar_films
+                ],
+                batch_size=5000
+            )
+
+    return {
+        'users': len(user_ids),
+        'films': len(film_ids),
+        'interactions': matrix.nnz,
+        'neighbours': neighbours_count,
+    }
+
+
+def train_recommendations(
+        factors: int = None,
+        iterations: int = None,
+        regularization: float = None,
+        alpha: float = None,
+        workers: int = 1,
+        path: str = None,
+) -> dict:
+    """
+    Factorizing watched, favorite, watchlist and post rate feedback of users,
+    and saving user and film factors in path for ForYouRecommender. Returns stats of the training
+    """
+    path = path or settings.RECOMMENDATION_FACTORS_PATH
+    user_ids, film_ids, matrix = interaction_matrix(constants.FACTORIZATION_WEIGHTS)
+    user_factors, film_factors = train_implicit_als(
+        matrix,
+        factors=factors or constants.FACTORIZATION_FACTORS,
+        iterations=iterations or constants.FACTORIZATION_ITERATIONS,
+        regularization=regularization if regularization is not None else constants.FACTORIZATION_REGULARIZATION,
+        alpha=alpha or constants.FACTORIZATION_ALPHA,
+        workers=workers,
+    )
+
+    # Written next to path and moved, so a serving process never reads a half written file
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as factors_file:
+        np.savez(
+            factors_file,
+            user_ids=user_ids,
+            film_ids=film_ids,
+            user_factors=user_factors,
+            film_factors=film_factors,
+        )
+    os.replace(tmp_path, path)
+
+    return {
+        'users': len(user_ids),
+        'films': len(film_ids),
+        'interactions': matrix.nnz,
+        'factors': user_factors.shape[1],
+    }
+
+
+class ForYouRecommender:
+    """
+    Films recommended to users, by user and film factors saved by train_recommendations
+    Factors are loaded once per process (and again when the file changes), scoring all films of a user
+    is one matrix-vector product
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # User ids, film ids, position of each user id, user factors and film factors, replaced together on load
+        self._state = None
+        self._loaded_mtime = None
+        self._lock = threading.Lock()
+
+    def load_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+
+        with self._lock:
+            with np.load(self.path) as factors:
+                user_ids = factors['user_ids']
+                self._state = (
+                    user_ids,
+                    factors['film_ids'],
+                    {user_id: position for position, user_id in enumerate(user_ids.tolist())},
+                    factors['user_factors'],
+                    factors['film_factors'],
+                )
+            self._loaded_mtime = mtime
+
+    def recommend(self, user: User, k: int) -> List[Tuple[int, float]]:
+        """
+        k films with the highest score for user which user hasn't watched, as (film id, score)
+        Empty if user has no factors (e.g. joined after training)
+        """
+        self.load_if_changed()
+        if self._state is None:
+            return []
+
+        user_ids, film_ids, positions, user_factors, film_factors = self._state
+        position = positions.get(user.id, None)
+        if position is None or not len(film_ids):
+            return []
+
+        scores = film_factors.dot(user_factors[position])
+        watched = np.isin(film_ids, list(user.films_watched.values_list('id', flat=True)))
+        scores[watched] = -np.inf
+
+        k = min(k, int((~watched).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return list(zip(film_ids[top].tolist(), scores[top].tolist()))
+
+
+class GenreEmbeddingIndex:
+    """
+    In memory index of film genre embeddings, for finding films that feel like a film
+    Embeddings are kept normalized in one float32 array, so a lookup is one matrix-vector product
+    The index reloads just the embeddings changed since its last load, at most every reload_interval seconds
+    """
+
+    def __init__(self, reload_interval: float):
+        self.reload_interval = reload_interval
+        # Film ids, their normalized embeddings and position of each film id, replaced together on reload
+        self._state = (np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32), {})
+        self.loaded_until = None
+        self.last_reload = None
+        self._lock = threading.Lock()
+
+    def reload(self):
+        """
+        Loading embeddings changed since last load (all of them the first time)
+        """
+        with self._lock:
+            started = timezone.now()
+            films = Film.objects.all()
+            if self.loaded_until:
+                films = films.filter(genre_embedding_time__gte=self.loaded_until)
+            changed = list(films.filter(genre_embedding_time__isnull=False).values_list('id', 'genre_embedding'))
+            self._apply(changed)
+
+            # Overlapping a bit with last load, not to miss embeddings committed late
+            self.loaded_until = started - timedelta(seconds=constants.GENRE_INDEX_RELOAD_OVERLAP)
+            self.last_reload = time.monotonic()
+
+    def _apply(self, changed: List[Tuple[int, list]]):
+        if not changed:
+            return
+
+        film_ids, embeddings, _ = self._state
+        updated = {film_id: embedding for film_id, embedding in changed if embedding is not None}
+        # Changed films are dropped, then the ones still having an embedding are appended
+        keep = ~np.isin(film_ids, [film_id for film_id, _ in changed])
+
+        new_embeddings = np.array(list(updated.values()), dtype=np.float32).reshape(len(updated), len(GENRES))
+        norms = np.linalg.norm(new_embeddings, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        new_embeddings /= norms
+
+        film_ids = np.concatenate([film_ids[keep], np.array(list(updated), dtype=np.int64)])
+        embeddings = np.concatenate([embeddings[keep], new_embeddings]) if len(embeddings) else new_embeddings
+        self._state = (film_ids, embeddings, {film_id: position for position, film_id in enumerate(film_ids.tolist())})
+
+    def reload_if_stale(self):
+        if self.last_reload is None or time.monotonic() - self.last_reload > self.reload_interval:
+            self.reload()
+
+    def nearest(self, film_id: int, k: int) -> List[Tuple[int, float]]:
+        """
+        k films with the most similar genre embedding to film, as (film id, cosine similarity)
+        """
+        self.reload_if_stale()
+        film_ids, embeddings, positions = self._state
+        position = positions.get(film_id, None)
+        if position is None or len(film_ids) < 2:
+            return []
+
+        similarities = embeddings.dot(embeddings[position])
+        similarities[position] = -np.inf
+        k = min(k, len(film_ids) - 1)
+        nearest = np.argpartition(-similarities, k - 1)[:k]
+        nearest = nearest[np.argsort(-similarities[nearest])]
+        return list(zip(film_ids[nearest].tolist(), similarities[nearest].tolist()))
+
+
+genre_index = GenreEmbeddingIndex(reload_interval=settings.GENRE_INDEX_RELOAD_INTERVAL)
+for_you_recommender = ForYouRecommender(path=settings.RECOMMENDATION_FACTORS_PATH)
@@ -0,0 +1,245 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.signals import m2m_changed, pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from apps.film import constants
+from apps.film.detail_cache import film_detail_cache
+from apps.film.models import Artist, Film, FilmActor, FilmDirector, FilmGenreAggregate, FilmWriter
+from apps.film.trending import trending_films
+from apps.post.models import Post
+
+User = get_user_model()
+
+# Film counter of each user-film relation
+RELATION_COUNTERS = {
+    User.films_watched.through: 'watched_count',
+    User.films_watchlist.through: 'watchlist_count',
+    User.film_favorites.through: 'faved_count',
+}
+# Trending event of each user-film relation, weighted by constants.TRENDING_WEIGHTS
+RELATION_EVENTS = {
+    User.films_watched.through: 'watched',
+    User.films_watchlist.through: 'watchlist',
+    User.film_favorites.through: 'favorite',
+}
+
+
+def _lock_users(through, instance, reverse: bool, pk_set):
+    """
+    Locking users of the changing relation rows till the end of transaction
+    So concurrent changes of the same relations wait for each other, and each one counts rows committed by the other
+    """
+    if not reverse:
+        user_ids = [instance.pk]
+    elif pk_set is not None:
+        user_ids = pk_set
+    else:
+        user_ids = through.objects.filter(film_id=instance.pk).values('user_id')
+
+    list(User.objects.select_for_update().filter(pk__in=user_ids).order_by('pk').values_list('pk', flat=True))
+
+
+def _existing_film_ids(through, instance, reverse: bool, pk_set) -> Counter:
+    """
+    Number of existing relation rows per film, among the ones about to be added or removed
+    """
+    if reverse:
+        rows = through.objects.filter(film_id=instance.pk)
+        if pk_set is not None:
+            rows = rows.filter(user_id__in=pk_set)
+    else:
+        rows = through.objects.filter(user_id=instance.pk)
+        if pk_set is not None:
+            rows = rows.filter(film_id__in=pk_set)
+
+    return Counter(dict(rows.values('film_id').annotate(count=Count('*')).values_list('film_id', 'count')))
+
+
+def _update_relation_counter(counter: str, film_counts: Counter, sign: int):
+    # Films with the same count are updated together
+    films_by_count = {}
+    for film_id, count in film_counts.items():
+        films_by_count.setdefault(count, []).append(film_id)
+
+    for count, film_ids in films_by_count.items():
+        Film.objects.filter(pk__in=film_ids).update_counters(**{counter: sign * count})
+
+
+@receiver(m2m_changed)
+def update_relation_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keeping watched, watchlist and favorite counters of films in sync with user relations
+    Signals are sent inside the transaction of adding or removing, so rows are counted just before it, with
+    users locked: on add the ones not existing yet, on remove and clear the existing ones
+    """
+    counter = RELATION_COUNTERS.get(sender, None)
+    if not counter:
+        return
+
+    if action == 'pre_add' and pk_set:
+        _lock_users(sender, instance, reverse, pk_set)
+        if reverse:
+            film_counts = Counter({instance.pk: len(pk_set)})
+        else:
+            film_counts = Counter(dict.fromkeys(pk_set, 1))
+        # Rows added meanwhile by a concurrent transaction are ignored by the insert
+        film_counts -= _existing_film_ids(sender, instance, reverse, pk_set)
+        _update_relation_counter(counter, film_counts, sign=1)
+        # Just additions are events, removing doesn't make a film less trending. Rolled back ones are not
+        weight = constants.TRENDING_WEIGHTS[RELATION_EVENTS[sender]]
+        events = {film_id: weight * count for film_id, count in film_counts.items()}
+        transaction.on_commit(lambda: trending_films.add_events(events))
+
+    elif action in ('pre_remove', 'pre_clear'):
+        _lock_users(sender, instance, reverse, pk_set)
+        _update_relation_counter(counter, _existing_film_ids(sender, instance, reverse, pk_set), sign=-1)
+
+
+def _post_counters(film_id, is_active: bool, rate) -> dict:
+    """
+    What a post adds to counters of its film
+    """
+    if not film_id or not is_active:
+        return {}
+    return {
+        'posts_count': 1,
+        'rate_sum': rate or 0,
+        'rate_count': 0 if rate is None else 1,
+    }
+
+
+def _post_genre_votes(film_id, is_active: bool, genres) -> dict:
+    """
+    What a post adds to genre aggregates of its film, {genre: (votes sum, votes count)}
+    """
+    if not film_id or not is_active:
+        return {}
+    return {genre: (value, 1) for genre, value in FilmGenreAggregate.votes_of(genres).items()}
+
+
+def _negate(counters: dict) -> dict:
+    return {key: -value for key, value in counters.items()}
+
+
+def _negate_votes(votes: dict) -> dict:
+    return {genre: (-votes_sum, -votes_count) for genre, (votes_sum, votes_count) in votes.items()}
+
+
+@receiver(post_save, sender=Film)
+def update_film_search_vector(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'name', 'plot'} & set(update_fields):
+        Film.objects.filter(pk=instance.pk).update_search_vector()
+
+
+@receiver(post_save, sender=Film)
+@receiver(post_delete, sender=Film)
+def invalidate_film_detail(sender, instance, **kwargs):
+    film_detail_cache.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=FilmActor)
+@receiver(post_save, sender=FilmWriter)
+@receiver(post_save, sender=FilmDirector)
+@receiver(post_delete, sender=FilmActor)
+@receiver(post_delete, sender=FilmWriter)
+@receiver(post_delete, sender=FilmDirector)
+def mark_credit_film_changed(sender, instance, **kwargs):
+    Film.mark_changed([instance.film_id])
+
+
+@receiver(m2m_changed, sender=FilmActor)
+@receiver(m2m_changed, sender=FilmWriter)
+@receiver(m2m_changed, sender=FilmDirector)
+def mark_credits_films_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Credits changed through Film.actors, Artist.acted_films, etc
+    """
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            Film.mark_changed([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        Film.mark_changed(pk_set or [])
+    elif action == 'pre_clear':
+        Film.mark_changed(sender.objects.filter(artist_id=instance.pk).values_list('film_id', flat=True))
+
+
+@receiver(post_save, sender=Artist)
+def mark_artist_films_changed(sender, instance, created, **kwargs):
+    if created:
+        return
+    for credit_model in (FilmActor, FilmWriter, FilmDirector):
+        Film.mark_changed(credit_model.objects.filter(artist_id=instance.pk).values_list('film_id', flat=True))
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_post(sender, instance, **kwargs):
+    instance._old_aggregates_state = None
+    if instance.pk:
+        instance._old_aggregates_state = Post.objects.filter(pk=instance.pk).values_list(
+            'film_id', 'is_active', 'rate', 'genres'
+        ).first()
+
+
+@receiver(post_save, sender=Post)
+def add_post_trending_event(sender, instance, created, **kwargs):
+    if created and instance.film_id and instance.is_active:
+        events = {instance.film_id: constants.TRENDING_WEIGHTS['post']}
+        transaction.on_commit(lambda: trending_films.add_events(events))
+
+
+@receiver(post_save, sender=Post)
+def update_post_aggregates(sender, instance, **kwargs):
+    """
+    Applying the difference between old and new state of post to counters and genre aggregates of its film(s)
+    """
+    old_film_id, old_is_active, old_rate, old_genres = (
+        getattr(instance, '_old_aggregates_state', None) or (None, False, None, None)
+    )
+    old_counters = _post_counters(old_film_id, old_is_active, old_rate)
+    new_counters = _post_counters(instance.film_id, instance.is_active, instance.rate)
+    old_votes = _post_genre_votes(old_film_id, old_is_active, old_genres)
+    new_votes = _post_genre_votes(instance.film_id, instance.is_active, instance.genres)
+
+    if old_film_id == instance.film_id:
+        counter_deltas = {
+            field: new_counters.get(field, 0) - old_counters.get(field, 0)
+            for field in set(old_counters) | set(new_counters)
+        }
+        vote_deltas = {
+            genre: (
+                new_votes.get(genre, (0, 0))[0] - old_votes.get(genre, (0, 0))[0],
+                new_votes.get(genre, (0, 0))[1] - old_votes.get(genre, (0, 0))[1],
+            )
+            for genre in set(old_votes) | set(new_votes)
+        }
+        Film.objects.filter(pk=instance.film_id).update_counters(**counter_deltas)
+        FilmGenreAggregate.add_votes(instance.film_id, vote_deltas)
+        if any(counter_deltas.values()) or any(any(deltas) for deltas in vote_deltas.values()):
+            Film.mark_changed([instance.film_id])
+        return
+
+    if old_film_id:
+        Film.objects.filter(pk=old_film_id).update_counters(**_negate(old_counters))
+        FilmGenreAggregate.add_votes(old_film_id, _negate_votes(old_votes))
+    if instance.film_id:
+        Film.objects.filter(pk=instance.film_id).update_counters(**new_counters)
+        FilmGenreAggregate.add_votes(instance.film_id, new_votes)
+    Film.mark_changed([old_film_id, instance.film_id])
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_aggregates(sender, instance, **kwargs):
+    # Posts are soft deleted, this is for the ones actually removed from db
+    if not instance.film_id:
+        return
+    Film.objects.filter(pk=instance.film_id).update_counters(
+        **_negate(_post_counters(instance.film_id, instance.is_active, instance.rate))
+    )
+    FilmGenreAggregate.add_votes(
+        instance.film_id, _negate_votes(_post_genre_votes(instance.film_id, instance.is_active, instance.genres))
+    )
+    Film.mark_changed([instance.film_id])
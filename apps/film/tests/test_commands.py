@@ -0,0 +1,298 @@
+import json
+from io import StringIO
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError
+
+from apps.film import ingestion, trending
+from apps.film.detail_cache import film_detail_cache
+from apps.film.management.commands import import_films
+from apps.film.models import Film, Artist, FilmGenreAggregate, SimilarFilm
+from apps.post.models import Post
+from apps.film.utils import IMDBApiCall
+from core.exceptions import ApiCallException
+
+User = get_user_model()
+
+
+@pytest.mark.django_db
+class TestGetGenres:
+
+    @pytest.fixture()
+    def films(self):
+        return [
+            Film.objects.create(name=f"film {i}", year="2020", imdb_id=f"tt{i}")
+            for i in range(3)
+        ]
+
+    @pytest.fixture()
+    def fetched_ids(self, monkeypatch):
+        fetched_ids = []
+
+        def fetch(self, imdb_id, refresh=False):
+            fetched_ids.append(imdb_id)
+            if imdb_id == "tt1":
+                raise ApiCallException("imdb is down")
+            return {'genres': ["Drama"]}
+
+        monkeypatch.setattr(IMDBApiCall, "fetch", fetch)
+        return fetched_ids
+
+    @pytest.fixture()
+    def checkpoint(self, tmp_path):
+        return str(tmp_path / "checkpoint.json")
+
+    def get_genres(self, checkpoint, *args):
+        call_command("get_genres", "--checkpoint", checkpoint, "--batch-size", "2", "--workers", "2", *args)
+
+    def test_genres_updated_and_checkpoint_saved(self, films, fetched_ids, checkpoint):
+        self.get_genres(checkpoint)
+
+        assert sorted(fetched_ids) == ["tt0", "tt1", "tt2"]
+        assert [film.genres for film in Film.objects.order_by('id')] == [["Drama"], None, ["Drama"]]
+        with open(checkpoint) as checkpoint_file:
+            assert json.load(checkpoint_file) == {'last_film_id': films[-1].id, 'failed_film_ids': [films[1].id]}
+
+    def test_updated_films_marked_changed(self, films, fetched_ids, checkpoint):
+        for film in films:
+            film_detail_cache.set(film.id, {"name": film.name})
+
+        self.get_genres(checkpoint)
+
+        updated_times = dict(Film.objects.values_list('id', 'updated_time'))
+        assert [updated_times[film.id] > film.updated_time for film in films] == [True, False, True]
+        assert [film_detail_cache.get(film.id) for film in films] == [None, {"name": "film 1"}, None]
+
+    def test_rerun_resume_after_checkpoint_and_retry_failed(self, films, fetched_ids, checkpoint):
+        self.get_genres(checkpoint)
+        fetched_ids.clear()
+
+        Film.objects.create(name="film 3", year="2020", imdb_id="tt3")
+        self.get_genres(checkpoint)
+        assert sorted(fetched_ids) == ["tt1", "tt3"]
+        fetched_ids.clear()
+
+        self.get_genres(checkpoint, "--restart")
+        assert fetched_ids == ["tt1"]
+
+    def test_dry_run_not_fetch(self, films, fetched_ids, checkpoint):
+        self.get_genres(checkpoint, "--dry-run")
+
+        assert fetched_ids == []
+        assert not Film.objects.filter(genres__isnull=False).exists()
+
+
+@pytest.mark.django_db
+class TestImportFilms:
+
+    @staticmethod
+    def found_film(imdb_id):
+        return {
+            'imdb_id': imdb_id,
+            'name': f"film {imdb_id}",
+            'year': "2020",
+            'genres': ["Drama"],
+            'actors': [{'imdb_id': "nm1", 'name': "actor"}, {'imdb_id': f"nm{imdb_id}", 'name': "other actor"}],
+            'directors': [{'imdb_id': "nm2", 'name': "director"}],
+            'writers': None,
+        }
+
+    def test_import_jsonl_dedupe_films_and_artists(self, tmp_path):
+        Film.objects.create(name="existing", year="2020", imdb_id="tt0")
+        dump = tmp_path / "films.jsonl"
+        dump.write_text("\n".join(
+            json.dumps(self.found_film(imdb_id)) for imdb_id in ["tt0", "tt1", "tt2", "tt1", "tt3"]
+        ))
+
+        call_command("import_films", "--jsonl", str(dump), "--batch-size", "2")
+
+        assert Film.objects.count() == 4
+        assert Artist.objects.count() == 5
+        film = Film.objects.get(imdb_id="tt3")
+        assert {actor.imdb_id for actor in film.actors.all()} == {"nm1", "nmtt3"}
+        assert [director.imdb_id for director in film.directors.all()] == ["nm2"]
+        assert film.media_status == Film.MediaStatus.PENDING
+
+    def test_import_jsonl_skip_invalid_and_failing_films(self, tmp_path, monkeypatch):
+        dump = tmp_path / "films.jsonl"
+        long_named_artist = dict(self.found_film("tt3"), directors=[{'imdb_id': "nm3", 'name': "director" * 10}])
+        dump.write_text("\n".join([
+            json.dumps(self.found_film("tt1")),
+            "{not json",
+            json.dumps({'name': "no imdb id", 'year': "2020"}),
+            json.dumps(long_named_artist),
+            json.dumps(self.found_film("tt2")),
+            json.dumps(self.found_film("tt4")),
+        ]))
+
+        def save_fetched_films(found_films):
+            if any(found_film['imdb_id'] == "tt2" for found_film in found_films):
+                raise IntegrityError("duplicate key")
+            return ingestion.save_fetched_films(found_films)
+
+        monkeypatch.setattr(import_films, "save_fetched_films", save_fetched_films)
+        stderr = StringIO()
+
+        call_command("import_films", "--jsonl", str(dump), "--batch-size", "10", stdout=StringIO(), stderr=stderr)
+
+        assert set(Film.objects.values_list('imdb_id', flat=True)) == {"tt1", "tt4"}
+        assert "line 2" in stderr.getvalue()
+        assert "Skipped invalid film tt3" in stderr.getvalue()
+        assert "Failed to save film tt2" in stderr.getvalue()
+
+    def test_import_ids_fetch_just_new_films(self, tmp_path, monkeypatch):
+        Film.objects.create(name="existing", year="2020", imdb_id="tt0")
+        fetched_ids = []
+
+        def fetch(self, imdb_id, refresh=False):
+            fetched_ids.append(imdb_id)
+            if imdb_id == "tt2":
+                raise ApiCallException("imdb is down")
+            if imdb_id == "tt3":
+                # Unexpected payloads
+                raise KeyError("title")
+            if imdb_id == "tt4":
+                raise TypeError("'NoneType' object is not subscriptable")
+            return TestImportFilms.found_film(imdb_id)
+
+        closed_connections = []
+        close_all = import_films.connections.close_all
+
+        def count_close_all():
+            closed_connections.append(1)
+            close_all()
+
+        monkeypatch.setattr(IMDBApiCall, "fetch", fetch)
+        monkeypatch.setattr(import_films.connections, "close_all", count_close_all)
+        ids = tmp_path / "ids.txt"
+        ids.write_text("tt0\ntt1\n\ntt2\ntt3\ntt4\ntt5\n")
+
+        call_command("import_films", "--ids", str(ids), "--workers", "2", stdout=StringIO())
+
+        assert sorted(fetched_ids) == ["tt1", "tt2", "tt3", "tt4", "tt5"]
+        assert set(Film.objects.values_list('imdb_id', flat=True)) == {"tt0", "tt1", "tt5"}
+        # Once per worker thread, not per fetched film
+        assert len(closed_connections) == 2
+
+
+@pytest.mark.django_db
+class TestReconcileFilmCounters:
+
+    def test_drifted_counters_repaired(self):
+        user = User.objects.create_user(username="test", password="test", phone="09191234567")
+        film = Film.objects.create(name="film", year="2020", imdb_id="tt0")
+        Post.objects.create(user=user, film=film, rate=3, genres={})
+        film.add_to_favorite(user=user)
+        Film.objects.filter(pk=film.pk).update(watched_count=10, faved_count=0, posts_count=0, rate_avg=None)
+
+        call_command("reconcile_film_counters", "--dry-run")
+        assert Film.objects.get(pk=film.pk).watched_count == 10
+
+        call_command("reconcile_film_counters")
+        film.refresh_from_db()
+        assert (film.watched_count, film.faved_count, film.posts_count, film.rate_avg) == (1, 1, 1, 3)
+        assert Film.objects.all().reconcile_counters() == 0
+
+
+@pytest.mark.django_db
+class TestRebuildGenreAggregates:
+
+    def test_aggregates_rebuilt_from_active_posts(self):
+        user = User.objects.create_user(username="test", password="test", phone="09191234567")
+        film = Film.objects.create(name="film", year="2020", imdb_id="tt0")
+        Post.objects.create(user=user, film=film, rate=3, genres={"drama": 8, "war": 3})
+        FilmGenreAggregate.objects.filter(film=film, genre="drama").update(votes_sum=100)
+        FilmGenreAggregate.objects.filter(film=film, genre="war").delete()
+
+        call_command("rebuild_genre_aggregates")
+
+        assert film.genres_average == {"drama_avg": 8, "war_avg": 3}
+
+
+@pytest.mark.django_db
+class TestBuildSimilarFilms:
+
+    def test_similar_films_built_from_co_watched_films(self):
+        films = [Film.objects.create(name=f"film {i}", year="2020", imdb_id=f"tt{i}") for i in range(4)]
+        users = [User.objects.create(username=f"user{i}", phone=f"0912111223{i}") for i in range(3)]
+        for user, watched in zip(users, [films[:2], films[:3], [films[3]]]):
+            for film in watched:
+                film.add_to_watched(user=user)
+        films[1].add_to_favorite(user=users[0])
+
+        # Blocks of one film, to build in more than one block
+        call_command("build_similar_films", "--top-k", "2", "--block-cells", "4")
+
+        neighbours = {
+            film.id: list(SimilarFilm.objects.filter(film=film).order_by('-score').values_list('similar_id', flat=True))
+            for film in films
+        }
+        assert neighbours[films[0].id] == [films[1].id, films[2].id]
+        assert neighbours[films[2].id] == [films[0].id, films[1].id]
+        assert neighbours[films[3].id] == []
+
+
+@pytest.mark.django_db
+class TestTrainRecommendations:
+
+    def test_factors_saved_for_users_and_films(self, settings, tmp_path):
+        settings.RECOMMENDATION_FACTORS_PATH = str(tmp_path / "factors.npz")
+        films = [Film.objects.create(name=f"film {i}", year="2020", imdb_id=f"tt{i}") for i in range(3)]
+        users = [User.objects.create(username=f"user{i}", phone=f"0912111223{i}") for i in range(2)]
+        films[0].add_to_watched(user=users[0])
+        films[1].add_to_favorite(user=users[0])
+        Post.objects.create(user=users[1], film=films[2], rate=4, genres={})
+
+        call_command("train_recommendations", "--factors", "3", "--iterations", "2", "--workers", "1")
+
+        with np.load(settings.RECOMMENDATION_FACTORS_PATH) as factors:
+            assert sorted(factors["user_ids"].tolist()) == sorted(user.id for user in users)
+            assert sorted(factors["film_ids"].tolist()) == sorted(film.id for film in films)
+            assert factors["user_factors"].shape == (2, 3)
+            assert factors["film_factors"].shape == (3, 3)
+            assert factors["film_factors"].dtype == np.float32
+
+
+@pytest.mark.django_db
+class TestCompactTrending:
+
+    def test_decayed_films_removed_and_scores_rebased(self, settings, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(trending, "time", SimpleNamespace(time=lambda: now[0]))
+        trending.trending_films.clear()
+        trending.trending_films.add_events({1: 1.0})
+        now[0] += 10 * settings.TRENDING_HALF_LIFE
+        trending.trending_films.add_events({2: 1.0})
+
+        call_command("compact_trending")
+
+        scores, count = trending.trending_films.top(offset=0, limit=10)
+        assert count == 1
+        assert scores == {2: pytest.approx(1.0)}
+        assert trending.trending_films.redis.zscore(trending.trending_films.key, 2) == pytest.approx(1.0)
+
+    def test_events_added_during_compaction_merged_at_its_end(self, settings, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(trending, "time", SimpleNamespace(time=lambda: now[0]))
+        trending_films = trending.trending_films
+        trending_films.clear()
+        trending_films.add_events({1: 1.0})
+        now[0] += settings.TRENDING_HALF_LIFE
+
+        # Compaction is interrupted after it starts
+        trending_films.redis.eval(
+            trending.START_COMPACT_SCRIPT, 2, trending_films.epoch_key, trending_films.next_epoch_key, now[0]
+        )
+        trending_films.add_events({1: 1.0, 2: 1.0})
+        scores, count = trending_films.top(offset=0, limit=10)
+        assert scores == {1: pytest.approx(0.5)}
+
+        call_command("compact_trending", stdout=StringIO())
+
+        scores, count = trending_films.top(offset=0, limit=10)
+        assert scores == {1: pytest.approx(1.5), 2: pytest.approx(1.0)}
+        assert not trending_films.redis.exists(trending_films.pending_key, trending_films.next_epoch_key)
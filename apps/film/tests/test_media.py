@@ -0,0 +1,123 @@
+from io import BytesIO, StringIO
+
+import pytest
+import requests
+from PIL import Image
+from django.core.management import call_command
+
+from apps.film.constants import POSTER_VARIANT_WIDTHS
+from apps.film.media import media_pipeline
+from apps.film.models import Film
+
+
+@pytest.mark.django_db
+class TestMediaPipeline:
+
+    class Response:
+
+        def __init__(self, status_code, content=b""):
+            self.status_code = status_code
+            self.content = content
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *args):
+            pass
+
+        def raise_for_status(self):
+            if self.status_code != 200:
+                raise requests.HTTPError(f"status {self.status_code}")
+
+        def iter_content(self, chunk_size):
+            for i in range(0, len(self.content), chunk_size):
+                yield self.content[i:i + chunk_size]
+
+    @pytest.fixture(autouse=True)
+    def media_root(self, settings, tmp_path, monkeypatch):
+        settings.MEDIA_ROOT = str(tmp_path)
+        monkeypatch.setattr(media_pipeline, "backoff", 0)
+
+    @pytest.fixture()
+    def poster(self):
+        content = BytesIO()
+        Image.new('RGB', (300, 450), color='red').save(content, format='JPEG')
+        return content.getvalue()
+
+    @pytest.fixture()
+    def requested_urls(self, monkeypatch, poster):
+        requested_urls = []
+
+        def get(url, **kwargs):
+            requested_urls.append(url)
+            if "banner" in url:
+                return self.Response(500)
+            return self.Response(200, poster)
+
+        monkeypatch.setattr(requests, "get", get)
+        return requested_urls
+
+    @pytest.fixture()
+    def film(self):
+        return Film.objects.create(
+            name="film",
+            year="2020",
+            photo_url="https://images/poster.jpg",
+            banner_url="https://images/banner.jpg",
+        )
+
+    def test_saving_film_not_download_media(self, film, requested_urls):
+        film.name = "edited"
+        film.save()
+
+        assert requested_urls == []
+        assert film.media_status == Film.MediaStatus.PENDING
+
+    def test_download_film_media_save_photo_and_retry_failed_banner(self, film, requested_urls, poster):
+        status = media_pipeline.download_film_media(film.id)
+
+        film.refresh_from_db()
+        assert status == Film.MediaStatus.FAILED
+        assert film.media_status == Film.MediaStatus.FAILED
+        with film.photo.open('rb') as photo:
+            assert photo.read() == poster
+        assert not film.banner
+        assert requested_urls.count("https://images/banner.jpg") == media_pipeline.retries
+
+    def test_download_film_media_make_photo_variants(self, film, requested_urls):
+        media_pipeline.download_film_media(film.id)
+
+        film.refresh_from_db()
+        assert set(film.photo_variants) == set(POSTER_VARIANT_WIDTHS)
+        for variant, width in POSTER_VARIANT_WIDTHS.items():
+            for name in film.photo_variants[variant].values():
+                with film.photo.storage.open(name) as variant_file:
+                    assert Image.open(variant_file).width == width
+
+    def test_download_film_media_release_film_on_unexpected_error(self, film, requested_urls, monkeypatch):
+        def save(*args, **kwargs):
+            raise RuntimeError("storage is down")
+
+        monkeypatch.setattr(film.photo.storage, "save", save)
+        with pytest.raises(RuntimeError):
+            media_pipeline.download_film_media(film.id)
+
+        film.refresh_from_db()
+        assert film.media_status == Film.MediaStatus.FAILED
+
+    # Films are downloaded by threads of the command, which have their own db connections
+    @pytest.mark.django_db(transaction=True)
+    def test_download_film_media_reclaim_film_left_downloading(self, film, requested_urls, monkeypatch):
+        Film.objects.filter(pk=film.pk).update(media_status=Film.MediaStatus.DOWNLOADING)
+
+        # Its worker may still be downloading
+        assert media_pipeline.download_film_media(film.id) == Film.MediaStatus.DOWNLOADING
+        assert requested_urls == []
+
+        monkeypatch.setattr(media_pipeline, "download_timeout", 0)
+        call_command("download_photos", stdout=StringIO())
+
+        film.refresh_from_db()
+        assert "https://images/poster.jpg" in requested_urls
+        assert film.media_status == Film.MediaStatus.FAILED
+        assert film.photo
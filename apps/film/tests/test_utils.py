@@ -0,0 +1,133 @@
+import time
+from datetime import timedelta
+
+import pytest
+from django.core.cache import cache
+from django.utils import timezone
+
+from apps.film.models import IMDBTitle
+from apps.film.utils import IMDBApiCall
+from core.exceptions import ApiCallException
+from core.utils.api import ApiCall
+
+
+class TestIMDBSearchCache:
+
+    @pytest.fixture(autouse=True)
+    def tear_down(self):
+        yield
+        cache.clear()
+
+    @pytest.fixture()
+    def upstream_calls(self, monkeypatch):
+        calls = []
+
+        def _search(self, film):
+            calls.append(film)
+            return [{'imdb_id': "tt1", 'name': film, 'photo': None, 'year': "2020"}]
+
+        monkeypatch.setattr(IMDBApiCall, "_search", _search)
+        return calls
+
+    def test_same_normalized_query_call_upstream_once(self, upstream_calls):
+        first = IMDBApiCall().search("The  Matrix")
+        second = IMDBApiCall().search(" the matrix ")
+
+        assert first == second
+        assert upstream_calls == ["the matrix"]
+
+    def test_stale_result_served_when_upstream_fails(self):
+        search_cache = IMDBApiCall.search_cache
+        stale_result = [{'imdb_id': "tt1", 'name': "matrix", 'photo': None, 'year': "1999"}]
+        cache.set(search_cache._key("stale"), {'value': stale_result, 'fresh_until': 0})
+
+        def _failing_search():
+            raise ApiCallException("imdb is down")
+
+        assert search_cache.get(key="stale", func=_failing_search) == stale_result
+
+    def test_miss_waits_for_lock_owner_result(self, monkeypatch):
+        search_cache = IMDBApiCall.search_cache
+        key = "waiting"
+        cache.add(search_cache._lock_key(key), True, search_cache.lock_ttl)
+
+        def _lock_owner_result():
+            cache.set(search_cache._key(key), {'value': ["owner"], 'fresh_until': time.time() + 60})
+            return None
+
+        monkeypatch.setattr(search_cache, "poll_interval", 0)
+        monkeypatch.setattr("core.utils.cache.time.sleep", lambda _: _lock_owner_result())
+
+        assert search_cache.get(key=key, func=lambda: ["caller"]) == ["owner"]
+
+    def test_miss_not_wait_for_failed_lock_owner(self, monkeypatch):
+        search_cache = IMDBApiCall.search_cache
+        key = "failed"
+        cache.add(search_cache._lock_key(key), True, search_cache.lock_ttl)
+
+        sleeps = []
+
+        def _lock_owner_failed(_):
+            sleeps.append(_)
+            cache.delete(search_cache._lock_key(key))
+
+        monkeypatch.setattr("core.utils.cache.time.sleep", _lock_owner_failed)
+
+        assert search_cache.get(key=key, func=lambda: ["caller"]) == ["caller"]
+        assert len(sleeps) == 1
+        assert search_cache.get(key=key, func=lambda: ["other"]) == ["caller"]
+        assert cache.get(search_cache._lock_key(key)) is None
+
+
+@pytest.mark.django_db
+class TestIMDBTitleCache:
+
+    class Response:
+        headers = {'ETag': '"v1"'}
+
+        def __init__(self, status_code, payload=None):
+            self.status_code = status_code
+            self.payload = payload
+
+        def json(self):
+            return self.payload
+
+    @pytest.fixture()
+    def upstream_calls(self, monkeypatch):
+        calls = []
+
+        def api_call(**kwargs):
+            calls.append(kwargs)
+            if kwargs.get('headers'):
+                return self.Response(304)
+            return self.Response(200, {'title': "film", 'year': "2020", 'genreList': [{'value': "Drama"}]})
+
+        monkeypatch.setattr(ApiCall, "api_call", api_call)
+        return calls
+
+    def test_fetch_read_payload_from_db(self, upstream_calls):
+        first = IMDBApiCall().fetch("tt1")
+        second = IMDBApiCall().fetch("tt1")
+
+        assert first == second
+        assert second['genres'] == ["Drama"]
+        assert len(upstream_calls) == 1
+        assert IMDBTitle.objects.get(imdb_id="tt1").etag == '"v1"'
+
+    def test_refresh_send_conditional_request(self, upstream_calls):
+        IMDBApiCall().fetch("tt1")
+        assert IMDBApiCall().fetch("tt1", refresh=True)['name'] == "film"
+
+        assert len(upstream_calls) == 2
+        assert upstream_calls[1]['headers'] == {'If-None-Match': '"v1"'}
+
+    def test_not_fresh_payload_used_when_api_fails(self, upstream_calls, monkeypatch):
+        IMDBApiCall().fetch("tt1")
+        IMDBTitle.objects.filter(imdb_id="tt1").update(fetched_time=timezone.now() - timedelta(days=365))
+
+        def failing_api_call(**kwargs):
+            raise ApiCallException("imdb is down")
+
+        monkeypatch.setattr(ApiCall, "api_call", failing_api_call)
+
+        assert IMDBApiCall().fetch("tt1")['name'] == "film"
@@ -1,8 +1,28 @@
+import json
+import threading
+from base64 import b64encode
+from datetime import timedelta
+from io import StringIO
+from types import SimpleNamespace
+
 import pytest
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import TrigramSimilarity
+from django.core.management import call_command
+from django.db import IntegrityError, connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from redis.exceptions import RedisError
 
-from apps.film.models import Film
+from apps.film import constants, trending
+from apps.film.api.v1 import views
+from apps.film.ingestion import claim_ingestion_job, enqueue_ingestion, run_ingestion_job, save_fetched_film
+from apps.film.models import Film, IngestionJob, Artist, SimilarFilm
+from apps.film.recommendations import ForYouRecommender, GenreEmbeddingIndex
+from apps.film.utils import IMDBApiCall
+from apps.post.models import Post
+from core.exceptions import ApiCallException
 
 
 User = get_user_model()
@@ -127,3 +147,749 @@ class TestFavViewSet:
         assert res.status_code == 200
         user.refresh_from_db()
         assert film not in user.film_favorites.all()
+
+
+@pytest.mark.django_db
+class TestFilmViewSet:
+
+    @pytest.fixture()
+    def user(self):
+        return User.objects.create_user(
+            username="test",
+            password="test",
+            phone="09191234567"
+        )
+
+    @pytest.fixture()
+    def film(self):
+        return Film.objects.create(name="film", year="2020")
+
+    @pytest.fixture()
+    def client(self, client, user):
+        client.force_login(user)
+        return client
+
+    @pytest.fixture()
+    def other_users(self):
+        return [
+            User.objects.create(username=f"other{i}", phone=f"0912111223{i}")
+            for i in range(3)
+        ]
+
+    def test_get_film_detail_return_user_relations(self, user, film, client, other_users):
+        film.add_to_favorite(user=user)
+        for other_user in other_users:
+            film.add_to_watchlist(user=other_user)
+
+        res = client.get(
+            reverse("film-detail", kwargs={"pk": film.id})
+        )
+        assert res.status_code == 200
+        assert res.json()["is_watched"] is True
+        assert res.json()["is_fav"] is True
+        assert res.json()["is_watchlist"] is False
+        assert res.json()["has_post"] is False
+
+    def test_watched_list_queries_not_depend_on_films_count(
+            self, user, client, other_users
+    ):
+        def watched_list_queries_count():
+            with CaptureQueriesContext(connection) as queries:
+                res = client.get(reverse("self_profile-self_watched"))
+            assert res.status_code == 200
+            assert all(film["is_watched"] for film in res.json()["results"])
+            return len(queries)
+
+        Film.objects.create(imdb_id="tt0", name="film0", year="2020").add_to_watched(user=user)
+        one_film_queries = watched_list_queries_count()
+
+        for i in range(1, 4):
+            film = Film.objects.create(imdb_id=f"tt{i}", name=f"film{i}", year="2020")
+            film.add_to_watched(user=user)
+            for other_user in other_users:
+                film.add_to_watched(user=other_user)
+
+        assert watched_list_queries_count() == one_film_queries
+
+    def test_film_counters_follow_relations_and_posts(self, user, film, other_users):
+        film.add_to_favorite(user=user)
+        for other_user in other_users:
+            film.add_to_watchlist(user=other_user)
+        other_users[0].films_watchlist.remove(film, film)
+        film.users_watchlist.remove(other_users[1])
+
+        post = Post.objects.create(user=user, film=film, rate=4, genres={})
+        Post.objects.create(user=other_users[2], film=film, rate=None, genres={})
+        post.rate = 2
+        post.save()
+
+        film.refresh_from_db()
+        assert (film.watched_count, film.watchlist_count, film.faved_count, film.posts_count) == (2, 0, 1, 2)
+        assert (film.rate_count, film.rate_avg) == (1, 2)
+
+        film.remove_from_watched(user=user)
+
+        film.refresh_from_db()
+        assert (film.watched_count, film.faved_count, film.posts_count) == (1, 0, 1)
+        assert (film.rate_count, film.rate_avg) == (0, None)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_film_counters_not_changed_twice_by_concurrent_removes(self, user, film):
+        film.add_to_watched(user=user)
+
+        errors = []
+
+        def remove():
+            try:
+                user.films_watched.remove(film)
+            except Exception as e:                                          # noqa
+                errors.append(e)
+            finally:
+                connections.close_all()
+
+        with transaction.atomic():
+            user.films_watched.remove(film)
+            # The other remove waits for this one, then finds nothing to remove
+            concurrent_remove = threading.Thread(target=remove)
+            concurrent_remove.start()
+            concurrent_remove.join(timeout=0.5)
+        concurrent_remove.join()
+
+        assert errors == []
+        film.refresh_from_db()
+        assert film.watched_count == 0
+
+    def test_film_detail_genres_average_follow_posts(self, user, film, client, other_users):
+        post = Post.objects.create(user=user, film=film, rate=4, genres={"drama": 8, "comedy": 2})
+        Post.objects.create(user=other_users[0], film=film, rate=2, genres={"drama": 4})
+        Post.objects.create(user=other_users[1], film=film, rate=3, genres={"horror": 6}).delete()
+        post.genres = {"drama": 6}
+        post.save()
+
+        res = client.get(reverse("film-detail", kwargs={"pk": film.id}))
+
+        assert res.status_code == 200
+        assert res.json()["genres_average"] == {"drama_avg": 5}
+        assert res.json()["rate_average"] == 3
+
+    def test_film_detail_cached_and_invalidated_on_changes(self, user, film, client, other_users):
+        def get_detail():
+            with CaptureQueriesContext(connection) as queries:
+                res = client.get(reverse("film-detail", kwargs={"pk": film.id}))
+            assert res.status_code == 200
+            return res.json(), queries
+
+        film.add_to_watched(user=user)
+        get_detail()
+        Post.objects.create(user=other_users[0], film=film, rate=4, genres={"drama": 8})
+        film.actors.add(Artist.objects.create(imdb_id="nm1", name="actor"), through_defaults={"character": "Hero"})
+        detail, _ = get_detail()
+        assert detail["rate_average"] == 4
+        assert detail["genres_average"] == {"drama_avg": 8}
+        assert detail["actors"][0]["character"] == "Hero"
+
+        # Cache hit is session, user and relations of user queries
+        detail, queries = get_detail()
+        assert len(queries) == 3
+        assert detail["is_watched"] is True
+
+        film.name = "edited"
+        film.save()
+        client.force_login(other_users[1])
+        detail, _ = get_detail()
+        assert detail["name"] == "edited"
+        assert detail["is_watched"] is False
+
+    def test_film_detail_not_modified_until_film_or_relations_change(self, user, film, client, other_users):
+        url = reverse("film-detail", kwargs={"pk": film.id})
+        res = client.get(url)
+        etag = res["ETag"]
+        assert res.status_code == 200
+        assert res["Last-Modified"]
+
+        with CaptureQueriesContext(connection) as queries:
+            res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 304
+        assert res["ETag"] == etag
+        # Session, user and validators queries
+        assert len(queries) == 3
+
+        film.add_to_watched(user=user)
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 200
+        assert res.json()["is_watched"] is True
+        etag = res["ETag"]
+
+        # Aggregates change updated_time of film
+        Post.objects.create(user=other_users[0], film=film, rate=4, genres={})
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 200
+        assert res.json()["rate_average"] == 4
+
+    def test_film_list_not_modified_until_page_or_watched_by_change(self, user, film, client, other_users):
+        url = reverse("film-list")
+        res = client.get(url)
+        etag = res["ETag"]
+        assert res.status_code == 200
+
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 304
+
+        # Watched by a following of user
+        user.follow(other_users[0])
+        film.add_to_watched(user=other_users[0])
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 200
+        assert res.json()["results"][0]["watched_by_count"] == 1
+        etag = res["ETag"]
+
+        other_users[0].username = "renamed"
+        other_users[0].save()
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 200
+        assert res.json()["results"][0]["watched_by"][0]["username"] == "renamed"
+        etag = res["ETag"]
+
+        Film.objects.create(imdb_id="tt1", name="new film", year="2021")
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 200
+        assert res.json()["count"] == 2
+
+    def test_film_list_ordered_by_counter(self, user, client, other_users):
+        films = [Film.objects.create(imdb_id=f"tt{i}", name=f"film{i}", year="2020") for i in range(3)]
+        for film, fans in zip(films, [other_users[:1], other_users, []]):
+            for fan in fans:
+                film.add_to_favorite(user=fan)
+
+        res = client.get(reverse("film-list"), data={"ordering": "-fav"})
+
+        assert res.status_code == 200
+        assert [film["id"] for film in res.json()["results"]] == [films[1].id, films[0].id, films[2].id]
+
+    def test_film_list_watched_by_capped_with_constant_queries(self, user, client, monkeypatch):
+        monkeypatch.setattr(constants, "WATCHED_BY_LIMIT", 2)
+        films = [Film.objects.create(imdb_id=f"tt{i}", name=f"film{i}", year="2020") for i in range(3)]
+
+        def home_list():
+            with CaptureQueriesContext(connection) as queries:
+                res = client.get(reverse("film-list"))
+            assert res.status_code == 200
+            return {film["id"]: film for film in res.json()["results"]}, len(queries)
+
+        _, no_watchers_queries = home_list()
+
+        followings = [User.objects.create(username=f"following{i}", phone=f"0912111224{i}") for i in range(3)]
+        stranger = User.objects.create(username="stranger", phone="09121112250")
+        for following in followings:
+            user.follow(following)
+            for film in films[:2]:
+                film.add_to_watched(user=following)
+        films[2].add_to_watched(user=stranger)
+
+        results, queries = home_list()
+
+        assert queries == no_watchers_queries + 1
+        assert results[films[0].id]["watched_by_count"] == 3
+        assert [watcher["id"] for watcher in results[films[0].id]["watched_by"]] == [
+            followings[2].id, followings[1].id
+        ]
+        assert all(watcher["is_followed"] for watcher in results[films[1].id]["watched_by"])
+        assert results[films[2].id]["watched_by"] == []
+        assert results[films[2].id]["watched_by_count"] == 0
+
+    def test_film_posts_followings_first_paged_by_cursor(self, user, film, client, other_users):
+        following, *strangers = other_users
+        user.follow(following)
+        posts = [
+            Post.objects.create(user=strangers[0], film=film, genres={}, caption="first"),
+            Post.objects.create(user=following, film=film, genres={}, caption="following"),
+            Post.objects.create(user=strangers[1], film=film, genres={}, caption="last"),
+        ]
+
+        pages = []
+        url = reverse("film-posts", kwargs={"pk": film.id}) + "?page_size=2"
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                res = client.get(url)
+            assert res.status_code == 200
+            pages.append([post["id"] for post in res.json()["results"]])
+            url = res.json()["next"]
+
+        assert pages == [[posts[1].id, posts[2].id], [posts[0].id]]
+        assert res.json()["results"][0]["user"]["is_followed"] is False
+        # Session, user, film and posts page, nothing per post
+        assert len(queries) == 4
+
+        previous_page = client.get(res.json()["previous"]).json()
+        assert [post["id"] for post in previous_page["results"]] == pages[0]
+
+        tampered_cursor = b64encode(json.dumps({"segment": 0, "values": ["x", "y"], "reverse": False}).encode())
+        res = client.get(reverse("film-posts", kwargs={"pk": film.id}), {"cursor": tampered_cursor.decode()})
+        assert res.status_code == 404
+
+    def test_similar_films_ordered_by_score(self, user, film, client):
+        similar_films = [Film.objects.create(imdb_id=f"tt{i}", name=f"film{i}", year="2020") for i in range(2)]
+        SimilarFilm.objects.create(film=film, similar=similar_films[0], score=0.2)
+        SimilarFilm.objects.create(film=film, similar=similar_films[1], score=0.9)
+        similar_films[1].add_to_watched(user=user)
+
+        res = client.get(reverse("film-similar", kwargs={"pk": film.id}))
+
+        assert res.status_code == 200
+        assert [similar["id"] for similar in res.json()] == [similar_films[1].id, similar_films[0].id]
+        assert res.json()[0]["is_watched"] is True
+
+    def test_feels_like_films_follow_genre_votes(self, user, film, client, monkeypatch):
+        monkeypatch.setattr(views, "genre_index", GenreEmbeddingIndex(reload_interval=0))
+        films = [Film.objects.create(imdb_id=f"tt{i}", name=f"film{i}", year="2020") for i in range(3)]
+        Post.objects.create(user=user, film=film, genres={"drama": 8, "crime": 6})
+        Post.objects.create(user=user, film=films[0], genres={"drama": 2, "crime": 2, "war": 2})
+        Post.objects.create(user=user, film=films[1], genres={"comedy": 9})
+        post = Post.objects.create(user=user, film=films[2], genres={"drama": 7, "comedy": 4})
+
+        res = client.get(reverse("film-feels_like", kwargs={"pk": film.id}))
+        assert res.status_code == 200
+        assert [similar["id"] for similar in res.json()] == [films[0].id, films[2].id, films[1].id]
+
+        # Changed embeddings are reloaded
+        post.genres = {"drama": 8, "crime": 6}
+        post.save()
+        res = client.get(reverse("film-feels_like", kwargs={"pk": film.id}))
+        assert [similar["id"] for similar in res.json()][0] == films[2].id
+        assert res.json()[0]["score"] == pytest.approx(1)
+
+    def test_feels_like_films_reloaded_when_film_loses_all_votes(self, user, film, client, monkeypatch):
+        monkeypatch.setattr(views, "genre_index", GenreEmbeddingIndex(reload_interval=0))
+        other_film = Film.objects.create(imdb_id="tt1", name="film1", year="2020")
+        Post.objects.create(user=user, film=film, genres={"drama": 8})
+        post = Post.objects.create(user=user, film=other_film, genres={"drama": 5})
+        res = client.get(reverse("film-feels_like", kwargs={"pk": film.id}))
+        assert [similar["id"] for similar in res.json()] == [other_film.id]
+
+        # Just a film without embedding changed since last load
+        views.genre_index.loaded_until = timezone.now()
+        post.delete()
+        res = client.get(reverse("film-feels_like", kwargs={"pk": film.id}))
+        assert res.status_code == 200
+        assert res.json() == []
+
+    def test_for_you_films_ranked_by_trained_factors(self, user, client, other_users, settings, tmp_path, monkeypatch):
+        settings.RECOMMENDATION_FACTORS_PATH = str(tmp_path / "factors.npz")
+        monkeypatch.setattr(views, "for_you_recommender", ForYouRecommender(path=settings.RECOMMENDATION_FACTORS_PATH))
+        films = [Film.objects.create(imdb_id=f"tt{i}", name=f"film{i}", year="2020") for i in range(4)]
+        for fan, watched in zip([user, *other_users], [films[:2], films[:3], films[:3]]):
+            for film in watched:
+                film.add_to_watched(user=fan)
+        films[3].add_to_watchlist(user=other_users[-1])
+
+        call_command("train_recommendations", "--factors", "4", "--workers", "2", stdout=StringIO())
+        res = client.get(reverse("film-for_you"))
+
+        assert res.status_code == 200
+        # Watched films are not recommended
+        assert [film["id"] for film in res.json()] == [films[2].id, films[3].id]
+        assert res.json()[0]["score"] > res.json()[1]["score"]
+
+    def test_for_you_films_of_user_without_factors_are_most_watched(self, user, client, other_users, monkeypatch):
+        monkeypatch.setattr(views, "for_you_recommender", ForYouRecommender(path="not_trained.npz"))
+        films = [Film.objects.create(imdb_id=f"tt{i}", name=f"film{i}", year="2020") for i in range(3)]
+        films[0].add_to_watched(user=other_users[0])
+        films[1].add_to_watched(user=other_users[0])
+        films[1].add_to_watched(user=other_users[1])
+        films[1].add_to_watched(user=user)
+
+        res = client.get(reverse("film-for_you"))
+
+        assert res.status_code == 200
+        assert [film["id"] for film in res.json()] == [films[0].id, films[2].id]
+
+    @pytest.mark.django_db(transaction=True)
+    def test_film_list_ordered_by_trending(self, user, client, other_users, settings, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(trending, "time", SimpleNamespace(time=lambda: now[0]))
+        trending.trending_films.clear()
+        films = [Film.objects.create(imdb_id=f"tt{i}", name=f"film{i}", year="2020") for i in range(3)]
+        films[0].add_to_watched(user=other_users[0])
+        films[0].add_to_watched(user=other_users[1])
+        # Two half lives later, one favorite weighs more than two old watches
+        now[0] += 2 * settings.TRENDING_HALF_LIFE
+        films[1].add_to_favorite(user=user)
+
+        res = client.get(reverse("film-list"), data={"ordering": "-trending"})
+
+        assert res.status_code == 200
+        assert res.json()["count"] == 2
+        assert [film["id"] for film in res.json()["results"]] == [films[1].id, films[0].id]
+        assert client.get(reverse("film-list"), data={"ordering": "trending"}).status_code == 400
+
+        # Rolled back events don't count
+        with pytest.raises(IntegrityError), transaction.atomic():
+            films[2].add_to_favorite(user=user)
+            raise IntegrityError
+        assert trending.trending_films.top(offset=0, limit=10)[1] == 2
+
+        def failing_pipeline(**kwargs):
+            raise RedisError("redis is down")
+
+        monkeypatch.setattr(trending.TrendingFilms, "redis", SimpleNamespace(pipeline=failing_pipeline))
+        res = client.get(reverse("film-list"), data={"ordering": "-trending"})
+        assert res.status_code == 200
+        assert res.json()["results"] == []
+
+    def test_film_list_paged_through_ranking_snapshot(self, user, client, other_users):
+        films = [Film.objects.create(imdb_id=f"tt{i}", name=f"film{i}", year="2020") for i in range(3)]
+        for film, fans in zip(films, [other_users[:1], other_users, []]):
+            for fan in fans:
+                film.add_to_favorite(user=fan)
+        call_command("refresh_film_ranking")
+        # Snapshot is kept until next refresh
+        films[2].add_to_favorite(user=user)
+        films[2].add_to_favorite(user=other_users[0])
+
+        first_page = client.get(reverse("film-list"), data={"ordering": "-fav", "limit": 2}).json()
+        second_page = client.get(reverse("film-list"), data={"ordering": "-fav", "limit": 2, "offset": 2}).json()
+        ascending = client.get(reverse("film-list"), data={"ordering": "fav"}).json()
+
+        assert first_page["count"] == 3
+        assert first_page["next"] is not None
+        assert [film["id"] for film in first_page["results"]] == [films[1].id, films[0].id]
+        assert [film["id"] for film in second_page["results"]] == [films[2].id]
+        assert [film["id"] for film in ascending["results"]] == [films[2].id, films[0].id, films[1].id]
+
+        # New films are listed right away, created_time ordering isn't read from snapshot
+        new_film = Film.objects.create(imdb_id="tt3", name="film3", year="2020")
+        newest = client.get(reverse("film-list"), data={"limit": 1}).json()
+        assert [film["id"] for film in newest["results"]] == [new_film.id]
+
+
+@pytest.mark.django_db
+class TestDiscoverViewSet:
+
+    @pytest.fixture()
+    def client(self, client):
+        client.force_login(User.objects.create_user(username="test", password="test", phone="09191234567"))
+        return client
+
+    @pytest.fixture()
+    def films(self):
+        return [
+            Film.objects.create(
+                imdb_id="tt0", name="film0", year=1990, imdb=8.5,
+                genres=["Drama", "Crime"], countries=["USA"], languages=["English", "Italian"]
+            ),
+            Film.objects.create(
+                imdb_id="tt1", name="film1", year=2005, imdb=7.0,
+                genres=["Drama"], countries=["France"], languages=["French"]
+            ),
+            Film.objects.create(
+                imdb_id="tt2", name="film2", year=2010, imdb=8.0,
+                genres=["Drama", "Crime", "Thriller"], countries=["USA"], languages=["English"]
+            ),
+            Film.objects.create(imdb_id="tt3", name="film3", year=2015, imdb=6.0, genres=["Comedy"]),
+        ]
+
+    def test_discover_filter_films_with_facets(self, client, films):
+        with CaptureQueriesContext(connection) as queries:
+            res = client.get(reverse("discover-list"), data={"genres": "Crime,Drama", "imdb_min": 7.5})
+
+        assert res.status_code == 200
+        assert {film["id"] for film in res.json()["results"]} == {films[0].id, films[2].id}
+        assert res.json()["count"] == 2
+        assert res.json()["facets"] == {
+            "genres": {"Crime": 2, "Drama": 2, "Thriller": 1},
+            "countries": {"USA": 2},
+            "languages": {"English": 2, "Italian": 1},
+        }
+        # Facets of all fields come with one query
+        assert len([query for query in queries if 'unnest' in query['sql']]) == 1
+
+    def test_discover_filter_year_range_and_country(self, client, films):
+        res = client.get(reverse("discover-list"), data={"year_min": 2000, "year_max": 2012, "countries": "USA"})
+
+        assert [film["id"] for film in res.json()["results"]] == [films[2].id]
+
+
+@pytest.mark.django_db
+class TestArtistViewSet:
+
+    @pytest.fixture()
+    def user(self):
+        return User.objects.create_user(username="test", password="test", phone="09191234567")
+
+    @pytest.fixture()
+    def client(self, client, user):
+        client.force_login(user)
+        return client
+
+    @pytest.fixture()
+    def artist(self):
+        return Artist.objects.create(imdb_id="nm0", name="Quentin Tarantino")
+
+    def test_artists_searched_by_similar_name(self, client, artist):
+        Artist.objects.create(imdb_id="nm1", name="Quentin Dupieux")
+        Artist.objects.create(imdb_id="nm2", name="Al Pacino")
+
+        res = client.get(reverse("artist-list"), data={"search": "tarantno"})
+
+        assert res.status_code == 200
+        assert [found["id"] for found in res.json()["results"]] == [artist.id]
+        assert client.get(reverse("artist-list")).status_code == 400
+
+        # Substrings match literally, whatever the characters of query
+        res = client.get(reverse("artist-list"), data={"search": "l pacino"})
+        assert [found["name"] for found in res.json()["results"]] == ["Al Pacino"]
+        assert client.get(reverse("artist-list"), data={"search": "(.*"}).json()["results"] == []
+
+    def test_filmography_has_films_of_all_roles_once_ordered_by_year(self, user, client, artist):
+        films = [
+            Film.objects.create(imdb_id=f"tt{i}", name=f"film{i}", year=year) for i, year in enumerate([2003, 1994])
+        ]
+        films[0].actors.add(artist)
+        films[1].writers.add(artist)
+        films[1].directors.add(artist)
+        films[0].add_to_watched(user=user)
+
+        res = client.get(reverse("artist-filmography", kwargs={"pk": artist.id}))
+
+        assert res.status_code == 200
+        results = res.json()["results"]
+        assert [film["id"] for film in results] == [films[1].id, films[0].id]
+        assert results[0]["roles"] == ["writer", "director"]
+        assert results[1]["roles"] == ["actor"]
+        assert [film["is_watched"] for film in results] == [False, True]
+
+    def test_filmography_queries_not_grow_with_films(self, client, artist):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                client.get(reverse("artist-filmography", kwargs={"pk": artist.id}))
+            return len(queries)
+
+        Film.objects.create(imdb_id="tt0", name="film0", year=2000).actors.add(artist)
+        queries_count = count_queries()
+        for i in range(1, 5):
+            Film.objects.create(imdb_id=f"tt{i}", name=f"film{i}", year=2000).directors.add(artist)
+
+        assert count_queries() == queries_count
+
+
+@pytest.mark.django_db
+class TestSearchViewSet:
+
+    @pytest.fixture()
+    def user(self):
+        return User.objects.create_user(
+            username="test",
+            password="test",
+            phone="09191234567"
+        )
+
+    @pytest.fixture()
+    def client(self, client, user):
+        client.force_login(user)
+        return client
+
+    @pytest.fixture()
+    def found_films(self, monkeypatch):
+        found_films = [
+            {'imdb_id': f"tt{i}", 'name': f"film{i}", 'photo': None, 'year': "2020"}
+            for i in range(5)
+        ]
+        monkeypatch.setattr(IMDBApiCall, "search", lambda self, film: found_films)
+        return found_films
+
+    def test_search_return_local_films_relations_with_one_query(self, user, client, found_films):
+        film = Film.objects.create(imdb_id="tt1", name="film1", year="2020")
+        film.add_to_favorite(user=user)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = client.get(reverse("search-list"), data={"search": "film", "source": "imdb"})
+
+        assert res.status_code == 200
+        results = {found_film["imdb_id"]: found_film for found_film in res.json()}
+        assert results["tt1"]["watched_count"] == 1
+        assert results["tt1"]["is_fav"] is True
+        assert results["tt0"]["watched_count"] == 0
+        assert results["tt0"]["is_watched"] is False
+        film_queries = [query for query in queries if 'film_film' in query['sql']]
+        assert len(film_queries) == 1
+
+    @pytest.fixture()
+    def local_films(self):
+        return [
+            Film.objects.create(imdb_id="tt10", name="The Godfather", year="1972", plot="A crime family"),
+            Film.objects.create(imdb_id="tt11", name="The Godfather Part II", year="1974"),
+            Film.objects.create(imdb_id="tt12", name="Godzilla", year="2014"),
+            Film.objects.create(imdb_id="tt13", name="Heat", year="1995", plot="A crime saga about a godfather"),
+        ]
+
+    def test_search_local_films_first_without_calling_imdb(self, user, client, local_films, found_films):
+        local_films[1].add_to_favorite(user=user)
+
+        res = client.get(reverse("search-list"), data={"search": "godfather"})
+
+        assert res.status_code == 200
+        assert [found_film["imdb_id"] for found_film in res.json()] == ["tt11", "tt10", "tt13"]
+        assert res.json()[0]["is_fav"] is True
+
+    def test_search_return_local_films_when_imdb_fails(self, client, local_films, monkeypatch):
+        def failing_search(self, film):
+            raise ApiCallException("imdb is down")
+
+        monkeypatch.setattr(IMDBApiCall, "search", failing_search)
+
+        res = client.get(reverse("search-list"), data={"search": "heat"})
+
+        assert res.status_code == 200
+        assert [found_film["imdb_id"] for found_film in res.json()] == ["tt13"]
+
+    def test_search_name_match_outrank_plot_match(self, local_films):
+        films = Film.objects.filter(imdb_id__in=["tt10", "tt13"]).search("godfather").annotate(
+            similarity=TrigramSimilarity('name', "godfather")
+        )
+        # Full text rank of each film, without trigram similarity of name
+        ranks = {film.imdb_id: film.relevance - film.similarity for film in films}
+        assert ranks["tt10"] > 2 * ranks["tt13"] > 0
+
+    def test_search_local_films_tolerate_typo(self, user, client, local_films, found_films):
+        res = client.get(reverse("search-list"), data={"search": "godfater", "source": "local"})
+
+        assert res.status_code == 200
+        assert [found_film["imdb_id"] for found_film in res.json()] == ["tt10", "tt11"]
+
+    def test_search_imdb_when_local_results_not_enough(self, user, client, local_films, found_films):
+        res = client.get(reverse("search-list"), data={"search": "heat"})
+
+        assert res.status_code == 200
+        assert [found_film["imdb_id"] for found_film in res.json()] == ["tt13", "tt0", "tt1", "tt2", "tt3", "tt4"]
+
+    def test_search_just_local(self, user, client, local_films, found_films):
+        res = client.get(reverse("search-list"), data={"search": "heat", "source": "local"})
+
+        assert [found_film["imdb_id"] for found_film in res.json()] == ["tt13"]
+
+
+@pytest.mark.django_db
+class TestFilmIngestion:
+
+    @pytest.fixture()
+    def user(self):
+        return User.objects.create_user(
+            username="test",
+            password="test",
+            phone="09191234567"
+        )
+
+    @pytest.fixture()
+    def client(self, client, user):
+        client.force_login(user)
+        return client
+
+    @pytest.fixture()
+    def found_film(self, monkeypatch):
+        found_film = {
+            'imdb_id': "tt1",
+            'name': "film",
+            'year': 2020,
+            'actors': [{'imdb_id': "nm1", 'name': "actor", 'photo': None}],
+            'writers': [{'imdb_id': "nm2", 'name': "writer", 'photo': None}],
+            'directors': [{'imdb_id': "nm2", 'name': "writer", 'photo': None}],
+        }
+        monkeypatch.setattr(IMDBApiCall, "fetch", lambda self, imdb_id: dict(found_film))
+        return found_film
+
+    def test_create_film_enqueue_job_and_worker_ingest_it(self, client, found_film):
+        res = client.post(reverse("film-list"), data={"imdb_id": "tt1"})
+        assert res.status_code == 202
+        job_id = res.json()["id"]
+        assert res.json()["status"] == IngestionJob.Status.PENDING
+        assert not Film.objects.filter(imdb_id="tt1").exists()
+
+        call_command("run_ingestion_worker", "--once", stdout=StringIO())
+
+        res = client.get(reverse("ingestion_job-detail", kwargs={"pk": job_id}))
+        assert res.status_code == 200
+        assert res.json()["status"] == IngestionJob.Status.DONE
+        film = Film.objects.get(id=res.json()["film"])
+        assert film.actors.count() == 1
+        assert film.writers.get() == film.directors.get()
+
+    def test_create_film_twice_return_same_job(self, client, found_film):
+        first = client.post(reverse("film-list"), data={"imdb_id": "tt1"})
+        second = client.post(reverse("film-list"), data={"imdb_id": "tt1"})
+        assert first.json()["id"] == second.json()["id"]
+
+    def test_failed_job_retried_after_backoff_and_dead_worker_job_failed_after_max_attempts(
+            self, found_film, monkeypatch, settings
+    ):
+        def failing_fetch(self, imdb_id):
+            raise ApiCallException("imdb is down")
+
+        monkeypatch.setattr(IMDBApiCall, "fetch", failing_fetch)
+        job = enqueue_ingestion("tt1")
+        run_ingestion_job(claim_ingestion_job())
+
+        job.refresh_from_db()
+        assert job.status == IngestionJob.Status.PENDING
+        assert job.next_attempt_at > timezone.now()
+        assert claim_ingestion_job() is None
+
+        # Worker is killed while running the last attempt
+        long_ago = timezone.now() - timedelta(seconds=settings.FILM_INGESTION_JOB_TIMEOUT + 1)
+        IngestionJob.objects.filter(pk=job.pk).update(
+            status=IngestionJob.Status.FETCHING, attempts=settings.FILM_INGESTION_MAX_ATTEMPTS, updated_time=long_ago
+        )
+        assert claim_ingestion_job() is None
+        job.refresh_from_db()
+        assert job.status == IngestionJob.Status.FAILED
+
+    def test_create_existed_film_return_film(self, client):
+        film = Film.objects.create(imdb_id="tt1", name="film", year="2020")
+        res = client.post(reverse("film-list"), data={"imdb_id": "tt1"})
+        assert res.status_code == 200
+        assert res.json()["id"] == film.id
+
+    def test_film_detail_cast_in_billing_order(self, client):
+        # Billing order doesn't depend on when artists were created
+        Artist.objects.create(imdb_id="nm9", name="supporting")
+        payload = {
+            'title': "film",
+            'year': 2020,
+            'actorList': [
+                {'id': "nm8", 'name': "lead", 'asCharacter': "Hero"},
+                {'id': "nm9", 'name': "supporting", 'asCharacter': "Villain"},
+            ],
+            'writerList': [{'id': "nm7", 'name': "writer"}],
+        }
+        film = save_fetched_film(IMDBApiCall().parse_title("tt1", payload))
+
+        with CaptureQueriesContext(connection) as queries:
+            res = client.get(reverse("film-detail", kwargs={"pk": film.id}))
+
+        assert res.status_code == 200
+        assert [(actor["name"], actor["character"]) for actor in res.json()["actors"]] == [
+            ("lead", "Hero"), ("supporting", "Villain")
+        ]
+        assert [writer["name"] for writer in res.json()["writers"]] == ["writer"]
+        assert Artist.objects.filter(imdb_id="nm8").exists()
+        # Credits are prefetched with one query per role
+        assert len([query for query in queries.captured_queries if "film_film_" in query["sql"]]) == 3
+
+    def test_saving_film_queries_not_depend_on_cast_size(self):
+        def save_film_queries_count(imdb_id, cast_size):
+            found_film = {
+                'imdb_id': imdb_id,
+                'name': "film",
+                'year': 2020,
+                'actors': [
+                    {'imdb_id': f"nm{imdb_id}{i}", 'name': "actor", 'photo': None} for i in range(cast_size)
+                ],
+                'writers': [{'imdb_id': "nm0", 'name': "writer", 'photo': None}],
+                'directors': [{'imdb_id': "nm0", 'name': "writer", 'photo': None}],
+            }
+            with CaptureQueriesContext(connection) as queries:
+                film = save_fetched_film(found_film)
+            assert film.actors.count() == cast_size
+            return len(queries)
+
+        Artist.objects.create(imdb_id="nm0", name="writer")
+        assert save_film_queries_count("tt1", 1) == save_film_queries_count("tt2", 10)
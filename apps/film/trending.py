@@ -0,0 +1,165 @@
+import logging
+import time
+from typing import Dict, Tuple
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from apps.film import constants
+
+logger = logging.getLogger(__name__)
+
+# Adding weights grown by time since epoch, epoch is set by the first event
+# While scores are being compacted, events are added to pending with the next epoch
+ADD_EVENTS_SCRIPT = """
+local key = KEYS[1]
+local epoch = redis.call('GET', KEYS[4])
+if epoch then
+    key = KEYS[3]
+else
+    epoch = redis.call('GET', KEYS[2])
+    if not epoch then
+        epoch = ARGV[1]
+        redis.call('SET', KEYS[2], epoch)
+    end
+end
+local growth = math.pow(2, (tonumber(ARGV[1]) - tonumber(epoch)) / tonumber(ARGV[2]))
+for i = 3, #ARGV, 2 do
+    redis.call('ZINCRBY', key, tonumber(ARGV[i + 1]) * growth, ARGV[i])
+end
+"""
+
+# Starting compaction with now as the next epoch, or resuming an interrupted one, returns {epoch, next epoch}
+START_COMPACT_SCRIPT = """
+local epoch = redis.call('GET', KEYS[1])
+if not epoch then
+    return nil
+end
+local next_epoch = redis.call('GET', KEYS[2])
+if not next_epoch then
+    next_epoch = ARGV[1]
+    redis.call('SET', KEYS[2], next_epoch)
+end
+return {epoch, next_epoch}
+"""
+
+# Replacing scores with next scores plus pending events, returns number of films
+FINISH_COMPACT_SCRIPT = """
+local scores = redis.call('ZRANGE', KEYS[3], 0, -1, 'WITHSCORES')
+for i = 1, #scores, 2 do
+    redis.call('ZINCRBY', KEYS[4], scores[i + 1], scores[i])
+end
+redis.call('UNLINK', KEYS[1], KEYS[3])
+if redis.call('EXISTS', KEYS[4]) == 1 then
+    redis.call('RENAME', KEYS[4], KEYS[1])
+end
+redis.call('SET', KEYS[2], redis.call('GET', KEYS[5]))
+redis.call('DEL', KEYS[5])
+return redis.call('ZCARD', KEYS[1])
+"""
+
+
+class TrendingFilms:
+    """
+    Time decayed engagement scores of films, in a Redis sorted set
+    Instead of decaying all scores as time passes, an event of weight w at time t adds
+    w * 2 ^ ((t - epoch) / half_life) to its film. That keeps the order of decayed scores,
+    so top films are read with one ZREVRANGE in O(log n + N)
+    Added weights grow over time, so compact() is run periodically to rebase scores to a newer epoch
+    """
+
+    def __init__(self, prefix: str, half_life: float, batch_size: int):
+        self.key = f"{prefix}:scores"
+        self.epoch_key = f"{prefix}:epoch"
+        # Keys of an ongoing compaction
+        self.next_key = f"{prefix}:next_scores"
+        self.next_epoch_key = f"{prefix}:next_epoch"
+        self.pending_key = f"{prefix}:pending"
+        self.half_life = half_life
+        self.batch_size = batch_size
+
+    @property
+    def redis(self):
+        return get_redis_connection('default')
+
+    def add_events(self, film_events: Dict[int, float]):
+        """
+        Adding weights of events to their films, {film id: weight}
+        Failures are just logged, not to fail the user action that made the event
+        """
+        film_events = {film_id: weight for film_id, weight in film_events.items() if weight}
+        if not film_events:
+            return
+
+        args = [time.time(), self.half_life]
+        for film_id, weight in film_events.items():
+            args += [film_id, weight]
+        try:
+            self.redis.eval(
+                ADD_EVENTS_SCRIPT, 4, self.key, self.epoch_key, self.pending_key, self.next_epoch_key, *args
+            )
+        except RedisError:
+            logger.exception("Failed to add trending events of films %s", list(film_events))
+
+    def top(self, offset: int, limit: int) -> Tuple[Dict[int, float], int]:
+        """
+        Films from offset to offset + limit by trending score, as {film id: decayed score}, and number of all films
+        If Redis is down, there is no trending film
+        """
+        try:
+            pipeline = self.redis.pipeline(transaction=False)
+            pipeline.get(self.epoch_key)
+            pipeline.zrevrange(self.key, offset, offset + limit - 1, withscores=True)
+            pipeline.zcard(self.key)
+            epoch, scores, count = pipeline.execute()
+        except RedisError:
+            logger.exception("Failed to read trending films")
+            return {}, 0
+        if not epoch:
+            return {}, 0
+
+        decay = 2 ** ((float(epoch) - time.time()) / self.half_life)
+        return {int(film_id): score * decay for film_id, score in scores}, count
+
+    def compact(self, min_score: float) -> Tuple[int, int]:
+        """
+        Rebasing scores to now, returns number of kept and removed films
+        Scores are copied rebased to next scores in ZSCAN batches, so Redis isn't blocked for the whole set.
+        Events meanwhile wait in pending, then next scores plus pending replace scores at once.
+        Until then scores are read as they were when compaction started
+        An interrupted compaction is resumed by the next one, pending is kept till then
+        """
+        started = self.redis.eval(START_COMPACT_SCRIPT, 2, self.epoch_key, self.next_epoch_key, time.time())
+        if not started:
+            return 0, 0
+
+        epoch, next_epoch = (float(value) for value in started)
+        decay = 2 ** ((epoch - next_epoch) / self.half_life)
+        # Scores are frozen meanwhile, so they're copied again if an earlier compaction was interrupted
+        self.redis.unlink(self.next_key)
+        count, cursor = self.redis.zcard(self.key), 0
+        while True:
+            cursor, scores = self.redis.zscan(self.key, cursor, count=self.batch_size)
+            # ZSCAN may return a film twice, ZADD just sets it again
+            kept_scores = {film_id: score * decay for film_id, score in scores if score * decay >= min_score}
+            if kept_scores:
+                self.redis.zadd(self.next_key, kept_scores)
+            if not cursor:
+                break
+        removed = count - self.redis.zcard(self.next_key)
+
+        kept = self.redis.eval(
+            FINISH_COMPACT_SCRIPT, 5, self.key, self.epoch_key, self.pending_key, self.next_key, self.next_epoch_key
+        )
+        return kept, removed
+
+    def clear(self):
+        self.redis.delete(self.key, self.epoch_key, self.next_key, self.next_epoch_key, self.pending_key)
+
+
+trending_films = TrendingFilms(
+    prefix=constants.TRENDING_KEY_PREFIX,
+    half_life=settings.TRENDING_HALF_LIFE,
+    batch_size=constants.TRENDING_COMPACT_BATCH_SIZE,
+)
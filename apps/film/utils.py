@@ -1,23 +1,40 @@
+import hashlib
 import re
 from typing import Optional
 
 from django.conf import settings
+from django.utils import timezone
 
+from core.exceptions import ApiCallException
 from core.utils.api import ApiCall
+from core.utils.cache import StaleWhileRevalidateCache
+from core.utils.rate_limit import RateLimiter
 from . import constants
+from .models import IMDBTitle
 
 
 class IMDBApiCall:
-
-    def __init__(self):
+    search_cache = StaleWhileRevalidateCache(
+        prefix=constants.SEARCH_CACHE_PREFIX,
+        ttl=settings.IMDB_SEARCH_CACHE_TTL,
+        stale_ttl=settings.IMDB_SEARCH_CACHE_STALE_TTL,
+        lock_ttl=settings.IMDB_SEARCH_CACHE_LOCK_TTL,
+    )
+
+    def __init__(self, rate_limiter: RateLimiter = None):
+        # Calls made to IMDB (not the ones answered from cache) wait for rate_limiter if given
+        self.rate_limiter = rate_limiter
         self.search_url = f"{constants.IMDB_API_URL}/en/API/SearchMovie/{settings.IMDB_API_KEY}/"
         self.fetch_url = f"{constants.IMDB_API_URL}/en/API/Title/{settings.IMDB_API_KEY}/"
 
     def _imdb_call(self, url: str) -> dict:
+        if self.rate_limiter:
+            self.rate_limiter.wait()
         res = ApiCall.api_call(
             method="get",
             url=url,
-            expected_status=200
+            expected_status=200,
+            timeout=settings.IMDB_API_TIMEOUT
         )
         return res.json()
 
@@ -64,7 +81,21 @@ class IMDBApiCall:
     def _list_poster(self, image_link: str):
         return self._get_proper_image_size(image_link, type_='poster')
 
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        return " ".join(query.lower().split())
+
     def search(self, film: str) -> list:
+        """
+        Search results are cached by normalized query
+        """
+        query = self._normalize_query(film)
+        return self.search_cache.get(
+            key=hashlib.md5(query.encode()).hexdigest(),
+            func=lambda: self._search(query)
+        )
+
+    def _search(self, film: str) -> list:
         url = self.search_url + film
         found_films = self._imdb_call(url)['results']
 
@@ -79,14 +110,14 @@ class IMDBApiCall:
         ]
 
     def _get_in_list_format(self, attrs: list):
-        return [attr['value'] for attr in attrs]
+        return [attr['value'] for attr in attrs or []]
 
     def _get_in_list_of_dict_format(self, attrs: list):
         return [{
             'imdb_id': attr['id'],
             'name': attr['name'],
             'photo': self._get_proper_image_size(image_link=attr.get('image', None), type_='actor'),
-        } for attr in attrs]
+        } for attr in attrs or []]
 
     def _get_nested_value(self, attr: dict, what_to_get: str):
         if not attr:
@@ -95,9 +126,59 @@ class IMDBApiCall:
         nested_value = attr.get(what_to_get, None)
         return nested_value if nested_value else None
 
-    def fetch(self, imdb_id: str) -> dict:
+    def fetch_payload(self, imdb_id: str, refresh: bool = False) -> dict:
+        """
+        Raw title payload, read through IMDBTitle
+        Payloads older than IMDB_TITLE_CACHE_TTL (or any payload, if refresh) get revalidated
+        with a conditional request. If the api fails, the cached payload is used anyway
+        """
+        cached_title = IMDBTitle.objects.filter(imdb_id=imdb_id).first()
+        if cached_title and cached_title.is_fresh and not refresh:
+            return cached_title.data
+
         url = self.fetch_url + imdb_id + "/Trailer,Ratings,Posters,"
-        found_film = self._imdb_call(url)
+        if self.rate_limiter:
+            self.rate_limiter.wait()
+        try:
+            res = ApiCall.api_call(
+                method="get",
+                url=url,
+                expected_status=(200, 304) if cached_title else 200,
+                timeout=settings.IMDB_API_TIMEOUT,
+                headers=cached_title.conditional_headers if cached_title else None
+            )
+            payload = None if res.status_code == 304 else res.json()
+            if payload is not None and payload.get('errorMessage'):
+                raise ApiCallException(f"Failed to fetch {imdb_id}: {payload['errorMessage']}")
+        except ApiCallException:
+            if cached_title:
+                return cached_title.data
+            raise
+
+        if payload is None:
+            # Not modified since last fetch
+            cached_title.fetched_time = timezone.now()
+            cached_title.save(update_fields=['fetched_time', 'updated_time'])
+            return cached_title.data
+
+        IMDBTitle.objects.update_or_create(
+            imdb_id=imdb_id,
+            defaults={
+                'payload': IMDBTitle.encode_payload(payload),
+                'etag': res.headers.get('ETag', None),
+                'last_modified': res.headers.get('Last-Modified', None),
+                'fetched_time': timezone.now(),
+            }
+        )
+        return payload
+
+    def fetch(self, imdb_id: str, refresh: bool = False) -> dict:
+        return self.parse_title(imdb_id, self.fetch_payload(imdb_id, refresh=refresh))
+
+    def parse_title(self, imdb_id: str, found_film: dict) -> dict:
+        """
+        Mapping a raw title payload to Film fields
+        """
 
         languages = self._get_in_list_format(found_film.get('languageList', None))
         countries = self._get_in_list_format(found_film.get('countryList', None))
@@ -105,7 +186,13 @@ class IMDBApiCall:
 
         writers = self._get_in_list_of_dict_format(found_film.get('writerList', None))
         directors = self._get_in_list_of_dict_format(found_film.get('directorList', None))
-        actors = self._get_in_list_of_dict_format(found_film.get('actorList', None))
+        actors = [
+            dict(actor, character=attr.get('asCharacter', None) or None)
+            for actor, attr in zip(
+                self._get_in_list_of_dict_format(found_film.get('actorList', None)),
+                found_film.get('actorList', None) or []
+            )
+        ]
 
         rotten = self._get_nested_value(found_film.get('ratings', None), 'rottenTomatoes')
         trailer = self._get_nested_value(found_film.get('trailer', None), 'link')
@@ -3,18 +3,21 @@ from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
 from apps.account.api.v1.serializers import UserListSerializer
+from apps.film.api.v1.serializers import FilmRelationField
+from apps.film.constants import LIST_POSTER_VARIANT
 from apps.film.models import Film
 from apps.post.constants import GENRES, MAX_GENRE_VALUE
 from apps.post.models import Post
+from core.serializer_fields import ImageVariantField
 
 User = get_user_model()
 
 
 class PostFilmSerializer(serializers.ModelSerializer):
-    is_watched = serializers.SerializerMethodField(read_only=True)
-    is_watchlist = serializers.SerializerMethodField(read_only=True)
-    is_fav = serializers.SerializerMethodField(read_only=True)
-    has_post = serializers.SerializerMethodField(read_only=True)
+    is_watched = FilmRelationField()
+    is_watchlist = FilmRelationField()
+    is_fav = FilmRelationField()
+    has_post = FilmRelationField()
 
     class Meta:
         model = Film
@@ -30,22 +33,6 @@ class PostFilmSerializer(serializers.ModelSerializer):
             'has_post',
         )
 
-    def get_is_watched(self, obj):
-        user = self.context.get('request').user
-        return obj.is_watched_by_user(user=user)
-
-    def get_is_watchlist(self, obj):
-        user = self.context.get('request').user
-        return obj.is_watchlist_by_user(user=user)
-
-    def get_is_fav(self, obj):
-        user = self.context.get('request').user
-        return obj.is_faved_by_user(user=user)
-
-    def get_has_post(self, obj):
-        user = self.context.get('request').user
-        return obj.has_post_by_user(user=user)
-
 
 class PostCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -117,7 +104,7 @@ class PostDetailSerializer(serializers.ModelSerializer):
 
 
 class SelfPostListSerializer(serializers.ModelSerializer):
-    photo = serializers.ImageField(source='film.photo', default=None)
+    photo = ImageVariantField(source='film.photo', variant=LIST_POSTER_VARIANT, default=None)
 
     class Meta:
         model = Post
@@ -131,7 +118,7 @@ class SelfPostListSerializer(serializers.ModelSerializer):
 
 class PostListSerializer(serializers.ModelSerializer):
     user = UserListSerializer()
-    photo = serializers.ImageField(source='film.photo', default=None)
+    photo = ImageVariantField(source='film.photo', variant=LIST_POSTER_VARIANT, default=None)
 
     class Meta:
         model = Post
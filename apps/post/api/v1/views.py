@@ -1,14 +1,20 @@
 from django.contrib.auth import get_user_model
+from django.db.models import Count, Exists, Max, OuterRef
 from rest_framework import mixins
 from rest_framework.viewsets import GenericViewSet
 
+from apps.film.loaders import FilmRelationLoader
+from apps.film.managers import user_relations
+from apps.film.models import Film
 from apps.post.api.v1 import serializers
 from apps.post.models import Post
+from core.mixins import ConditionalGetMixin
 
 User = get_user_model()
 
 
 class PostViewSet(
+    ConditionalGetMixin,
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,
     mixins.DestroyModelMixin,
@@ -24,6 +30,7 @@ class PostViewSet(
         'list': serializers.PostListSerializer,
         'retrieve': serializers.PostDetailSerializer,
     }
+    conditional_actions = ('list', 'retrieve')
 
     def get_queryset(self):
         user = self.request.user
@@ -40,3 +47,44 @@ class PostViewSet(
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
+
+    def get_validators(self):
+        """
+        updated_time of posts and of their authors, profiles and films, which are shown with them
+        A post also depends on if request user follows its author and on relations of request user with its film
+        Posts of list are all by followings and don't show film relations, but which posts are in it depends on
+        who the followings are, not only on how many posts they have
+        """
+        posts = self.get_queryset()
+        if self.action == 'retrieve':
+            pk = str(self.kwargs['pk'])
+            is_followed = Exists(User.followings.through.objects.filter(
+                from_user_id=self.request.user.pk, to_user_id=OuterRef('user_id')
+            ))
+            state = posts.filter(pk=pk).annotate(
+                is_followed=is_followed, **user_relations(self.request.user, film_id=OuterRef('film_id'))
+            ).values(
+                'film_id', 'updated_time', 'user__updated_time', 'user__profile__updated_time', 'film__updated_time',
+                'is_followed', *FilmRelationLoader.RELATIONS
+            ).first() if pk.isdigit() else None
+            if state is None:
+                return (None,), None
+
+            # Relations of request user with film are kept for retrieve, not to load them again
+            film = Film(pk=state.pop('film_id'))
+            for relation in FilmRelationLoader.RELATIONS:
+                setattr(film, relation, state[relation])
+            FilmRelationLoader.for_request(self.request).load([film])
+            state = tuple(state.values())
+            return state, max(updated_time for updated_time in state[:4] if updated_time)
+
+        state = posts.order_by().aggregate(
+            count=Count('pk'),
+            updated_time=Max('updated_time'),
+            user_updated_time=Max('user__updated_time'),
+            profile_updated_time=Max('user__profile__updated_time'),
+            film_updated_time=Max('film__updated_time'),
+        )
+        followings = self.request.user.followings.filter(is_active=True).order_by('pk').values_list('pk', flat=True)
+        updated_times = [value for key, value in state.items() if key != 'count' and value]
+        return (*state.values(), tuple(followings)), max(updated_times) if updated_times else None
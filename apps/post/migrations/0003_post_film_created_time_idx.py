@@ -0,0 +1,17 @@
+# Generated by Django 3.1.5 on 2026-10-18 03:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('post', '0002_auto_20230210_1939'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['film', '-created_time', '-id'], name='post_film_created_time_idx'),
+        ),
+    ]
@@ -35,6 +35,12 @@ class Post(BaseModel):
     caption = models.TextField(null=True, blank=True)
     quote = models.CharField(max_length=255, null=True, blank=True)
 
+    class Meta(BaseModel.Meta):
+        indexes = [
+            # Posts of a film, newest first (FilmViewSet.posts)
+            models.Index(fields=['film', '-created_time', '-id'], name='post_film_created_time_idx'),
+        ]
+
     def save(self, watched=True, *args, **kwargs):
         super().save(*args, **kwargs)
         if watched:
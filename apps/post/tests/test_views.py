@@ -1,9 +1,11 @@
 import json
+from datetime import timedelta
 
 import pytest
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 
+from apps.account.models import Profile
 from apps.film.models import Film
 from apps.post.models import Post
 
@@ -59,6 +61,50 @@ class TestPostViewSet:
         assert res.status_code == 200
         assert res.json()["id"] == post_from_following.id
 
+    def test_get_post_detail_and_list_not_modified_until_posts_change(self, client, film, post_from_following):
+        for url in (reverse("posts-detail", kwargs={"pk": post_from_following.id}), reverse("posts-list")):
+            etag = client.get(url)["ETag"]
+            assert client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == 304
+
+            post_from_following.caption = f"caption of {url}"
+            post_from_following.save()
+            res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+            assert res.status_code == 200
+            assert res["ETag"] != etag
+
+    def test_get_post_list_modified_by_changing_followings(self, client, user, film, post_from_following):
+        url = reverse("posts-list")
+        unfollowed, followed = [
+            User.objects.create(username=f"other{i}", phone=f"0912111224{i}") for i in range(2)
+        ]
+        # Their posts and themselves are older than following and its post
+        older = post_from_following.updated_time - timedelta(days=1)
+        for other in (unfollowed, followed):
+            Post.objects.create(user=other, film=film, genres={})
+            Post.objects.filter(user=other).update(updated_time=older)
+            User.objects.filter(pk=other.pk).update(updated_time=older)
+            Profile.objects.filter(user=other).update(updated_time=older)
+        user.followings.add(unfollowed)
+        etag = client.get(url)["ETag"]
+
+        # Same number of posts with the same latest updated_time
+        user.followings.remove(unfollowed)
+        user.followings.add(followed)
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 200
+        assert followed.id in [post["user"]["id"] for post in res.json()["results"]]
+
+    def test_get_post_detail_modified_by_film_relations_of_user(self, client, user, film, post_from_following):
+        url = reverse("posts-detail", kwargs={"pk": post_from_following.id})
+        etag = client.get(url)["ETag"]
+
+        user.film_favorites.add(film)
+        user.films_watched.add(film)
+        res = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert res.status_code == 200
+        assert res.json()["film"]["is_fav"] is True
+        assert res.json()["film"]["is_watched"] is True
+
     def test_create_post_success(self, client, film):
         res = client.post(
             reverse("posts-list"),
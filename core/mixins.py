@@ -0,0 +1,61 @@
+import hashlib
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class NotModified(Exception):
+    """
+    Raised before running the action, when the client already has the current response
+    """
+
+    def __init__(self, response):
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    Conditional GET for the actions in conditional_actions
+
+    - Views give get_validators(): parts of the response state (e.g. updated_time of rows, viewer relations)
+      and when it was last modified, computed without serializing the response
+    - Responses get an ETag hashed from the parts, path and media type, and Last-Modified
+    - A request whose If-None-Match matches gets 304 before the action runs. Viewer state has no
+      timestamps, so Last-Modified is informative and If-Modified-Since alone doesn't make a 304
+    """
+    conditional_actions: Tuple[str, ...] = ()
+
+    def get_validators(self) -> Tuple[Iterable, Optional[datetime]]:
+        raise NotImplementedError
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._validators = None
+        if request.method not in ('GET', 'HEAD') or self.action not in self.conditional_actions:
+            return
+
+        parts, last_modified = self.get_validators()
+        state = repr((request.get_full_path(), request.accepted_media_type, *parts)).encode()
+        etag = 'W/' + quote_etag(hashlib.md5(state).hexdigest())
+        self._validators = (etag, last_modified)
+
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            raise NotModified(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, '_validators', None)
+        if validators and response.status_code in (200, 304):
+            etag, last_modified = validators
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+        return response
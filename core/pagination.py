@@ -1,4 +1,14 @@
-from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from datetime import datetime
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Max, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomCursorPagination(CursorPagination):
@@ -10,3 +20,157 @@ class CustomCursorPagination(CursorPagination):
 class CustomLimitOffsetPagination(LimitOffsetPagination):
     default_limit = 6
     offset = 6
+
+
+class PositionLimitOffsetPagination(CustomLimitOffsetPagination):
+    """
+    Limit offset pagination over rows numbered by a `position` (1 to count)
+    Pages are read with a range on position, instead of scanning the skipped rows
+    With reverse, rows are paged from the last position
+    """
+
+    def paginate_queryset(self, queryset, request, view=None, reverse=False):
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.count = queryset.aggregate(count=Max('position'))['count'] or 0
+        self.offset = self.get_offset(request)
+        if self.count > self.limit and self.template is not None:
+            self.display_page_controls = True
+
+        if reverse:
+            start, end = self.count - self.offset - self.limit, self.count - self.offset
+        else:
+            start, end = self.offset, self.offset + self.limit
+
+        return list(
+            queryset.filter(position__gt=start, position__lte=end).order_by('-position' if reverse else 'position')
+        )
+
+
+class KeysetCursorPagination(BasePagination):
+    """
+    Cursor pagination over a composite ordering, e.g. ('-created_time', '-id')
+    Pages are read with a keyset condition on ordering fields, so deep pages cost the same as the first one.
+    Ordering fields are model fields and the last one must be unique
+
+    Rows may be split in segments (filters), which come one after another, e.g. posts of followings then the others.
+    Each segment is paged by ordering on its own, so an index on ordering serves all of them
+    """
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    ordering = ('-created_time', '-id')
+    segments = (Q(),)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request, queryset.model)
+        reverse = bool(cursor and cursor['reverse'])
+        ordering = [self._invert(field) for field in self.ordering] if reverse else self.ordering
+
+        segment = cursor['segment'] if cursor else 0
+        segments = range(segment, -1, -1) if reverse else range(segment, len(self.segments))
+        rows = []
+        for segment in segments:
+            segment_rows = queryset.filter(self.segments[segment])
+            if cursor and segment == cursor['segment']:
+                segment_rows = segment_rows.filter(self.after(cursor['values'], reverse=reverse))
+            for row in segment_rows.order_by(*ordering)[:page_size + 1 - len(rows)]:
+                row.keyset_segment = segment
+                rows.append(row)
+            if len(rows) > page_size:
+                break
+
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_values = self.previous_values = None
+        if rows and (has_more if not reverse else True):
+            self.next_values = self.values_of(rows[-1])
+        if rows and (has_more if reverse else cursor is not None):
+            self.previous_values = self.values_of(rows[0])
+        return rows
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_link(self.next_values, reverse=False)),
+            ('previous', self.get_link(self.previous_values, reverse=True)),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def after(self, values: list, reverse: bool = False) -> Q:
+        """
+        Rows coming after values in ordering (or before them, if reverse)
+        (a, b, c) after (x, y, z) is a > x, or a = x and b > y, or a = x and b = y and c > z
+        """
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            descending = field.startswith('-') != reverse
+            equal = {self._name(previous_field): value for previous_field, value in zip(self.ordering[:i], values)}
+            condition |= Q(**equal, **{f"{self._name(field)}__{'lt' if descending else 'gt'}": values[i]})
+        return condition
+
+    def values_of(self, row) -> tuple:
+        return row.keyset_segment, [getattr(row, self._name(field)) for field in self.ordering]
+
+    def get_link(self, values, reverse: bool):
+        if values is None:
+            return None
+        segment, values = values
+        # Datetimes are kept with microseconds, so rows with close times aren't skipped
+        cursor = json.dumps({
+            'segment': segment,
+            'values': [value.isoformat() if isinstance(value, datetime) else value for value in values],
+            'reverse': reverse,
+        })
+        return replace_query_param(self.base_url, self.cursor_query_param, b64encode(cursor.encode()).decode())
+
+    def decode_cursor(self, request, model):
+        """
+        Cursor of request, with values parsed by fields of ordering, so a tampered cursor doesn't reach the query
+        """
+        encoded = request.query_params.get(self.cursor_query_param, None)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode()))
+            segment, values, reverse = cursor['segment'], cursor['values'], cursor['reverse']
+            if (
+                type(segment) is not int or not 0 <= segment < len(self.segments) or
+                not isinstance(reverse, bool) or
+                not isinstance(values, list) or len(values) != len(self.ordering)
+            ):
+                raise ValueError
+            values = [
+                model._meta.get_field(self._name(field)).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+            if any(value is None for value in values):
+                raise ValueError
+            return {'segment': segment, 'values': values, 'reverse': reverse}
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def _name(field: str) -> str:
+        return field.lstrip('-')
+
+    @staticmethod
+    def _invert(field: str) -> str:
+        return field[1:] if field.startswith('-') else f"-{field}"
@@ -0,0 +1,59 @@
+from rest_framework import serializers
+
+
+def _variants(value) -> dict:
+    """
+    Variants of an image field file, stored in `<field>_variants` of its instance
+    """
+    return getattr(value.instance, f"{value.field.name}_variants", None) or {}
+
+
+def _url(field, name: str, value) -> str:
+    url = value.storage.url(name)
+    request = field.context.get('request', None)
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
+class ImageVariantField(serializers.ImageField):
+    """
+    Url of a resized variant of image (see core.utils.images), falling back to the original image
+    WebP is preferred, as all clients support it
+    """
+    preferred_formats = ('webp', 'jpg', 'avif')
+
+    def __init__(self, variant: str, **kwargs):
+        self.variant = variant
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+
+        formats = _variants(value).get(self.variant, {})
+        for ext in self.preferred_formats:
+            if ext in formats:
+                return _url(self, formats[ext], value)
+
+        return super().to_representation(value)
+
+
+class ImageVariantsField(serializers.ImageField):
+    """
+    All resized variants of image as {variant: {format: url}}, for building srcset
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return {}
+
+        return {
+            variant: {ext: _url(self, name, value) for ext, name in formats.items()}
+            for variant, formats in _variants(value).items()
+        }
@@ -1,20 +1,36 @@
+from typing import Iterable, Union
+
 import requests
 
 from core.exceptions import ApiCallException
 
 
 class ApiCall:
+    # Shared session, so connections are reused between calls
+    session = requests.Session()
 
     @staticmethod
-    def api_call(method: str, url: str, expected_status: int, data: dict = None) -> requests.Response:
-        # try:
-        res = requests.request(
-            method=method,
-            url=url,
-            json=data
-        )
-        # except (ConnectionError, InvalidShema)
-        if res.status_code != expected_status:
+    def api_call(
+            method: str,
+            url: str,
+            expected_status: Union[int, Iterable[int]],
+            data: dict = None,
+            timeout: float = None,
+            headers: dict = None,
+    ) -> requests.Response:
+        try:
+            res = ApiCall.session.request(
+                method=method,
+                url=url,
+                json=data,
+                timeout=timeout,
+                headers=headers
+            )
+        except requests.RequestException as e:
+            raise ApiCallException(f"Failed to call api {url}: {e}")
+
+        expected_statuses = (expected_status,) if isinstance(expected_status, int) else tuple(expected_status)
+        if res.status_code not in expected_statuses:
             # TODO logging
             raise ApiCallException(
                 f"Failed to get response from api {url} "
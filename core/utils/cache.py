@@ -0,0 +1,81 @@
+import logging
+import threading
+import time
+from typing import Any, Callable
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class StaleWhileRevalidateCache:
+    """
+    Caching result of a slow call (e.g. an external api) in django cache
+
+    - Fresh values are served for `ttl` seconds
+    - After that, values are stale and are still served for `stale_ttl` seconds,
+      while one caller refreshes them in background. If refreshing fails, stale value stays
+    - On a miss, only one caller (the one that gets the lock) makes the call,
+      others wait for its result instead of calling it too, or take the lock if it fails
+    """
+    poll_interval = 0.05
+
+    def __init__(self, prefix: str, ttl: int, stale_ttl: int, lock_ttl: int):
+        self.prefix = prefix
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.lock_ttl = lock_ttl
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    def _lock_key(self, key: str) -> str:
+        return f"{self.prefix}:lock:{key}"
+
+    def _refresh(self, key: str, func: Callable[[], Any]) -> Any:
+        try:
+            value = func()
+            cache.set(
+                self._key(key),
+                {'value': value, 'fresh_until': time.time() + self.ttl},
+                self.ttl + self.stale_ttl
+            )
+            return value
+        finally:
+            cache.delete(self._lock_key(key))
+
+    def _background_refresh(self, key: str, func: Callable[[], Any]):
+        try:
+            self._refresh(key, func)
+        except Exception:                                                   # noqa
+            logger.exception("Failed to refresh stale cache %s", self._key(key))
+
+    def get(self, key: str, func: Callable[[], Any]) -> Any:
+        entry = cache.get(self._key(key))
+        if entry and entry['fresh_until'] > time.time():
+            return entry['value']
+
+        got_lock = cache.add(self._lock_key(key), True, self.lock_ttl)
+
+        if entry:
+            # Stale value is served, and the lock owner refreshes it in background
+            if got_lock:
+                threading.Thread(target=self._background_refresh, args=(key, func), daemon=True).start()
+            return entry['value']
+
+        if got_lock:
+            return self._refresh(key, func)
+
+        # Another caller is fetching the same key, waiting for its result
+        # If the lock is released without a value (its owner failed), the lock is taken again
+        key_name, lock_key = self._key(key), self._lock_key(key)
+        deadline = time.time() + self.lock_ttl
+        while time.time() < deadline:
+            time.sleep(self.poll_interval)
+            entries = cache.get_many([key_name, lock_key])
+            if key_name in entries:
+                return entries[key_name]['value']
+            if lock_key not in entries and cache.add(lock_key, True, self.lock_ttl):
+                return self._refresh(key, func)
+
+        return func()
@@ -0,0 +1,67 @@
+import os
+from io import BytesIO
+from typing import Dict
+
+from django.core.files.base import ContentFile
+from django.db.models.fields.files import FieldFile
+from PIL import Image, ImageOps
+
+# Formats in order of preference, the ones Pillow can't write (e.g. AVIF without its plugin) are skipped
+VARIANT_FORMATS = (
+    ('AVIF', 'avif'),
+    ('WEBP', 'webp'),
+    ('JPEG', 'jpg'),
+)
+VARIANT_QUALITY = 80
+
+
+def variant_formats() -> list:
+    """
+    Modern formats Pillow can write, or JPEG if there is none of them
+    """
+    Image.init()
+    formats = [(format_, ext) for format_, ext in VARIANT_FORMATS[:-1] if format_ in Image.SAVE]
+    return formats or [VARIANT_FORMATS[-1]]
+
+
+def generate_image_variants(field_file: FieldFile, widths: Dict[str, int]) -> dict:
+    """
+    Making resized copies of image next to the original, e.g. posters/x.jpg -> posters/x_w200.webp
+    Returns {variant: {extension: file name}}, images are never scaled up
+    """
+    with field_file.open('rb') as image_file:
+        image = Image.open(image_file)
+        image.load()
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+
+    root, _ = os.path.splitext(field_file.name)
+    variants = {}
+    for variant, width in widths.items():
+        resized = image
+        if width < image.width:
+            resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+
+        variants[variant] = {}
+        for format_, ext in variant_formats():
+            content = BytesIO()
+            (resized.convert('RGB') if format_ == 'JPEG' else resized).save(
+                content, format=format_, quality=VARIANT_QUALITY
+            )
+            variants[variant][ext] = field_file.storage.save(f"{root}_{variant}.{ext}", ContentFile(content.getvalue()))
+
+    return variants
+
+
+def update_image_variants(instance, field: str, widths: Dict[str, int]) -> dict:
+    """
+    Generating variants of instance image field and storing them in its `<field>_variants`
+    Just that column is updated, not to overwrite other changes of instance
+    """
+    field_file = getattr(instance, field)
+    variants = generate_image_variants(field_file, widths) if field_file else {}
+    setattr(instance, f"{field}_variants", variants)
+    type(instance)._default_manager.filter(pk=instance.pk).update(**{f"{field}_variants": variants})
+    return variants
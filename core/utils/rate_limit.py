@@ -0,0 +1,21 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Spacing calls evenly to at most `rate` calls per second, shared between threads
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate else 0
+        self._lock = threading.Lock()
+        self._next_time = time.monotonic()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            call_time = max(self._next_time, now)
+            self._next_time = call_time + self.interval
+
+        time.sleep(max(0.0, call_time - now))
@@ -20,7 +20,7 @@ DEFAULT_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-
+    'django.contrib.postgres',
 ]
 REQ_APPS = [
     'phonenumber_field',
@@ -114,3 +114,45 @@ CACHES = {
         "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}",
     }
 }
+
+IMDB_API_TIMEOUT = float(os.getenv("IMDB_API_TIMEOUT", 10))
+# Max requests per second made to IMDB by backfill commands
+IMDB_API_RATE = float(os.getenv("IMDB_API_RATE", 5))
+
+# Search results are fresh for IMDB_SEARCH_CACHE_TTL, then served stale while getting refreshed
+IMDB_SEARCH_CACHE_TTL = int(os.getenv("IMDB_SEARCH_CACHE_TTL", 60 * 60))
+IMDB_SEARCH_CACHE_STALE_TTL = int(os.getenv("IMDB_SEARCH_CACHE_STALE_TTL", 24 * 60 * 60))
+IMDB_SEARCH_CACHE_LOCK_TTL = int(os.getenv("IMDB_SEARCH_CACHE_LOCK_TTL", 15))
+
+# Shared part of film details is cached this long at most, it's also deleted on changes
+FILM_DETAIL_CACHE_TTL = int(os.getenv("FILM_DETAIL_CACHE_TTL", 60 * 60))
+
+# Fetched title payloads are read from db until they get older than this
+IMDB_TITLE_CACHE_TTL = int(os.getenv("IMDB_TITLE_CACHE_TTL", 30 * 24 * 60 * 60))
+
+# If True, FilmViewSet.create only enqueues an IngestionJob, which is run by run_ingestion_worker command
+FILM_INGESTION_ASYNC = os.getenv("FILM_INGESTION_ASYNC", "True") == "True"
+# Running jobs that are not updated in this time (e.g. worker is killed) are picked again
+FILM_INGESTION_JOB_TIMEOUT = int(os.getenv("FILM_INGESTION_JOB_TIMEOUT", 10 * 60))
+FILM_INGESTION_MAX_ATTEMPTS = int(os.getenv("FILM_INGESTION_MAX_ATTEMPTS", 3))
+# Seconds before retrying a failed job, doubled by each attempt
+FILM_INGESTION_BACKOFF = float(os.getenv("FILM_INGESTION_BACKOFF", 60))
+
+# Downloading posters and banners of films (apps.film.media.MediaPipeline)
+FILM_MEDIA_WORKERS = int(os.getenv("FILM_MEDIA_WORKERS", 4))
+FILM_MEDIA_RETRIES = int(os.getenv("FILM_MEDIA_RETRIES", 3))
+FILM_MEDIA_BACKOFF = float(os.getenv("FILM_MEDIA_BACKOFF", 1))
+FILM_MEDIA_TIMEOUT = float(os.getenv("FILM_MEDIA_TIMEOUT", 10))
+# Seconds a film may be left downloading before its worker is taken to be dead and it's downloaded again
+FILM_MEDIA_DOWNLOAD_TIMEOUT = float(os.getenv("FILM_MEDIA_DOWNLOAD_TIMEOUT", 10 * 60))
+
+# Seconds between reloads of changed genre embeddings by in memory index of each process
+GENRE_INDEX_RELOAD_INTERVAL = float(os.getenv("GENRE_INDEX_RELOAD_INTERVAL", 30))
+
+# Seconds in which weight of an engagement event in trending score of its film halves
+TRENDING_HALF_LIFE = float(os.getenv("TRENDING_HALF_LIFE", 3 * 24 * 60 * 60))
+
+# User and film factors saved by train_recommendations command, read by "for you" films
+RECOMMENDATION_FACTORS_PATH = os.getenv(
+    "RECOMMENDATION_FACTORS_PATH", os.path.join(BASE_DIR, 'recommendations', 'factors.npz')
+)